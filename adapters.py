@@ -0,0 +1,244 @@
+import asyncio
+import os
+import re
+import time
+from typing import Any, Optional
+
+from config import *
+
+# --- СТРУКТУРИРОВАННЫЕ ИСТОЧНИКИ ВЕРСИЙ ---
+# Вопросы «какая последняя версия X» решаются JSON-API реестров (crates.io, PyPI, npm,
+# GitHub Releases, endoflife.date): килобайты вместо разбора HTML нескольких сайтов подряд.
+# Адаптеры регистрируются в REGISTRY и опрашиваются параллельно; ответы кэшируются на ADAPTER_CACHE_TTL.
+
+VERSION_INTENT_RE = re.compile(r"верси|version|релиз|release|latest|последн|changelog|вышл|обновлен", re.I)
+WORD_RE = re.compile(r"`([^`\s]{2,64})`|([A-Za-z][A-Za-z0-9_.-]{1,63})")
+REPO_RE = re.compile(r"github\.com/([\w.-]+/[\w.-]+)|\b([\w.-]+/[\w.-]+)\b")
+
+# Слова запроса, которые не бывают именами пакетов
+STOPWORDS: set[str] = {
+    "version", "versions", "latest", "release", "releases", "stable", "current", "new", "newest", "last", "what",
+    "which", "is", "the", "of", "for", "in", "and", "or", "notes", "changelog", "changes", "package", "library",
+    "crate", "crates", "cargo", "pip", "pypi", "npm", "node", "nodejs", "js", "javascript", "typescript", "python",
+    "rust", "github", "go", "golang", "lang", "language", "programming", "released", "install", "io",
+}
+
+# (expires_at, ответ или None при 404) по (адаптер, пакет)
+_CACHE: dict[tuple[str, str], tuple[float, Optional[str]]] = {}
+
+
+class Adapter:
+    """Источник версий: какие пакеты из запроса он обслуживает и как получить по ним справку"""
+
+    name: str = ""
+    hints: tuple[str, ...] = ()
+    # Слова, однозначно называющие реестр (название языка — ещё не указание на пакет)
+    explicit_hints: tuple[str, ...] = ()
+
+    def packages(self, query: str, words: list[str], any_ecosystem: bool) -> list[str]:
+        """Пакеты из запроса; без явного упоминания экосистемы — только при any_ecosystem"""
+        q: str = query.lower()
+        if not any_ecosystem and not any(re.search(rf"\b{hint}\b", q) for hint in self.hints):
+            return []
+        return words
+
+    def explicit(self, query: str, package: str, quoted: set[str]) -> bool:
+        """Пакет назван однозначно: в `кавычках` или рядом с названием реестра (cargo, pip, npm)"""
+        q: str = query.lower()
+        return package in quoted or any(re.search(rf"\b{hint}\b", q) for hint in self.explicit_hints)
+
+    async def fetch(self, session: Any, package: str) -> Optional[str]:
+        raise NotImplementedError
+
+    @staticmethod
+    async def get_json(session: Any, url: str, headers: Optional[dict[str, str]] = None) -> Optional[Any]:
+        """JSON ответа; None, если ресурса нет (404)"""
+        async with session.get(url, headers=headers) as resp:
+            if resp.status == 404:
+                return None
+            resp.raise_for_status()
+            return await resp.json(content_type=None)
+
+
+class CratesAdapter(Adapter):
+    name = "crates.io"
+    hints = ("crate", "crates", "cargo", "rust")
+    explicit_hints = ("crate", "crates", "cargo")
+
+    async def fetch(self, session: Any, package: str) -> Optional[str]:
+        data = await self.get_json(session, f"{CRATES_API_URL}/crates/{package}")
+        if not data:
+            return None
+        crate: dict = data["crate"]
+        lines: list[str] = [
+            f"Последняя стабильная версия: {crate.get('max_stable_version') or crate.get('newest_version')}",
+            f"Обновлён: {crate.get('updated_at', '')[:10]}",
+            f"Описание: {(crate.get('description') or '').strip()}",
+            "Последние версии:",
+        ]
+        for v in [v for v in data.get("versions", []) if not v.get("yanked")][:5]:
+            lines.append(f"  {v['num']} — {v.get('created_at', '')[:10]}")
+        return "\n".join(lines)
+
+
+class PyPIAdapter(Adapter):
+    name = "PyPI"
+    hints = ("pip", "pypi", "python")
+    explicit_hints = ("pip", "pypi")
+
+    async def fetch(self, session: Any, package: str) -> Optional[str]:
+        data = await self.get_json(session, f"{PYPI_API_URL}/{package}/json")
+        if not data:
+            return None
+        info: dict = data["info"]
+        uploaded: list[tuple[str, str]] = sorted(
+            ((files[0].get("upload_time", ""), version) for version, files in data.get("releases", {}).items() if files),
+            reverse=True,
+        )
+        lines: list[str] = [
+            f"Последняя версия: {info.get('version')}",
+            f"Требуется Python: {info.get('requires_python') or 'не указано'}",
+            f"Описание: {(info.get('summary') or '').strip()}",
+            "Последние релизы:",
+        ]
+        lines.extend(f"  {version} — {at[:10]}" for at, version in uploaded[:5])
+        return "\n".join(lines)
+
+
+class NpmAdapter(Adapter):
+    name = "npm"
+    hints = ("npm", "node", "nodejs", "js", "javascript", "typescript")
+    explicit_hints = ("npm",)
+
+    async def fetch(self, session: Any, package: str) -> Optional[str]:
+        # /latest — один манифест вместо полного документа пакета со всеми версиями
+        data = await self.get_json(session, f"{NPM_REGISTRY_URL}/{package}/latest")
+        if not data:
+            return None
+        lines: list[str] = [
+            f"Последняя версия: {data.get('version')}",
+            f"Описание: {(data.get('description') or '').strip()}",
+        ]
+        if data.get("engines"):
+            lines.append(f"Требования: {data['engines']}")
+        return "\n".join(lines)
+
+
+class GitHubReleasesAdapter(Adapter):
+    name = "GitHub Releases"
+    hints = ("github",)
+    # Языки, релизы которых публикуются в GitHub Releases
+    LANGUAGES: dict[str, str] = {"rust": "rust-lang/rust", "node": "nodejs/node", "nodejs": "nodejs/node"}
+
+    def packages(self, query: str, words: list[str], any_ecosystem: bool) -> list[str]:
+        repos: list[str] = [a or b for a, b in REPO_RE.findall(query) if "github" in query.lower() or a]
+        q: str = query.lower()
+        repos += [repo for lang, repo in self.LANGUAGES.items() if re.search(rf"\b{lang}\b", q)]
+        return list(dict.fromkeys(repos))
+
+    def explicit(self, query: str, package: str, quoted: set[str]) -> bool:
+        return f"github.com/{package}".lower() in query.lower()
+
+    async def fetch(self, session: Any, package: str) -> Optional[str]:
+        headers: dict[str, str] = {"Accept": "application/vnd.github+json"}
+        if os.getenv("GITHUB_TOKEN"):
+            headers["Authorization"] = f"Bearer {os.getenv('GITHUB_TOKEN')}"
+        data = await self.get_json(session, f"{GITHUB_API_URL}/repos/{package}/releases?per_page=3", headers)
+        if not data:
+            return None
+        lines: list[str] = []
+        for release in data:
+            if release.get("draft"):
+                continue
+            kind: str = " (pre-release)" if release.get("prerelease") else ""
+            lines.append(f"{release.get('tag_name')}{kind} — {(release.get('published_at') or '')[:10]}: {release.get('name') or ''}")
+            body: str = (release.get("body") or "").strip()
+            if body:
+                lines.append("  " + body[:800].replace("\n", "\n  "))
+        return "\n".join(lines) or None
+
+
+class EndOfLifeAdapter(Adapter):
+    name = "endoflife.date"
+    # Язык -> продукт endoflife.date (ветки, последний патч, сроки поддержки)
+    PRODUCTS: dict[str, str] = {"python": "python", "go": "go", "golang": "go", "nodejs": "nodejs", "node": "nodejs"}
+
+    def packages(self, query: str, words: list[str], any_ecosystem: bool) -> list[str]:
+        q: str = query.lower()
+        return list(dict.fromkeys(p for lang, p in self.PRODUCTS.items() if re.search(rf"\b{lang}\b", q)))
+
+    def explicit(self, query: str, package: str, quoted: set[str]) -> bool:
+        # Ветки языка полезны как справка, но вопрос «что нового в Python 3.13» ими не закрывается
+        return False
+
+    async def fetch(self, session: Any, package: str) -> Optional[str]:
+        data = await self.get_json(session, f"{ENDOFLIFE_API_URL}/{package}.json")
+        if not data:
+            return None
+        lines: list[str] = ["Ветка / последний выпуск / дата / поддержка до:"]
+        for cycle in data[:4]:
+            lines.append(f"  {cycle.get('cycle')}: {cycle.get('latest')} ({cycle.get('latestReleaseDate', '')}), EOL {cycle.get('eol')}")
+        return "\n".join(lines)
+
+
+REGISTRY: list[Adapter] = [CratesAdapter(), PyPIAdapter(), NpmAdapter(), GitHubReleasesAdapter(), EndOfLifeAdapter()]
+
+
+def register(adapter: Adapter) -> None:
+    REGISTRY.append(adapter)
+
+
+def candidates(query: str) -> list[str]:
+    """Возможные имена пакетов: `в кавычках` и латинские слова, кроме служебных"""
+    words: list[str] = []
+    for quoted, word in WORD_RE.findall(query):
+        name: str = (quoted or word).strip(".-").lower()
+        if name and name not in STOPWORDS and not re.fullmatch(r"[\d.]+", name) and "/" not in name:
+            words.append(name)
+    return list(dict.fromkeys(words))[:ADAPTER_MAX_PACKAGES]
+
+
+def quoted(query: str) -> set[str]:
+    """Имена, которые пользователь выделил `кавычками`"""
+    return {name.strip(".-").lower() for name, _word in WORD_RE.findall(query) if name}
+
+
+async def _cached(adapter: Adapter, session: Any, package: str) -> Optional[str]:
+    key: tuple[str, str] = (adapter.name, package)
+    hit = _CACHE.get(key)
+    if hit and hit[0] > time.time():
+        return hit[1]
+    text: Optional[str] = await adapter.fetch(session, package)
+    _CACHE[key] = (time.time() + ADAPTER_CACHE_TTL, text)
+    return text
+
+
+async def lookup(query: str) -> list[tuple[str, str, bool]]:
+    """
+    (источник, справка, однозначно) для вопросов о версиях; пустой список, если запрос не про версии.
+    «Однозначно» — пакет назван в `кавычках` или вместе с реестром: только такой ответ заменяет веб-поиск.
+    """
+    if not VERSION_INTENT_RE.search(query):
+        return []
+    words: list[str] = candidates(query)
+    # Экосистема не названа — спрашиваем все реестры, ответят те, где пакет есть
+    any_ecosystem: bool = not any(re.search(rf"\b{h}\b", query.lower()) for a in REGISTRY for h in a.hints)
+    jobs: list[tuple[Adapter, str]] = [(a, p) for a in REGISTRY for p in a.packages(query, words, any_ecosystem)]
+    if not jobs:
+        return []
+
+    import aiohttp
+
+    timeout = aiohttp.ClientTimeout(total=ADAPTER_TIMEOUT)
+    headers: dict[str, str] = {"User-Agent": "ai-project-manager (version lookup)"}
+    async with aiohttp.ClientSession(timeout=timeout, headers=headers) as session:
+        results = await asyncio.gather(*(_cached(a, session, p) for a, p in jobs), return_exceptions=True)
+
+    named: set[str] = quoted(query)
+    answers: list[tuple[str, str, bool]] = []
+    for (adapter, package), result in zip(jobs, results):
+        if isinstance(result, BaseException):
+            print(f"{C_YELLOW}⚠{C_RESET} {adapter.name} ({package}): {type(result).__name__}")
+        elif result:
+            answers.append((f"{adapter.name} — {package}", result, adapter.explicit(query, package, named)))
+    return answers
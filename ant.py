@@ -0,0 +1,213 @@
+import asyncio
+import json
+import re
+from typing import Any, Optional
+
+from config import *
+from store import STORE
+import bd
+import tools
+
+# --- ANTHROPIC SDK: /ant И РЕЗЕРВ ДЛЯ OLLAMA ---
+# История хранится в формате Ollama (как у agent_loop), в формат Messages API
+# она переводится перед каждым запросом — так обе ветки работают с одной историей.
+
+_client: Any = None
+
+TOOL_ID_RE = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+def get_client() -> Any:
+    """Один долгоживущий клиент (и пул HTTP-соединений) на процесс"""
+    global _client
+    if _client is None:
+        # SDK тяжёлый и нужен только для /ant и резерва — не грузим его при старте
+        import anthropic
+
+        _client = anthropic.AsyncAnthropic(base_url=ANTHROPIC_BASE_URL, api_key=ANTHROPIC_API_KEY)
+    return _client
+
+
+async def close() -> None:
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+def to_anthropic_tools(tools: list[dict]) -> list[dict]:
+    """Описания инструментов Ollama/OpenAI -> Messages API"""
+    converted: list[dict] = [
+        {
+            "name": tool["function"]["name"],
+            "description": tool["function"].get("description", ""),
+            "input_schema": tool["function"].get("parameters") or {"type": "object", "properties": {}},
+        }
+        for tool in tools
+    ]
+    if converted and ANTHROPIC_PROMPT_CACHE:
+        converted[-1] = {**converted[-1], "cache_control": {"type": "ephemeral"}}
+    return converted
+
+
+def to_anthropic(messages: list[dict]) -> tuple[str, list[dict]]:
+    """
+    История Ollama -> (system, messages) Messages API: tool_calls -> tool_use,
+    role=tool -> tool_result, соседние сообщения одной роли склеиваются.
+    """
+    system: list[str] = []
+    converted: list[dict] = []
+    pending_ids: list[str] = []
+    counter: int = 0
+
+    def push(role: str, blocks: list[dict]) -> None:
+        if converted and converted[-1]["role"] == role:
+            converted[-1]["content"].extend(blocks)
+        else:
+            converted.append({"role": role, "content": blocks})
+
+    for m in messages:
+        role: str = m.get("role", "")
+        content: str = m.get("content") or ""
+        if role == "system":
+            system.append(content)
+        elif role == "user":
+            if content:
+                push("user", [{"type": "text", "text": content}])
+        elif role == "assistant":
+            if not converted:
+                continue
+            blocks: list[dict] = [{"type": "text", "text": content}] if content else []
+            for call in m.get("tool_calls") or []:
+                fn: dict = call.get("function", {})
+                args = fn.get("arguments") or {}
+                if isinstance(args, str):
+                    try:
+                        args = json.loads(args)
+                    except json.JSONDecodeError:
+                        args = {}
+                call_id = call.get("id")
+                if not isinstance(call_id, str) or not TOOL_ID_RE.match(call_id):
+                    counter += 1
+                    call_id = f"toolu_{counter}"
+                pending_ids.append(call_id)
+                blocks.append({"type": "tool_use", "id": call_id, "name": fn.get("name", ""), "input": args})
+            if blocks:
+                push("assistant", blocks)
+        elif role == "tool":
+            # Результат без предшествующего tool_use (обрезанная история) API не примет
+            if not pending_ids or not converted:
+                continue
+            tool_id = m.get("tool_call_id")
+            call_id = tool_id if tool_id in pending_ids else pending_ids[0]
+            pending_ids.remove(call_id)
+            push("user", [{"type": "tool_result", "tool_use_id": call_id, "content": content or "(пусто)"}])
+
+    # Вызовы без результатов (прерванный цикл) — иначе запрос будет отклонён
+    if pending_ids:
+        for msg in converted:
+            if msg["role"] == "assistant":
+                msg["content"] = [b for b in msg["content"] if b.get("type") != "tool_use" or b["id"] not in pending_ids]
+        converted = [msg for msg in converted if msg["content"]]
+
+    if converted and ANTHROPIC_PROMPT_CACHE:
+        last: dict = converted[-1]["content"][-1]
+        converted[-1]["content"][-1] = {**last, "cache_control": {"type": "ephemeral"}}
+    return "\n\n".join(system), converted
+
+
+async def chat(messages: list[dict], tools: list[dict], echo: bool = False) -> dict[str, Any]:
+    """Один шаг диалога через Messages API. Ответ — в формате сообщения Ollama."""
+    system, converted = to_anthropic(messages)
+    request: dict[str, Any] = {"model": ANTHROPIC_MODEL, "max_tokens": ANTHROPIC_MAX_TOKENS, "messages": converted}
+    if system:
+        request["system"] = (
+            [{"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}] if ANTHROPIC_PROMPT_CACHE else system
+        )
+    if tools:
+        request["tools"] = to_anthropic_tools(tools)
+
+    async with get_client().messages.stream(**request) as stream:
+        async for text in stream.text_stream:
+            if echo:
+                print(text, end="", flush=True)
+        final: Any = await stream.get_final_message()
+    if echo:
+        print()
+
+    cached: int = getattr(final.usage, "cache_read_input_tokens", 0) or 0
+    if cached:
+        print(f"{C_GRAY}[ANT]{C_RESET} Из кэша промпта: {cached} токенов")
+
+    text_parts: list[str] = [b.text for b in final.content if b.type == "text"]
+    tool_calls: list[dict] = [
+        {"id": b.id, "function": {"name": b.name, "arguments": b.input}} for b in final.content if b.type == "tool_use"
+    ]
+    msg: dict[str, Any] = {"role": "assistant", "content": "".join(text_parts)}
+    if tool_calls:
+        msg["tool_calls"] = tool_calls
+    return msg
+
+
+class Failover:
+    """Ollama с переходом на Anthropic при недоступности или нарушении OLLAMA_SLO_SECONDS"""
+
+    def __init__(self, router: Any) -> None:
+        self.router: Any = router
+        self.active: bool = bd.client is None and ANTHROPIC_FAILOVER
+
+    async def chat(self, messages: list[dict], tools: list[dict]) -> Any:
+        if not self.active:
+            try:
+                request = self.router.chat(bd.client, messages=messages, tools=tools, options=OLLAMA_OPTIONS)
+                response = await (asyncio.wait_for(request, OLLAMA_SLO_SECONDS) if OLLAMA_SLO_SECONDS else request)
+                return response["message"]
+            except Exception as e:
+                if not ANTHROPIC_FAILOVER:
+                    raise
+                reason: str = f"ответ дольше {OLLAMA_SLO_SECONDS:.0f}с" if isinstance(e, asyncio.TimeoutError) else type(e).__name__
+                print(f"{C_YELLOW}[FAILOVER]{C_RESET} Ollama: {reason} — продолжаю через Anthropic ({ANTHROPIC_MODEL}).")
+                self.active = True
+        return await chat(messages, tools)
+
+
+async def converse(question: str) -> Optional[str]:
+    """Вопрос в /ant: история в хранилище (STORE), инструменты проекта через общий диспетчер"""
+    tool_defs: list[dict] = tools_for_ant()
+    messages: list[dict] = [{"role": "system", "content": BASE_SYSTEM}]
+    if bd.ACTIVE_PROJECT:
+        messages.append({"role": "system", "content": f"Проект: {bd.ACTIVE_PROJECT['name']} ({bd.ACTIVE_PROJECT['path']})"})
+
+    for item in await STORE.read(REDIS_ANT_KEY, -MAX_ANT_HISTORY, -1):
+        try:
+            messages.append(json.loads(item))
+        except json.JSONDecodeError:
+            continue
+
+    new: list[dict] = [{"role": "user", "content": question}]
+    messages.extend(new)
+    answer: Optional[str] = None
+    try:
+        for _iteration in range(MAX_ITERATIONS):
+            msg: dict = await chat(messages, tool_defs, echo=True)
+            messages.append(msg)
+            new.append(msg)
+            if not msg.get("tool_calls"):
+                answer = msg["content"]
+                break
+            for call in msg["tool_calls"]:
+                name: str = call["function"]["name"]
+                res: str = await bd.run_tool(name, call["function"]["arguments"] or {})
+                result: dict = {"role": "tool", "content": res, "tool_call_id": call["id"], "name": name}
+                messages.append(result)
+                new.append(result)
+    except Exception as e:
+        print(f"{C_RED}[ANTHROPIC ERROR]{C_RESET} {e}")
+
+    await STORE.append(REDIS_ANT_KEY, [json.dumps(m, ensure_ascii=False, default=str) for m in new], keep=MAX_ANT_HISTORY * 5)
+    return answer
+
+
+def tools_for_ant() -> list[dict]:
+    """С активным проектом — инструменты разработки, без него — веб-поиск"""
+    return tools.tools_definition_dev if bd.ACTIVE_PROJECT else tools.tools_definition_dialog_web
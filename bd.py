@@ -1,52 +1,89 @@
 import asyncio
-import json
+from datetime import datetime
 import typing as t
-import anthropic
 import asyncpg
 import redis.asyncio as redis
 
-from typing import cast, List, Dict, Any
+from typing import cast, List, Dict, Any, Optional
 from config import *
 from tools import *
+from memo import MEMO
+from prefetch import PREFETCH
+from loop_guard import LoopGuard
+from routing import ModelRouter
+import watcher
+import ant
+import transcripts
 
 # --- БАЗА ДАННЫХ ---
 
 # Типы для базы данных
 DbRecord: Any = asyncpg.Record
 
-async def stream_anthropic(user_input: str, history: list | None = None) -> Any | str | None:
-    """Стриминговый диалог через Anthropic SDK (как в ant.py)"""
-    try:
-        client: Any = anthropic.AsyncAnthropic(
-            base_url=ANTHROPIC_BASE_URL,
-            api_key=ANTHROPIC_API_KEY
-        )
-
-        messages: list[Any] = history if history else []
-        messages.append({"role": "user", "content": user_input})
-
-        full_response: str = ""
-        async with client.messages.stream(
-            model=ANTHROPIC_MODEL,
-            max_tokens=ANTHROPIC_MAX_TOKENS,
-            messages=messages
-        ) as stream:
-            async for text in stream.text_stream:
-                print(text, end="", flush=True)
-                full_response += text
-
-        print()
-        return full_response
-
-    except Exception as e:
-        print(f"{C_RED}[ANTHROPIC ERROR]{C_RESET} {e}")
-        return None
-
-
+# Миграции схемы: номер версии = индекс + 1. Только добавлять в конец.
+MIGRATIONS: list[str] = [
+    """
+    CREATE TABLE IF NOT EXISTS projects (
+        id SERIAL PRIMARY KEY,
+        name TEXT UNIQUE NOT NULL,
+        path TEXT NOT NULL,
+        goal TEXT,
+        plan TEXT,
+        doc_path TEXT,
+        final_prompt TEXT,
+        architecture TEXT,
+        status TEXT DEFAULT 'active',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE IF NOT EXISTS project_messages (
+        id SERIAL PRIMARY KEY,
+        project_id INT REFERENCES projects(id) ON DELETE CASCADE,
+        role TEXT NOT NULL,
+        content TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    """,
+    "ALTER TABLE projects ADD COLUMN IF NOT EXISTS scan_profile TEXT",
+    # Все чтения истории — WHERE project_id = $1 ORDER BY id DESC LIMIT $2
+    "CREATE INDEX IF NOT EXISTS project_messages_project_id_idx ON project_messages (project_id, id)",
+    # Полнотекстовый поиск: конфигурация russian стеммит и кириллицу, и латиницу (english_stem)
+    """
+    ALTER TABLE project_messages
+        ADD COLUMN IF NOT EXISTS search tsvector GENERATED ALWAYS AS (to_tsvector('russian', content)) STORED;
+    CREATE INDEX IF NOT EXISTS project_messages_search_idx ON project_messages USING GIN (search);
+    CREATE INDEX IF NOT EXISTS project_messages_created_idx ON project_messages USING BRIN (created_at);
+    """,
+    # tool_calls, tool_call_id, name — чтобы история из БД восстанавливалась с вызовами инструментов
+    "ALTER TABLE project_messages ADD COLUMN IF NOT EXISTS meta JSONB",
+    # Холодный уровень истории: старые сообщения пачками, JSON + zlib
+    """
+    CREATE TABLE IF NOT EXISTS project_message_segments (
+        id SERIAL PRIMARY KEY,
+        project_id INT REFERENCES projects(id) ON DELETE CASCADE,
+        first_id INT NOT NULL,
+        last_id INT NOT NULL,
+        messages INT NOT NULL,
+        raw_bytes INT NOT NULL,
+        data BYTEA NOT NULL,
+        created_from TIMESTAMP,
+        created_to TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS project_message_segments_project_idx ON project_message_segments (project_id, last_id);
+    """,
+    # Журнал изменений истории, пока она живёт в памяти процесса (store.MemoryStore)
+    """
+    CREATE TABLE IF NOT EXISTS transcript_wal (
+        id BIGSERIAL PRIMARY KEY,
+        op TEXT NOT NULL,
+        args JSONB NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    """,
+]
 
 
 async def init_db() -> bool:
-    """Инициализация PostgreSQL с обработкой ошибок"""
+    """Инициализация PostgreSQL: проверка версии схемы, DDL — только для новых миграций"""
     try:
         conn: Any = await asyncpg.connect(
             user=DB_USER,
@@ -57,37 +94,25 @@ async def init_db() -> bool:
             timeout=30,
         )
 
-        async with conn.transaction():
-            await conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS projects (
-                    id SERIAL PRIMARY KEY,
-                    name TEXT UNIQUE NOT NULL,
-                    path TEXT NOT NULL,
-                    goal TEXT,
-                    plan TEXT,
-                    doc_path TEXT,
-                    final_prompt TEXT,
-                    architecture TEXT,
-                    status TEXT DEFAULT 'active',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """
-            )
-
-            await conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS project_messages (
-                    id SERIAL PRIMARY KEY,
-                    project_id INT REFERENCES projects(id) ON DELETE CASCADE,
-                    role TEXT NOT NULL,
-                    content TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """
-            )
+        try:
+            try:
+                version: int = await conn.fetchval("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+            except asyncpg.UndefinedTableError:
+                version = 0
+
+            if version < len(MIGRATIONS):
+                async with conn.transaction():
+                    # Два клиента, стартующих одновременно, не должны применять миграции дважды
+                    await conn.execute("SELECT pg_advisory_xact_lock(hashtext('ai_pm_schema'))")
+                    await conn.execute("CREATE TABLE IF NOT EXISTS schema_version (version INT PRIMARY KEY)")
+                    version = await conn.fetchval("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+                    for number, ddl in enumerate(MIGRATIONS[version:], start=version + 1):
+                        await conn.execute(ddl)
+                        await conn.execute("INSERT INTO schema_version (version) VALUES ($1)", number)
+                print(f"{C_GRAY}[DB]{C_RESET} Схема обновлена до версии {len(MIGRATIONS)}.")
+        finally:
+            await conn.close()
 
-        await conn.close()
         print(f"{C_GREEN}[DB]{C_RESET} PostgreSQL готов.")
         return True
     except Exception as e:
@@ -99,14 +124,14 @@ async def init_redis() -> bool:
     """Инициализация Redis с обработкой ошибок"""
     global r
     try:
-        r: Any | None = await redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0, decode_responses=True, socket_timeout=10)
+        r = await redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0, decode_responses=True, socket_timeout=10)
         if not await cast(t.Awaitable[bool], r.ping()):
             raise ConnectionError("Redis не отвечает на ping")
         print(f"{C_GREEN}[REDIS]{C_RESET} Redis готов.")
         return True
     except Exception as e:
         print(f"{C_RED}[REDIS ERROR]{C_RESET} {e}")
-        r: None = None
+        r = None
         return False
 
 
@@ -114,7 +139,9 @@ async def init_ollama() -> bool:
     """Инициализация Ollama-клиента"""
     global client
     try:
-        client: Any = AsyncClient(host=OLLAMA_HOST, timeout=OLLAMA_TIMEOUT)
+        from ollama import AsyncClient
+
+        client = AsyncClient(host=OLLAMA_HOST, timeout=OLLAMA_TIMEOUT)
         if client is None:
             raise ConnectionError("Failed to create Ollama client")
         await client.list()
@@ -128,9 +155,6 @@ async def init_ollama() -> bool:
 
 async def create_project(name: str, path: str, goal: str = "") -> bool:
     """Создание нового проекта"""
-    if not await init_db():
-        return False
-
     conn: Any = await asyncpg.connect(user=DB_USER, password=DB_PASS, database=DB_NAME, host=DB_HOST, port=DB_PORT)
     try:
         await conn.execute("INSERT INTO projects (name, path, goal) VALUES ($1, $2, $3)", name, path, goal)
@@ -160,9 +184,14 @@ async def load_project(name: str) -> bool:
     try:
         row: Any = await conn.fetchrow("SELECT * FROM projects WHERE name = $1", name)
         if row:
-            ACTIVE_PROJECT: dict[Any, Any] = dict(row)
+            ACTIVE_PROJECT = dict(row)
             print(f"{C_GREEN}🚀{C_RESET} Загружен: '{ACTIVE_PROJECT['name']}' ({ACTIVE_PROJECT['status']})")
-            await sync_db_to_redis(project_id=ACTIVE_PROJECT["id"])
+            # История поднимается в Redis лениво, при первом обращении (transcripts.tail)
+            segments, moved = await transcripts.compact(ACTIVE_PROJECT["id"])
+            if moved:
+                print(f"{C_GRAY}🗜{C_RESET} В сжатый архив перенесено {moved} старых сообщений ({segments} сегм.).")
+            base_path: str = ACTIVE_PROJECT["path"]
+            await watcher.watch_project(base_path, [lambda paths: MEMO.invalidate_paths(list(paths), base_path)])
             return True
         else:
             print(f"{C_RED}❌{C_RESET} Проект не найден.")
@@ -187,57 +216,41 @@ async def delete_project(name: str) -> bool:
         await conn.close()
 
 
-async def sync_db_to_redis(project_id: int) -> None:
-    """Загружает историю из БД в Redis"""
-    if not r:
-        pass
-
-    key: str = f"{REDIS_CHAT_KEY_PREFIX}{project_id}"
+async def search_history(
+    query: str,
+    project_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = HISTORY_SEARCH_LIMIT,
+) -> list[Any]:
+    """Полнотекстовый поиск по архиву диалогов (GIN по tsvector), опционально — проект и период"""
     conn: Any = await asyncpg.connect(user=DB_USER, password=DB_PASS, database=DB_NAME, host=DB_HOST, port=DB_PORT)
     try:
-        rows: Any = await conn.fetch(
-            "SELECT role, content FROM project_messages WHERE project_id = $1 ORDER BY id DESC LIMIT $2",
+        # Сначала отбор и ранжирование по индексу, фрагменты (ts_headline) — только для найденных строк
+        return await conn.fetch(
+            """
+            WITH q AS (SELECT websearch_to_tsquery('russian', $1) AS query),
+            hits AS (
+                SELECT m.id, m.project_id, m.role, m.content, m.created_at, ts_rank(m.search, q.query) AS rank
+                FROM project_messages m, q
+                WHERE m.search @@ q.query
+                  AND ($2::int IS NULL OR m.project_id = $2)
+                  AND ($3::timestamp IS NULL OR m.created_at >= $3)
+                  AND ($4::timestamp IS NULL OR m.created_at < $4)
+                ORDER BY rank DESC, m.id DESC
+                LIMIT $5
+            )
+            SELECT h.id, p.name AS project, h.role, h.created_at, h.rank,
+                   ts_headline('russian', h.content, q.query, 'MaxFragments=2, MinWords=8, MaxWords=30') AS snippet
+            FROM hits h JOIN projects p ON p.id = h.project_id, q
+            ORDER BY h.rank DESC, h.id DESC
+            """,
+            query,
             project_id,
-            MAX_DB_HISTORY,
+            since,
+            until,
+            limit,
         )
-        if rows:
-            rows = list(rows)
-            rows.reverse()
-            messages: list(str) = [json.dumps(obj={"role": row["role"], "content": row["content"]}) for row in rows]
-            async with r.pipeline() as pipe:
-                pipe.delete(key)
-                if messages:
-                    pipe.rpush(key, *messages)
-                await pipe.execute()
-            print(f"{C_GRAY}📜{C_RESET} Загружено {len(messages)} сообщений из истории.")
-    finally:
-        await conn.close()
-
-
-async def sync_redis_to_db(project_id: int) -> None:
-    """Сохраняет новые сообщения из Redis в PostgreSQL"""
-    if not r:
-        pass
-
-    key: str = f"{REDIS_CHAT_KEY_PREFIX}{project_id}"
-    length: int = await cast(t.Awaitable[int], r.llen(key))
-    if length == 0:
-        return
-
-    messages_json: list[str] = await cast(t.Awaitable[List[str]], r.lrange(key, -50, -1))
-    conn = await asyncpg.connect(user=DB_USER, password=DB_PASS, database=DB_NAME, host=DB_HOST, port=DB_PORT)
-    try:
-        async with conn.transaction():
-            await conn.execute("DELETE FROM project_messages WHERE project_id = $1", project_id)
-            for msg_json in messages_json:
-                msg = json.loads(msg_json)
-                await conn.execute(
-                    "INSERT INTO project_messages (project_id, role, content) VALUES ($1, $2, $3)",
-                    project_id,
-                    msg["role"],
-                    msg["content"],
-                )
-        print(f"{C_GRAY}💾{C_RESET} Сохранено {len(messages_json)} сообщений в БД.")
     finally:
         await conn.close()
 
@@ -267,15 +280,124 @@ async def update_project_fields(fields: Dict[str, Any]) -> bool:
 
 # --- MAIN AGENT LOOP ---
 
+async def execute_tool(name: str, args: Dict[str, Any]) -> str:
+    """Выполняет вызов инструмента агента и возвращает текстовый результат"""
+    res = ""
+    match name:
+        case "write_file":
+            path = args.get("path")
+            content = args.get("content")
+            if not isinstance(path, str) or not isinstance(content, str):
+                res = f"{C_RED}Ошибка: {name} требует 'path' и 'content' строки{C_RESET}"
+            else:
+                print(f"{C_CYAN}[WRITE]{C_RESET} 📝 {path}")
+                res = await write_file_tool(path, content)
+        case "read_file":
+            path = args.get("path")
+            if not isinstance(path, str):
+                res = f"{C_RED}Ошибка: {name} требует 'path' строку{C_RESET}"
+            else:
+                start_line = args.get("start_line")
+                end_line = args.get("end_line")
+                span: str = f" [{start_line or 1}-{end_line or ''}]" if start_line or end_line else ""
+                print(f"{C_CYAN}[READ]{C_RESET} 📄 {path}{span}")
+                res = await read_file_tool(
+                    path,
+                    start_line=int(start_line) if isinstance(start_line, (int, float)) else None,
+                    end_line=int(end_line) if isinstance(end_line, (int, float)) else None,
+                )
+        case "search_code":
+            query = args.get("query")
+            if not isinstance(query, str):
+                res = f"{C_RED}Ошибка: {name} требует 'query' строку{C_RESET}"
+            else:
+                print(f"{C_CYAN}[SEARCH]{C_RESET} 🔎 {query}")
+                res = await search_code_tool(query)
+        case "search_docs":
+            query = args.get("query")
+            if not isinstance(query, str):
+                res = f"{C_RED}Ошибка: {name} требует 'query' строку{C_RESET}"
+            else:
+                print(f"{C_CYAN}[DOCS]{C_RESET} 📚 {query}")
+                res = await search_docs_tool(query)
+        case "run_shell_command":
+            command = args.get("command")
+            if not isinstance(command, str):
+                res = f"{C_RED}Ошибка: {name} требует 'command' строку{C_RESET}"
+            else:
+                timeout = args.get("timeout")
+                print(f"{C_CYAN}[SHELL]{C_RESET} 💻 {command}")
+                res = await run_shell_tool(command, timeout=timeout if isinstance(timeout, (int, float)) else None)
+        case "search_history":
+            query = args.get("query")
+            if not isinstance(query, str):
+                res = f"{C_RED}Ошибка: {name} требует 'query' строку{C_RESET}"
+            else:
+                days = args.get("days")
+                print(f"{C_CYAN}[HISTORY]{C_RESET} 🗂 {query}")
+                res = await search_history_tool(
+                    query,
+                    all_projects=args.get("all_projects") is True,
+                    days=int(days) if isinstance(days, (int, float)) and days > 0 else None,
+                )
+        case "run_checks":
+            print(f"{C_CYAN}[CHECKS]{C_RESET} 🧪 Сборка и тесты")
+            res = await run_checks_tool(force=args.get("force") is True)
+        case "scan_directory":
+            mode = "full" if args.get("mode") == "full" else "outline"
+            query = args.get("query")
+            print(f"{C_CYAN}[SCAN]{C_RESET} 🔍 Папка проекта ({mode})")
+            res = await scan_directory_tool(mode, query=query if isinstance(query, str) else None)
+        case "web_search":
+            query = args.get("query")
+            if not isinstance(query, str):
+                res = f"{C_RED}Ошибка: {name} требует 'query' строку{C_RESET}"
+            else:
+                print(f"{C_CYAN}[WEB]{C_RESET} 🔍 {query}")
+                res = await web_search_tool(query)
+        case "update_project_plan":
+            plan = args.get("plan")
+            if not isinstance(plan, str):
+                res = f"{C_RED}Ошибка: {name} требует 'plan' строку{C_RESET}"
+            else:
+                print(f"{C_GREEN}[PLAN]{C_RESET} Обновление плана...")
+                if await update_project_fields({"plan": plan}):
+                    res = "План обновлен."
+                else:
+                    res = "Ошибка обновления плана."
+        case "get_project_info":
+            res = str(ACTIVE_PROJECT) if ACTIVE_PROJECT else "Нет проекта."
+        case _:
+            res = f"Неизвестный инструмент: {name}"
+
+    return res
+
+
+async def run_tool(name: str, args: Dict[str, Any]) -> str:
+    """Вызов инструмента через кэш read-only результатов"""
+    base_path: str = ACTIVE_PROJECT["path"] if ACTIVE_PROJECT else ""
+    cached = MEMO.lookup(name, args, base_path)
+    if cached is not None:
+        print(f"{C_GRAY}[MEMO]{C_RESET} ♻ {name}: данные не изменились, повтор не выполняется")
+        return cached
+
+    res: Optional[str] = await PREFETCH.take(name, args, base_path)
+    if res is not None:
+        print(f"{C_GRAY}[PREFETCH]{C_RESET} ⚡ {name}: результат подготовлен заранее")
+    else:
+        res = await execute_tool(name, args)
+    return MEMO.record(name, args, base_path, res)
+
+
 async def agent_loop(user_input: str, mode: str = "dev") -> None:
     """Основной цикл агента с поддержкой инструментов"""
     global ACTIVE_PROJECT, r, client
 
-    if not ACTIVE_PROJECT or not r or not client:
+    if not ACTIVE_PROJECT or not (client or ANTHROPIC_FAILOVER):
         print(f"{C_RED}[ERROR]{C_RESET} Система не инициализирована.")
+        return
 
     project_id = ACTIVE_PROJECT["id"]
-    redis_key: str = f"{REDIS_CHAT_KEY_PREFIX}{project_id}"
 
     match mode:
         case "analyzer":
@@ -310,10 +432,11 @@ async def agent_loop(user_input: str, mode: str = "dev") -> None:
     if project_context:
         messages.append({"role": "system", "content": "\n".join(project_context)})
 
-    history_len: int = await cast(t.Awaitable[int], r.llen(redis_key))
-    if history_len == 0 or "посмотр" in user_input.lower() or "проанализируй" in user_input.lower():
+    history: list[dict[str, Any]] = await transcripts.tail(project_id, MAX_DB_HISTORY)
+    if not history or "посмотр" in user_input.lower() or "проанализируй" in user_input.lower():
         print(f"{C_GRAY}[SYSTEM]{C_RESET} Сканирование файлов проекта...")
-        scan_result: str = await scan_directory_tool()
+        # Ранжирование только по сообщению пользователя: длинный план размывал бы совпадения в путях
+        scan_result: str = await scan_directory_tool(query=user_input)
         if scan_result and not scan_result.startswith("Ошибка"):
             messages.append(
                 {
@@ -322,25 +445,21 @@ async def agent_loop(user_input: str, mode: str = "dev") -> None:
                 }
             )
 
-    redis_msgs: list[str] = await cast(t.Awaitable[List[str]], r.lrange(redis_key, 0, -1))
-    if redis_msgs:
-        try:
-            history: list[Any] = [json.loads(s=m) for m in redis_msgs[-MAX_DB_HISTORY:]]
-            messages.extend(history)
-        except json.JSONDecodeError:
-            print(f"{C_YELLOW}[WARN]{C_RESET} Ошибка чтения истории Redis.")
+    messages.extend(history)
 
-    await cast(t.Awaitable[int], r.rpush(redis_key, json.dumps(obj={"role": "user", "content": user_input})))
+    await transcripts.append(project_id, {"role": "user", "content": user_input})
     messages.append({"role": "user", "content": user_input})
 
+    MEMO.reset()
+    guard = LoopGuard(max_iterations=MAX_ITERATIONS, label=mode.upper())
+    backend = ant.Failover(ModelRouter(mode))
+    calls_done: list[tuple[str, dict[str, Any], str]] = []
+
     for iteration in range(MAX_ITERATIONS):
+        # Пока модель генерирует ответ — готовим вероятные следующие вызовы
+        PREFETCH.start(user_input if iteration == 0 else None, calls_done, ACTIVE_PROJECT.get("path") or "")
         try:
-            response: ChatResponse = await client.chat(
-                model=OLLAMA_MODEL,
-                messages=messages,
-                tools=tools,
-                options=OLLAMA_OPTIONS
-            )
+            msg: Any = await backend.chat(messages, tools)
         except asyncio.TimeoutError:
             print(f"{C_RED}[ERROR]{C_RESET} Ошибка: Ollama не ответил за {OLLAMA_TIMEOUT} секунд.")
             print(f"{C_GRAY}Совет: Увеличьте OLLAMA_TIMEOUT в конфигурации или используйте меньшую модель.{C_RESET}")
@@ -349,85 +468,22 @@ async def agent_loop(user_input: str, mode: str = "dev") -> None:
             print(f"{C_RED}[ERROR]{C_RESET} Ошибка Ollama: {type(e).__name__}: {e}")
             break
 
-        msg: Any = response["message"]
-
         if msg.get("tool_calls"):
             try:
                 msg_dict = msg.model_dump() if hasattr(msg, "model_dump") else dict(msg)
             except:
                 msg_dict: dict[Any, Any] = dict(msg)
 
-            await cast(t.Awaitable[int], r.rpush(redis_key, json.dumps(obj=msg_dict)))
             messages.append(msg_dict)
 
+            calls_done = []
             for tool in msg.get("tool_calls"):
                 fn = tool.get("function", {})
                 name = fn.get("name")
                 args = fn.get("arguments", {}) or {}
-                res = ""
                 tool_id = tool.get("id") or f"{name}_{hash(str(args))}" or "unknown"
 
-                match name:
-                    case "write_file":
-                        path = args.get("path")
-                        content = args.get("content")
-                        if not isinstance(path, str) or not isinstance(content, str):
-                            res = f"{C_RED}Ошибка: {name} требует 'path' и 'content' строки{C_RESET}"
-                        else:
-                            print(f"{C_CYAN}[WRITE]{C_RESET} 📝 {path}")
-                            res = await write_file_tool(path, content)
-                    case "read_file":
-                        path = args.get("path")
-                        if not isinstance(path, str):
-                            res = f"{C_RED}Ошибка: {name} требует 'path' строку{C_RESET}"
-                        else:
-                            print(f"{C_CYAN}[READ]{C_RESET} 📄 {path}")
-                            res = await read_file_tool(path)
-                    case "search_code":
-                        query = args.get("query")
-                        if not isinstance(query, str):
-                            res = f"{C_RED}Ошибка: {name} требует 'query' строку{C_RESET}"
-                        else:
-                            print(f"{C_CYAN}[SEARCH]{C_RESET} 🔎 {query}")
-                            res = await search_code_tool(query)
-                    case "search_docs":
-                        query = args.get("query")
-                        if not isinstance(query, str):
-                            res = f"{C_RED}Ошибка: {name} требует 'query' строку{C_RESET}"
-                        else:
-                            print(f"{C_CYAN}[DOCS]{C_RESET} 📚 {query}")
-                            res = await search_docs_tool(query)
-                    case "run_shell_command":
-                        command = args.get("command")
-                        if not isinstance(command, str):
-                            res = f"{C_RED}Ошибка: {name} требует 'command' строку{C_RESET}"
-                        else:
-                            print(f"{C_CYAN}[SHELL]{C_RESET} 💻 {command}")
-                            res = await run_shell_tool(command)
-                    case "scan_directory":
-                        print(f"{C_CYAN}[SCAN]{C_RESET} 🔍 Папка проекта")
-                        res = await scan_directory_tool()
-                    case "web_search":
-                        query = args.get("query")
-                        if not isinstance(query, str):
-                            res = f"{C_RED}Ошибка: {name} требует 'query' строку{C_RESET}"
-                        else:
-                            print(f"{C_CYAN}[WEB]{C_RESET} 🔍 {query}")
-                            res = await web_search_tool(query)
-                    case "update_project_plan":
-                        plan = args.get("plan")
-                        if not isinstance(plan, str):
-                            res = f"{C_RED}Ошибка: {name} требует 'plan' строку{C_RESET}"
-                        else:
-                            print(f"{C_GREEN}[PLAN]{C_RESET} Обновление плана...")
-                            if await update_project_fields({"plan": plan}):
-                                res = "План обновлен."
-                            else:
-                                res = "Ошибка обновления плана."
-                    case "get_project_info":
-                        res = str(ACTIVE_PROJECT) if ACTIVE_PROJECT else "Нет проекта."
-                    case _:
-                        res = f"Неизвестный инструмент: {name}"
+                res = await run_tool(name, args)
 
                 tool_result = {
                     "role": "tool",
@@ -435,18 +491,41 @@ async def agent_loop(user_input: str, mode: str = "dev") -> None:
                     "tool_call_id": tool_id,
                     "name": name,
                 }
-                await cast(t.Awaitable[int], r.rpush(redis_key, json.dumps(tool_result)))
                 messages.append(tool_result)
-
+                calls_done.append((name, args, res))
+
+            # Вызовы и их результаты — одной записью
+            await transcripts.append(project_id, msg_dict, *messages[-len(calls_done):])
+
+            match guard.observe(calls_done):
+                case "warn":
+                    print(f"{C_YELLOW}[LOOP]{C_RESET} Повтор вызовов без прогресса — подсказка модели.")
+                    messages.append(guard.note())
+                case "escalate":
+                    print(f"{C_YELLOW}[LOOP]{C_RESET} Повтор вызовов без прогресса — эскалация на {LOOP_ESCALATION_MODEL}.")
+                    backend.router.escalate(LOOP_ESCALATION_MODEL)
+                    messages.append(guard.note())
+                case "stop":
+                    guard.stop(iteration)
+                    text = guard.final_message()
+                    print(f"{C_GREEN}🤖 [{mode.upper()}]:{C_RESET} {text}")
+                    await transcripts.append(project_id, {"role": "assistant", "content": text})
+                    break
             continue
 
         if msg.get("content"):
             text = msg["content"]
             print(f"{C_GREEN}🤖 [{mode.upper()}]:{C_RESET} {text}")
-            await cast(t.Awaitable[int], r.rpush(redis_key, json.dumps({"role": "assistant", "content": text})))
+            await transcripts.append(project_id, {"role": "assistant", "content": text})
             break
 
         if iteration == MAX_ITERATIONS - 1:
             print(f"{C_YELLOW}[WARN]{C_RESET} Достигнут лимит итераций.")
 
-    await sync_redis_to_db(project_id)
+    if MEMO.hits:
+        print(f"{C_GRAY}[MEMO]{C_RESET} {MEMO.stats()}")
+    PREFETCH.reset()
+    if PREFETCH.scheduled:
+        print(f"{C_GRAY}[PREFETCH]{C_RESET} За сессию: {PREFETCH.stats()}")
+
+    await transcripts.persist(project_id)
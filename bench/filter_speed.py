@@ -0,0 +1,116 @@
+"""
+Фильтр результатов веб-поиска: прежняя проверка в web_search_tool против web_filter.WebFilter.
+
+Синтетическая выдача: официальные доки, блог-платформы, китайские сайты, форумы, мусорные заголовки.
+
+    python bench/filter_speed.py [количество результатов]
+"""
+import os
+import random
+import sys
+import time
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web_filter import get_filter
+
+RULES = get_filter()
+BLOCKED_DOMAINS: set[str] = {
+    "rutube.ru", "youtube.com", "youtu.be", "kinopoisk.ru", "vk.com", "ok.ru", "tiktok.com", "instagram.com",
+    "facebook.com", "genius.com", "wikislovary.ru", "wiktionary.org", "urban dictionary", "pinterest.com",
+    "twitter.com", "x.com", "zhihu.com", "baidu.com", "weibo.com", "qq.com", "taobao.com", "tmall.com", "jd.com",
+    "sina.com.cn", "sohu.com", "163.com", "douban.com", "bilibili.com", "csdn.net", "cnblogs.com", "jianshu.com",
+    "oschina.net", "iteye.com", "segmentfault.com", "juejin.cn", "toutiao.com", "aliyun.com", "huawei.com",
+    "xiaomi.com", "oppo.com", "vivo.com", "alkad.org",
+}
+BLOCKED_PATTERNS: list[str] = [
+    "как пишется", "песня", "текст песни", "lyrics", "фильм", "смотреть онлайн", "трейлер", "wiki/последняя",
+    "wiki/последний", "значение слова", "перевод", "словарь", "что значит", "форум", "обсуждение",
+]
+PRIORITY_DOMAINS: dict[str, int] = {
+    "rust-lang.org": 100, "doc.rust-lang.org": 100, "blog.rust-lang.org": 90, "github.com/rust-lang": 85,
+    "python.org": 100, "docs.python.org": 100, "nodejs.org": 100, "developer.mozilla.org": 95, "golang.org": 100,
+    "go.dev": 100, "docs.oracle.com": 90, "openjdk.org": 90, "wikipedia.org": 90, "en.wikipedia.org": 70,
+    "reddit.com": 95, "habr.com": 80, "stackoverflow.com": 95,
+}
+
+
+def legacy_select(results: list[dict], limit: int) -> list[dict]:
+    """Копия цикла фильтрации из web_search_tool до выделения WebFilter"""
+    valid: list[dict] = []
+    for r in results:
+        title, href, body = r.get("title", ""), r.get("href", ""), r.get("body", "")
+        if not href.startswith(("http://", "https://")):
+            continue
+        domain = urlparse(href).netloc.lower()
+        if domain.startswith("www."):
+            domain = domain[4:]
+        if not domain or "." not in domain:
+            continue
+        if "forum" in domain or "форум" in title.lower():
+            continue
+        if domain.endswith((".cn", ".com.cn")):
+            continue
+        if any(blocked in domain for blocked in BLOCKED_DOMAINS):
+            continue
+        if any("一" <= char <= "鿿" for char in domain):
+            continue
+        if sum(1 for char in title if "一" <= char <= "鿿") > 0:
+            continue
+        title_lower, body_lower = title.lower(), body.lower()
+        if any(p in title_lower or p in body_lower for p in BLOCKED_PATTERNS):
+            continue
+        priority = 0
+        for priority_domain, score in PRIORITY_DOMAINS.items():
+            if priority_domain in domain or priority_domain in href:
+                priority = score
+                break
+        valid.append({"result": r, "priority": priority, "domain": domain, "title": title})
+    valid.sort(key=lambda x: (-x["priority"], results.index(x["result"])))
+    return valid[:limit]
+
+
+def synthetic(n: int, seed: int = 7) -> list[dict]:
+    rnd = random.Random(seed)
+    hosts: list[str] = [
+        "doc.rust-lang.org", "docs.python.org", "github.com", "stackoverflow.com", "ru.wikipedia.org", "habr.com",
+        "medium.com", "dev.to", "blog.example.com", "zhihu.com", "news.sina.com.cn", "bbs.forum-dev.ru",
+        "www.youtube.com", "tokio.rs", "crates.io", "pypi.org", "lib.rs", "users.rust-lang.org",
+    ]
+    words: list[str] = "async runtime tokio version release latest guide tutorial borrow checker trait".split()
+    junk: list[str] = ["", "", "", "", " текст песни", " смотреть онлайн", " 异步编程", " форум"]
+    results: list[dict] = []
+    for i in range(n):
+        host: str = rnd.choice(hosts)
+        path: str = "/".join(rnd.choice(words) for _ in range(3))
+        title: str = " ".join(rnd.choice(words) for _ in range(6)) + rnd.choice(junk)
+        body: str = " ".join(rnd.choice(words) for _ in range(40)) + f" #{i}"
+        results.append({"title": title.capitalize(), "href": f"https://{host}/{path}/{i}", "body": body})
+    return results
+
+
+def timed(fn, *args) -> tuple[float, object]:
+    started: float = time.perf_counter()
+    out = fn(*args)
+    return time.perf_counter() - started, out
+
+
+def main() -> None:
+    n: int = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    results: list[dict] = synthetic(n)
+    legacy_s, legacy = timed(legacy_select, results, n)
+    engine_s, (engine, blocked) = timed(RULES.select, results, n)
+
+    print(f"Результатов: {n}")
+    print(f"  прежний фильтр: {legacy_s * 1000:8.1f} мс, прошло {len(legacy)}")
+    print(f"  WebFilter:      {engine_s * 1000:8.1f} мс, прошло {len(engine)}  (x{legacy_s / engine_s:.1f})")
+    print(f"  заблокировано:  {blocked}")
+    # Расхождения — места, где подстрока ловила лишнее (например 'x.com' в 'dropbox.com')
+    diff: set[str] = {i["domain"] for i in legacy} ^ {i["domain"] for i in engine}
+    if diff:
+        print(f"  разные домены:  {sorted(diff)}")
+
+
+if __name__ == "__main__":
+    main()
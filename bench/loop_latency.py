@@ -0,0 +1,78 @@
+"""
+Отзывчивость цикла событий, пока REPL ждёт ввода.
+
+Пользователь «печатает» 1 секунду (строка приходит в stdin через 1с). Считаем, сколько тиков
+успевает сделать фоновая задача (наблюдатель, синхронизация) при блокирующем input()
+и при console.ainput(), а также пропускную способность цикла (asyncio vs uvloop).
+
+    python bench/loop_latency.py
+"""
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import console
+
+TICK: float = 0.01
+
+
+async def idle_prompt(mode: str) -> int:
+    ticks: int = 0
+
+    async def background() -> None:
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(TICK)
+            ticks += 1
+
+    task = asyncio.create_task(background())
+    await asyncio.sleep(0)
+    if mode == "input":
+        input()
+    else:
+        await console.ainput()
+    task.cancel()
+    console.close()
+    return ticks
+
+
+async def throughput(seconds: float = 1.0) -> int:
+    count: int = 0
+    deadline: float = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        await asyncio.sleep(0)
+        count += 1
+    return count
+
+
+def child(mode: str) -> None:
+    print(asyncio.run(idle_prompt(mode)))
+
+
+def main() -> None:
+    if len(sys.argv) > 2 and sys.argv[1] == "--child":
+        child(sys.argv[2])
+        return
+
+    for mode in ("input", "ainput"):
+        feeder = subprocess.Popen(["sh", "-c", "sleep 1; echo line"], stdout=subprocess.PIPE)
+        out = subprocess.run([sys.executable, __file__, "--child", mode], stdin=feeder.stdout,
+                             capture_output=True, text=True).stdout.strip()
+        feeder.wait()
+        print(f"{mode:>7}: фоновых тиков за 1с ожидания ввода: {out} (идеал ~{int(1 / TICK)})")
+
+    print(f"asyncio: {asyncio.run(throughput())} итераций цикла/с")
+    try:
+        import uvloop
+    except ImportError:
+        print("uvloop: не установлен")
+        return
+    print(f" uvloop: {uvloop.run(throughput())} итераций цикла/с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Хранилище истории: RedisStore против MemoryStore (с журналом в PostgreSQL и без него).
+
+Ход диалога — как в agent_loop: чтение хвоста истории (MAX_DB_HISTORY) и несколько дописываний
+(вопрос, вызовы инструментов с результатами, ответ). Нужны Redis и PostgreSQL из config.py
+(таблица transcript_wal — после первого запуска main.py); недоступный бэкенд пропускается.
+
+    python bench/store_speed.py [количество ходов]
+"""
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import redis.asyncio as redis
+
+from config import *
+import store
+
+KEY: str = "bench:store_speed"
+INDEX: str = "bench:store_speed:index"
+MESSAGE: str = json.dumps({"role": "tool", "content": "x" * 800, "tool_call_id": "call_1", "name": "read_file"})
+
+
+async def turn(backend: store.TranscriptStore) -> None:
+    await backend.read(KEY, -MAX_DB_HISTORY, -1, ttl=TRANSCRIPT_HOT_TTL, index=(INDEX, KEY))
+    await backend.append(KEY, [MESSAGE], ttl=TRANSCRIPT_HOT_TTL, index=(INDEX, KEY))
+    await backend.append(KEY, [MESSAGE, MESSAGE, MESSAGE], ttl=TRANSCRIPT_HOT_TTL, index=(INDEX, KEY))
+    await backend.append(KEY, [MESSAGE], keep=MAX_DB_HISTORY * 2, ttl=TRANSCRIPT_HOT_TTL, index=(INDEX, KEY))
+
+
+async def measure(label: str, backend: store.TranscriptStore, turns: int) -> None:
+    await backend.delete(KEY)
+    samples: list[float] = []
+    for _ in range(turns):
+        started: float = time.perf_counter()
+        await turn(backend)
+        samples.append((time.perf_counter() - started) * 1000)
+    await backend.delete(KEY)
+    await backend.forget(INDEX, KEY)
+    samples.sort()
+    print(f"{label:<28} медиана {statistics.median(samples):7.3f} мс   p95 {samples[int(len(samples) * 0.95) - 1]:7.3f} мс   "
+          f"всего {sum(samples):8.1f} мс")
+
+
+async def main() -> None:
+    turns: int = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    print(f"{turns} ходов: чтение хвоста + 3 дописывания")
+
+    client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0, decode_responses=True, socket_timeout=10)
+    try:
+        await client.ping()
+        await measure("RedisStore", store.RedisStore(client), turns)
+    except Exception as e:
+        print(f"{'RedisStore':<28} пропущен: {e}")
+    finally:
+        await client.aclose()
+
+    await measure("MemoryStore без журнала", store.MemoryStore(), turns)
+
+    memory = store.MemoryStore()
+    await memory.load()
+    if memory._wal is None:
+        print(f"{'MemoryStore + журнал':<28} пропущен: PostgreSQL недоступен")
+        return
+    try:
+        # Журнал бенчмарка не должен попасть в историю: всё в транзакции с откатом
+        transaction = memory._wal.transaction()
+        await transaction.start()
+        await measure("MemoryStore + журнал", memory, turns)
+        await transaction.rollback()
+    finally:
+        await memory.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
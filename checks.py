@@ -0,0 +1,294 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import shlex
+import sys
+import time
+from typing import Any, Optional
+
+from config import *
+import shell
+
+# --- ИНКРЕМЕНТАЛЬНЫЕ ПРОВЕРКИ (СБОРКА/ТЕСТЫ) ---
+
+SKIP_DIRS: set[str] = {".git", "target", "node_modules", ".venv", "venv", "__pycache__", ".tox", ".nox",
+                       ".mypy_cache", ".pytest_cache", ".ruff_cache", "build", "dist"}
+
+# Файлы конфигурации, изменение которых инвалидирует все цели
+PYTHON_GLOBAL_FILES: set[str] = {"pyproject.toml", "setup.cfg", "setup.py", "pytest.ini", "tox.ini", "requirements.txt"}
+RUST_GLOBAL_FILES: set[str] = {"Cargo.lock", "rust-toolchain", "rust-toolchain.toml", ".cargo/config.toml"}
+
+IMPORT_RE = re.compile(
+    r"^\s*(?:from\s+(\.*[\w.]*)\s+import\s+(\([^)]*\)|[^\n#;]+)|import\s+([\w., ]+))", re.MULTILINE
+)
+AS_RE = re.compile(r"\s+as\s+\w+")
+PYTEST_SUMMARY_RE = re.compile(r"(\d+) (passed|failed|error|errors|skipped)")
+CARGO_SUMMARY_RE = re.compile(r"test result: (\w+)\. (\d+) passed; (\d+) failed")
+CRATE_NAME_RE = re.compile(r"^\[package\][^\[]*?^name\s*=\s*\"([^\"]+)\"", re.MULTILINE | re.DOTALL)
+PATH_DEP_RE = re.compile(r"path\s*=\s*\"([^\"]+)\"")
+
+# Хэши файлов по (mtime, size), чтобы не перечитывать неизменённые файлы
+_HASHES: dict[str, tuple[int, int, str]] = {}
+
+
+def file_hash(path: str) -> str:
+    st = os.stat(path)
+    cached = _HASHES.get(path)
+    if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        return cached[2]
+    with open(path, "rb") as f:
+        digest: str = hashlib.sha1(f.read()).hexdigest()
+    _HASHES[path] = (st.st_mtime_ns, st.st_size, digest)
+    return digest
+
+
+def walk_files(base: str, exts: tuple[str, ...]) -> list[str]:
+    """Относительные пути файлов проекта с нужными расширениями"""
+    found: list[str] = []
+    for root, dirs, files in os.walk(base):
+        dirs[:] = [d for d in dirs if d not in SKIP_DIRS and not d.startswith(".")]
+        for name in files:
+            if name.endswith(exts) or name in exts:
+                found.append(os.path.relpath(os.path.join(root, name), base))
+    return sorted(found)
+
+
+def detect_project(base: str) -> Optional[str]:
+    """Тип проекта по манифестам в корне"""
+    if os.path.isfile(os.path.join(base, "Cargo.toml")):
+        return "rust"
+    if any(os.path.isfile(os.path.join(base, f)) for f in PYTHON_GLOBAL_FILES - {"requirements.txt"}):
+        return "python"
+    if any(os.path.basename(p).startswith("test_") for p in walk_files(base, (".py",))):
+        return "python"
+    return None
+
+
+def _inputs_key(base: str, paths: set[str]) -> str:
+    h = hashlib.sha1()
+    for rel in sorted(paths):
+        full: str = os.path.join(base, rel)
+        h.update(rel.encode())
+        h.update(file_hash(full).encode() if os.path.isfile(full) else b"-")
+    return h.hexdigest()
+
+
+# --- PYTHON ---
+
+def _module_names(rel: str) -> list[str]:
+    """Имена модулей, под которыми файл может импортироваться (с учётом src-layout)"""
+    parts: list[str] = rel[:-3].split(os.sep)
+    if parts[-1] == "__init__":
+        parts = parts[:-1]
+    names: list[str] = [".".join(parts)] if parts else []
+    if parts and parts[0] == "src" and len(parts) > 1:
+        names.append(".".join(parts[1:]))
+    return names
+
+
+def python_targets(base: str) -> dict[str, set[str]]:
+    """Цель (тестовый файл) -> множество входных файлов (сам тест, conftest, зависимости по импортам)"""
+    files: list[str] = walk_files(base, (".py",))
+    modules: dict[str, str] = {}
+    for rel in files:
+        for name in _module_names(rel):
+            modules[name] = rel
+
+    imports: dict[str, set[str]] = {}
+    for rel in files:
+        try:
+            with open(os.path.join(base, rel), encoding="utf-8", errors="replace") as f:
+                text: str = f.read()
+        except OSError:
+            continue
+        deps: set[str] = set()
+        for m in IMPORT_RE.finditer(text):
+            if m.group(1) is not None:
+                # from pkg import name: name может быть подмодулем (pkg/name.py), а не атрибутом pkg
+                module: str = m.group(1).lstrip(".")
+                imported: list[str] = [n for n in re.split(r"[,\s()]+", AS_RE.sub("", m.group(2))) if n and n != "*"]
+                candidates: list[str] = [module] + [f"{module}.{n}" if module else n for n in imported]
+            else:
+                candidates = re.split(r"[,\s]+", AS_RE.sub("", m.group(3)))
+            for name in filter(None, candidates):
+                # pkg.mod.sub -> pkg.mod.sub, pkg.mod, pkg
+                while name:
+                    if name in modules:
+                        deps.add(modules[name])
+                    name = name.rpartition(".")[0]
+        imports[rel] = deps
+
+    globals_: set[str] = {f for f in PYTHON_GLOBAL_FILES if os.path.isfile(os.path.join(base, f))}
+    targets: dict[str, set[str]] = {}
+    for rel in files:
+        stem: str = os.path.basename(rel)
+        if not (stem.startswith("test_") or stem.endswith("_test.py")):
+            continue
+        closure: set[str] = {rel}
+        queue: list[str] = [rel]
+        while queue:
+            for dep in imports.get(queue.pop(), ()):
+                if dep not in closure:
+                    closure.add(dep)
+                    queue.append(dep)
+        # conftest.py по цепочке каталогов до корня
+        d: str = os.path.dirname(rel)
+        while True:
+            conf: str = os.path.join(d, "conftest.py") if d else "conftest.py"
+            if conf in imports:
+                closure.add(conf)
+            if not d:
+                break
+            d = os.path.dirname(d)
+        targets[rel] = closure | globals_
+    return targets
+
+
+def _python_for(base: str) -> str:
+    """Интерпретатор проекта: локальный venv, если он есть"""
+    for venv in (".venv", "venv"):
+        candidate: str = os.path.join(base, venv, "bin", "python")
+        if os.access(candidate, os.X_OK):
+            return candidate
+    return sys.executable
+
+
+async def _run_pytest(base: str, target: str) -> dict[str, Any]:
+    result = await shell.run_command(f"{_python_for(base)} -m pytest -q -p no:cacheprovider {shlex.quote(target)}",
+                                     cwd=base, timeout=CHECKS_TIMEOUT, echo=False)
+    out: str = result.stdout.render()
+    summary: str = ", ".join(f"{n} {kind}" for n, kind in PYTEST_SUMMARY_RE.findall(out[-2000:]))
+    # 5 — тесты не найдены, это не ошибка
+    passed: bool = result.exit_code in (0, 5) and not result.timed_out
+    return {"status": "pass" if passed else "fail", "summary": summary or f"exit {result.exit_code}",
+            "errors": list(result.error_lines)[-CHECKS_ERROR_LINES:], "duration": round(result.duration, 1)}
+
+
+# --- RUST ---
+
+def rust_targets(base: str) -> dict[str, set[str]]:
+    """Крейт -> входные файлы (исходники крейта, его манифест, path-зависимости, lock)"""
+    manifests: list[str] = [p for p in walk_files(base, ("Cargo.toml",)) if os.path.basename(p) == "Cargo.toml"]
+    crates: dict[str, str] = {}
+    for rel in manifests:
+        with open(os.path.join(base, rel), encoding="utf-8", errors="replace") as f:
+            m = CRATE_NAME_RE.search(f.read())
+        if m:
+            crates[os.path.dirname(rel)] = m.group(1)
+
+    sources: list[str] = walk_files(base, (".rs", "Cargo.toml", "build.rs"))
+    owned: dict[str, set[str]] = {d: set() for d in crates}
+    for rel in sources:
+        # Файл принадлежит ближайшему крейту вверх по дереву
+        d: str = os.path.dirname(rel)
+        while d not in crates and d:
+            d = os.path.dirname(d)
+        if d in crates:
+            owned[d].add(rel)
+
+    globals_: set[str] = {"Cargo.toml"} | {f for f in RUST_GLOBAL_FILES if os.path.isfile(os.path.join(base, f))}
+    targets: dict[str, set[str]] = {}
+    for d, name in crates.items():
+        inputs: set[str] = set(owned[d])
+        with open(os.path.join(base, d, "Cargo.toml"), encoding="utf-8", errors="replace") as f:
+            for dep_path in PATH_DEP_RE.findall(f.read()):
+                dep_dir: str = os.path.normpath(os.path.join(d, dep_path))
+                inputs |= owned.get("" if dep_dir == "." else dep_dir, set())
+        targets[name] = inputs | globals_
+    return targets
+
+
+async def _run_cargo(base: str, crates: list[str], workspace: bool) -> dict[str, Any]:
+    selector: str = " ".join(f"-p {c}" for c in crates) if workspace else ""
+    result = await shell.run_command(f"cargo test --quiet {selector}".strip(),
+                                     cwd=base, timeout=CHECKS_TIMEOUT, echo=False)
+    tail: str = result.stdout.render()[-4000:]
+    passed_total = failed_total = 0
+    for _, passed, failed in CARGO_SUMMARY_RE.findall(tail):
+        passed_total += int(passed)
+        failed_total += int(failed)
+    ok: bool = result.exit_code == 0 and not result.timed_out
+    return {"status": "pass" if ok else "fail", "summary": f"{passed_total} passed, {failed_total} failed",
+            "errors": list(result.error_lines)[-CHECKS_ERROR_LINES:], "duration": round(result.duration, 1)}
+
+
+# --- СОСТОЯНИЕ И ЗАПУСК ---
+
+def _state_path(base: str) -> str:
+    return os.path.join(CACHE_DIR, "checks", hashlib.sha1(base.encode()).hexdigest()[:16] + ".json")
+
+
+def load_state(base: str) -> dict[str, Any]:
+    try:
+        with open(_state_path(base), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {"files": {}, "targets": {}}
+
+
+def save_state(base: str, state: dict[str, Any]) -> None:
+    path: str = _state_path(base)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp: str = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+async def run_checks(base: str, force: bool = False) -> dict[str, Any]:
+    """Запускает только устаревшие проверки и возвращает компактный итог"""
+    base = os.path.abspath(base)
+    kind: Optional[str] = detect_project(base)
+    if not kind:
+        return {"ok": False, "error": "Тип проекта не определён (нет Cargo.toml / pyproject.toml / тестов)."}
+
+    state: dict[str, Any] = load_state(base)
+    targets: dict[str, set[str]] = await asyncio.to_thread(python_targets if kind == "python" else rust_targets, base)
+    if not targets:
+        return {"project": kind, "ok": True, "note": "Целей для проверки не найдено."}
+
+    all_inputs: set[str] = set().union(*targets.values())
+    snapshot: dict[str, str] = await asyncio.to_thread(
+        lambda: {p: file_hash(os.path.join(base, p)) for p in all_inputs if os.path.isfile(os.path.join(base, p))}
+    )
+    changed: list[str] = sorted(p for p, h in snapshot.items() if state["files"].get(p) != h)
+
+    keys: dict[str, str] = {t: _inputs_key(base, inputs) for t, inputs in targets.items()}
+    stale: list[str] = [t for t, key in keys.items()
+                        if force or state["targets"].get(t, {}).get("key") != key]
+
+    started: float = time.monotonic()
+    results: dict[str, dict[str, Any]] = {}
+    if stale and kind == "python":
+        sem = asyncio.Semaphore(CHECKS_PARALLEL)
+
+        async def one(target: str) -> None:
+            async with sem:
+                results[target] = await _run_pytest(base, target)
+
+        await asyncio.gather(*(one(t) for t in stale))
+    elif stale:
+        # cargo сам параллелит сборку; несколько cargo одновременно упираются в lock
+        group: dict[str, Any] = await _run_cargo(base, stale, workspace=len(targets) > 1)
+        results = {t: group for t in stale}
+
+    for target, res in results.items():
+        state["targets"][target] = {"key": keys[target], **res}
+    state["files"] = snapshot
+    state["targets"] = {t: v for t, v in state["targets"].items() if t in targets}
+    save_state(base, state)
+
+    cached: list[str] = [t for t in targets if t not in results]
+    cached_fail: list[str] = [t for t in cached if state["targets"][t].get("status") != "pass"]
+    ran: list[dict[str, Any]] = [{"target": t, **{k: v for k, v in res.items() if v}} for t, res in results.items()]
+    return {
+        "project": kind,
+        "ok": all(state["targets"][t].get("status") == "pass" for t in targets),
+        "changed_files": changed[:30],
+        "ran": ran,
+        "cached_pass": len(cached) - len(cached_fail),
+        "cached_fail": [{"target": t, "errors": state["targets"][t].get("errors", [])} for t in cached_fail],
+        "seconds": round(time.monotonic() - started, 1),
+    }
@@ -1,13 +1,21 @@
 import os
-import redis.asyncio as rediss
-from typing import Optional, Dict, Any
-from ollama import AsyncClient
+from typing import TYPE_CHECKING, Optional, Dict, Any
+
+if TYPE_CHECKING:
+    # Только для аннотаций: сами клиенты импортируются в bd при инициализации
+    import redis.asyncio as rediss
+    from ollama import AsyncClient
 
 # --- ANTHROPIC SDK (для ant.py интеграции) ---
 ANTHROPIC_BASE_URL: str = os.getenv("ANTHROPIC_BASE_URL", "http://localhost:11434")
 ANTHROPIC_API_KEY: str = os.getenv("ANTHROPIC_API_KEY", "Ollama")
 ANTHROPIC_MODEL: str = os.getenv("ANTHROPIC_MODEL", "glm-4.7-flash:q8_0")
 ANTHROPIC_MAX_TOKENS: int = int(os.getenv("ANTHROPIC_MAX_TOKENS", "198000"))
+ANTHROPIC_PROMPT_CACHE: bool = os.getenv("ANTHROPIC_PROMPT_CACHE", "1" if "anthropic.com" in ANTHROPIC_BASE_URL else "0") == "1"  # cache_control для системного промпта, инструментов и истории
+ANTHROPIC_FAILOVER: bool = os.getenv("ANTHROPIC_FAILOVER", "1") == "1"             # /dev и диалог переходят на Anthropic, если Ollama недоступна
+OLLAMA_SLO_SECONDS: float = float(os.getenv("OLLAMA_SLO_SECONDS", "0"))            # Ответ Ollama дольше — переход на Anthropic (0 — без ограничения)
+REDIS_ANT_KEY = "global_dialog:ant"                                                 # История /ant
+MAX_ANT_HISTORY: int = int(os.getenv("MAX_ANT_HISTORY", "40"))                     # Сообщений истории /ant в контексте
 
 # --- КОНФИГУРАЦИЯ (с загрузкой из env) ---
 DB_NAME: str = os.getenv("DB_NAME", "ai_projects")
@@ -31,26 +39,135 @@ OLLAMA_OPTIONS: dict = {
 
 REDIS_HOST: str = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT: int = int(os.getenv("REDIS_PORT", "6379"))
-REDIS_DIALOG_KEY = "global_dialog:web"                         # Ключ для глобальных диалогов
+REDIS_DIALOG_KEY = "global_dialog:web"                         # Префикс ключей сессий диалога (global_dialog:web:<имя>)
+REDIS_DIALOG_INDEX = "global_dialog:sessions"                  # ZSET: сессия -> время последней активности
+DIALOG_SESSION: str = os.getenv("DIALOG_SESSION", "default")                       # Сессия диалога при запуске
+DIALOG_SESSION_TTL: int = int(os.getenv("DIALOG_SESSION_TTL", "604800"))           # Простаивающая сессия истекает через (сек, 7 дней)
 
 MAX_DIALOG_HISTORY = 20                                        # Храним последние 20 сообщений для контекста
 MAX_ITERATIONS: int = int(os.getenv("MAX_ITERATIONS", "14"))
 REDIS_CHAT_KEY_PREFIX = "project_chat:"
 MAX_DB_HISTORY: int = int(os.getenv("MAX_DB_HISTORY", "50"))
+HISTORY_SEARCH_LIMIT: int = int(os.getenv("HISTORY_SEARCH_LIMIT", "10"))           # Результатов поиска по архиву диалогов
+
+# --- ХРАНЕНИЕ ИСТОРИИ ПРОЕКТОВ ---
+REDIS_CHAT_INDEX = "project_chat:lru"                                             # ZSET: проект -> последнее обращение (LRU)
+TRANSCRIPT_HOT_MESSAGES: int = int(os.getenv("TRANSCRIPT_HOT_MESSAGES", str(MAX_DB_HISTORY)))  # Хвост истории, который держится в Redis
+TRANSCRIPT_HOT_TTL: int = int(os.getenv("TRANSCRIPT_HOT_TTL", "86400"))           # Хвост неактивного проекта истекает через (сек)
+TRANSCRIPT_HOT_PROJECTS: int = int(os.getenv("TRANSCRIPT_HOT_PROJECTS", "5"))     # Проектов в Redis одновременно; лишние вытесняются
+TRANSCRIPT_COLD_DAYS: int = int(os.getenv("TRANSCRIPT_COLD_DAYS", "0"))           # Старше — в сжатые сегменты (0 — не сжимать)
+TRANSCRIPT_SEGMENT_MESSAGES: int = int(os.getenv("TRANSCRIPT_SEGMENT_MESSAGES", "200"))  # Сообщений в одном сегменте
+STORE_BACKEND: str = os.getenv("STORE_BACKEND", "auto")                           # auto — Redis, без него память процесса; memory — только память
+STORE_MEMORY_MAX_ITEMS: int = int(os.getenv("STORE_MEMORY_MAX_ITEMS", "1000"))     # Предел списка в памяти процесса
+STORE_RECONNECT_SECONDS: int = int(os.getenv("STORE_RECONNECT_SECONDS", "15"))     # Период проверки, вернулся ли Redis
+STORE_WAL_CHECKPOINT: int = int(os.getenv("STORE_WAL_CHECKPOINT", "5000"))         # Длиннее — журнал при загрузке сворачивается в снимок
 
 # --- НОВЫЕ ГЛОБАЛЬНЫЕ НАСТРОЙКИ ПОИСКА ---
 WEB_SEARCH_MAX_LENGTH: int = int(os.getenv("WEB_SEARCH_MAX_LENGTH", "50000"))      # Общий лимит символов
 WEB_SEARCH_MAX_RESULTS: int = int(os.getenv("WEB_SEARCH_MAX_RESULTS", "10"))       # Количество сайтов
 WEB_SEARCH_TIMEOUT: int = int(os.getenv("WEB_SEARCH_TIMEOUT", "50"))               # Таймаут на сайт
+WEB_FETCH_MAX_BYTES: int = int(os.getenv("WEB_FETCH_MAX_BYTES", "1048576"))       # Лимит тела страницы (после распаковки)
 DIALOG_MAX_ITERATIONS: int = int(os.getenv("DIALOG_MAX_ITERATIONS", "15"))         # Макс. итераций tool_calls в диалоге
 LIMIT_PARSING: int = int(os.getenv("LIMIT_PARSING", "200"))                        # Увеличил в tools лимит парсинка сайтов
 LENGTH_CONTEXT: int = int(os.getenv("LENGTH_CONTEXT", "10000"))
+WEB_FILTERS_PATH: str = os.getenv("WEB_FILTERS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "web_filters.json"))  # Правила фильтра (перечитываются на лету)
+WEB_PASSAGE_CHARS: int = int(os.getenv("WEB_PASSAGE_CHARS", "700"))               # Размер фрагмента страницы при извлечении
+WEB_PASSAGE_HEADING_WEIGHT: float = float(os.getenv("WEB_PASSAGE_HEADING_WEIGHT", "2.0"))  # Бонус фрагменту, если запрос совпал с заголовком раздела
+DEDUP_MAX_DISTANCE: int = int(os.getenv("DEDUP_MAX_DISTANCE", "3"))             # Порог SimHash (бит) для почти-дубликатов страниц и фрагментов
+
+# --- СТРУКТУРИРОВАННЫЕ ИСТОЧНИКИ ВЕРСИЙ ---
+CRATES_API_URL: str = os.getenv("CRATES_API_URL", "https://crates.io/api/v1")
+PYPI_API_URL: str = os.getenv("PYPI_API_URL", "https://pypi.org/pypi")
+NPM_REGISTRY_URL: str = os.getenv("NPM_REGISTRY_URL", "https://registry.npmjs.org")
+GITHUB_API_URL: str = os.getenv("GITHUB_API_URL", "https://api.github.com")
+ENDOFLIFE_API_URL: str = os.getenv("ENDOFLIFE_API_URL", "https://endoflife.date/api")
+ADAPTER_CACHE_TTL: int = int(os.getenv("ADAPTER_CACHE_TTL", "3600"))              # Сколько секунд доверять ответу реестра
+ADAPTER_TIMEOUT: int = int(os.getenv("ADAPTER_TIMEOUT", "8"))                     # Таймаут запроса к реестру
+ADAPTER_MAX_PACKAGES: int = int(os.getenv("ADAPTER_MAX_PACKAGES", "2"))           # Сколько имён пакетов брать из запроса
+
+# --- ЛОКАЛЬНОЕ ЗЕРКАЛО ДОКУМЕНТАЦИИ ---
+MIRROR_ROOTS: list[str] = [u.strip() for u in os.getenv(
+    "MIRROR_ROOTS",
+    "https://docs.python.org/3/library/,https://doc.rust-lang.org/book/,https://developer.mozilla.org/en-US/docs/Web/JavaScript/Reference/",
+).split(",") if u.strip()]                                                         # Корни обхода (пусто — зеркало выключено)
+MIRROR_AUTOSTART: bool = os.getenv("MIRROR_ROOTS") is not None                     # Корни заданы явно — пустое зеркало скачивается сразу при старте
+MIRROR_MAX_PAGES: int = int(os.getenv("MIRROR_MAX_PAGES", "300"))                   # Страниц на корень за обход
+MIRROR_REFRESH_HOURS: float = float(os.getenv("MIRROR_REFRESH_HOURS", "24"))        # Период обновления
+MIRROR_CRAWL_DELAY: float = float(os.getenv("MIRROR_CRAWL_DELAY", "0.2"))           # Пауза между запросами к одному сайту
+MIRROR_MAX_HITS: int = int(os.getenv("MIRROR_MAX_HITS", "5"))                       # Страниц зеркала в ответе поиска
+MIRROR_MIN_HITS: int = int(os.getenv("MIRROR_MIN_HITS", "3"))                       # Столько совпадений — в сеть не ходим
+
+# --- ПОИСКОВЫЕ БЭКЕНДЫ ---
+SEARXNG_URL: str = os.getenv("SEARXNG_URL", "")                                   # SearxNG с format=json (пусто — не используется)
+SEARCH_DDGS_WORKERS: int = int(os.getenv("SEARCH_DDGS_WORKERS", "2"))              # Потоков для синхронного клиента DDGS
+SEARCH_BACKEND_TIMEOUT: float = float(os.getenv("SEARCH_BACKEND_TIMEOUT", "12"))   # Дольше бэкенд не ждём
+SEARCH_EARLY_HITS: int = int(os.getenv("SEARCH_EARLY_HITS", "4"))                  # Столько приоритетных ссылок — не ждём остальные бэкенды
+SEARCH_EARLY_PRIORITY: int = int(os.getenv("SEARCH_EARLY_PRIORITY", "80"))         # Какой приоритет домена считать «приоритетным»
+
+# --- ЗДОРОВЬЕ ДОМЕНОВ ---
+REDIS_DOMAIN_HEALTH_KEY = "web:domain_health"                                     # Хэш домен -> статистика
+DOMAIN_EWMA_ALPHA: float = float(os.getenv("DOMAIN_EWMA_ALPHA", "0.3"))             # Вес нового замера в скользящем среднем
+DOMAIN_MIN_TIMEOUT: float = float(os.getenv("DOMAIN_MIN_TIMEOUT", "3"))             # Нижняя граница таймаута домена
+DOMAIN_BREAKER_ERRORS: float = float(os.getenv("DOMAIN_BREAKER_ERRORS", "0.7"))     # Доля ошибок, после которой домен исключается
+DOMAIN_BREAKER_SECONDS: int = int(os.getenv("DOMAIN_BREAKER_SECONDS", "1800"))      # На сколько исключается
+
+# --- МЕМОИЗАЦИЯ ИНСТРУМЕНТОВ ---
+MEMO_MIN_LENGTH: int = int(os.getenv("MEMO_MIN_LENGTH", "300"))                    # Короче — повторяем вывод целиком, ссылка не окупается
+
+# --- ДЕТЕКТОР ЗАЦИКЛИВАНИЯ ---
+LOOP_NO_PROGRESS_LIMIT: int = int(os.getenv("LOOP_NO_PROGRESS_LIMIT", "3"))        # Итераций без прогресса до вмешательства
+LOOP_ESCALATION_MODEL: str = os.getenv("LOOP_ESCALATION_MODEL", "")                # Модель для эскалации (пусто — без эскалации)
+
+# --- МАРШРУТИЗАЦИЯ МОДЕЛЕЙ ---
+ROUTE_FAST_MODEL: str = os.getenv("ROUTE_FAST_MODEL", "")                          # Лёгкая модель для промежуточных шагов (пусто — всё на OLLAMA_MODEL)
+ROUTE_STRONG_TOOLS: set[str] = set(os.getenv("ROUTE_STRONG_TOOLS", "write_file,update_project_plan").split(","))  # Эти вызовы делает только большая модель
+# Переопределение по режимам: ROUTE_DEV_FAST, ROUTE_REVIEW_STRONG и т.д.
+MODEL_ROUTES: dict[str, dict[str, str]] = {
+    mode: {
+        "fast": os.getenv(f"ROUTE_{mode.upper()}_FAST", ROUTE_FAST_MODEL),
+        "strong": os.getenv(f"ROUTE_{mode.upper()}_STRONG", OLLAMA_MODEL),
+    }
+    for mode in ("dev", "review", "explain", "analyzer", "dialog_web")
+}
+
+# --- ПРЕДЗАГРУЗКА ---
+PREFETCH_ENABLED: bool = os.getenv("PREFETCH_ENABLED", "1") == "1"                 # Готовить вероятные вызовы, пока модель думает
+PREFETCH_MAX_TASKS: int = int(os.getenv("PREFETCH_MAX_TASKS", "6"))                # Предсказаний на итерацию
+PREFETCH_CONCURRENCY: int = int(os.getenv("PREFETCH_CONCURRENCY", "2"))            # Одновременных операций (нагрузка на CPU/диск)
+PREFETCH_MAX_FILE_BYTES: int = int(os.getenv("PREFETCH_MAX_FILE_BYTES", "262144"))  # Файлы больше не читаем заранее
+
+# --- SHELL ---
+SHELL_TIMEOUT: int = int(os.getenv("SHELL_TIMEOUT", "60"))                         # Таймаут команды по умолчанию
+SHELL_MAX_TIMEOUT: int = int(os.getenv("SHELL_MAX_TIMEOUT", "1800"))               # Верхняя граница таймаута, заданного моделью
+SHELL_HEAD_BYTES: int = int(os.getenv("SHELL_HEAD_BYTES", "800"))                  # Сколько байт начала вывода хранить (на поток)
+SHELL_TAIL_BYTES: int = int(os.getenv("SHELL_TAIL_BYTES", "2500"))                 # Сколько байт хвоста вывода хранить (на поток)
+SHELL_ERROR_LINES: int = int(os.getenv("SHELL_ERROR_LINES", "40"))                 # Сколько строк-ошибок выделять отдельно
+SHELL_OUTPUT_LIMIT: int = int(os.getenv("SHELL_OUTPUT_LIMIT", "8000"))             # Итоговый лимит символов для модели
+SHELL_ECHO: bool = os.getenv("SHELL_ECHO", "1") == "1"                             # Дублировать вывод команды в терминал
+
+# --- ПРОВЕРКИ (run_checks) ---
+CACHE_DIR: str = os.path.expanduser(os.getenv("AI_PM_CACHE_DIR", "~/.cache/ai_pm"))     # Локальные кэши (результаты проверок и т.п.)
+CHECKS_PARALLEL: int = int(os.getenv("CHECKS_PARALLEL", "4"))                      # Параллельных pytest-процессов
+CHECKS_TIMEOUT: int = int(os.getenv("CHECKS_TIMEOUT", "900"))                      # Таймаут одной проверки
+CHECKS_ERROR_LINES: int = int(os.getenv("CHECKS_ERROR_LINES", "15"))               # Строк ошибок на цель в ответе модели
+
+# --- НАБЛЮДЕНИЕ ЗА ФАЙЛАМИ ---
+WATCH_ENABLED: bool = os.getenv("WATCH_ENABLED", "1") == "1"                       # Следить за файлами активного проекта
+WATCH_DEBOUNCE_MS: int = int(os.getenv("WATCH_DEBOUNCE_MS", "300"))                # Склейка пачки изменений
+WATCH_POLL_INTERVAL: float = float(os.getenv("WATCH_POLL_INTERVAL", "2.0"))        # Период опроса без inotify (watchfiles)
+
+# --- СКАНИРОВАНИЕ ПРОЕКТА ---
+SCAN_MAX_BYTES: int = int(os.getenv("SCAN_MAX_BYTES", "300000"))                   # Общий лимит содержимого в скане
+SCAN_MAX_FILE_BYTES: int = int(os.getenv("SCAN_MAX_FILE_BYTES", "1000000"))        # Файлы больше — пропускаются (сгенерированные, дампы)
+SCAN_TOKEN_BUDGET: int = int(os.getenv("SCAN_TOKEN_BUDGET", "8000"))              # Бюджет токенов автоскана (файлы по релевантности)
+OUTLINE_MAX_SYMBOLS: int = int(os.getenv("OUTLINE_MAX_SYMBOLS", "120"))            # Символов на файл в outline
+OUTLINE_CACHE_SIZE: int = int(os.getenv("OUTLINE_CACHE_SIZE", "4000"))             # Файлов в кэше outline
 
 # --- ГЛОБАЛЬНЫЕ ПЕРЕМЕННЫЕ ---
 ACTIVE_PROJECT: Optional[Dict[str, Any]] = None
 DIALOG_MODE = False
-r: Optional[rediss.Redis] = None
-client: Optional[AsyncClient] = None
+r: Optional["rediss.Redis"] = None
+client: Optional["AsyncClient"] = None
 
 # --- СИСТЕМНЫЕ ПРОМПТЫ ---
 
@@ -85,12 +202,12 @@ SYSTEM_PROMPT_DEV = BASE_SYSTEM + """
 Всегда следуй этому порядку:
 
 1. Сканирование
-   - Первым делом используй `scan_directory`.
+   - Первым делом используй `scan_directory`: он возвращает карту проекта (файлы, классы, функции, сигнатуры, диапазоны строк).
    - Если список файлов есть — работай с ним; не пиши, что «проект пуст».
    - Если `scan_directory` вернул ошибку или пустоту — сообщи пользователю.
 
 2. Анализ
-   - Используй `read_file` для ключевых файлов.
+   - Используй `read_file` для ключевых файлов; по карте проекта читай нужные диапазоны через `start_line` / `end_line`.
    - Используй `search_code`, чтобы найти определения, структуры, ошибки.
    - Не выдумывай структуру проекта — опирайся на то, что реально есть.
 
@@ -114,7 +231,8 @@ SYSTEM_PROMPT_DEV = BASE_SYSTEM + """
      - исправь и повтори проверку.
 
 7. Проверка и тестирование
-   - Запускай проверки через `run_shell_command` (сборка, тесты).
+   - Запускай проверки через `run_checks`: он сам определит тип проекта и перезапустит только тесты/крейты, затронутые изменениями.
+   - `run_shell_command` используй для остальных команд.
    - Если проверки не проходят — вернись к шагу 6.
 
 8. Финализация
@@ -0,0 +1,153 @@
+import asyncio
+import os
+import signal
+import sys
+import threading
+from concurrent.futures import Future
+from typing import Any, Optional
+
+# --- АСИНХРОННЫЙ ВВОД ---
+# input() блокирует цикл событий: пока пользователь печатает, не работают наблюдатель,
+# фоновые синхронизации и prefetch. Здесь ввод читается без блокировки цикла.
+
+_session: Any = None
+_reader: Optional[asyncio.StreamReader] = None
+_backend: str = ""
+# Строка, которую ещё читает поток input() (после Ctrl-C поток не прервать — следующий ввод заберёт её)
+_pending: Optional[Future] = None
+
+
+def _init_backend() -> str:
+    """
+    Терминал: prompt_toolkit (история, редактирование строки), без него — input() в daemon-потоке.
+    Пайп: StreamReader на stdin. Терминал в StreamReader не отдаём: connect_read_pipe ставит O_NONBLOCK
+    на tty, общий со stdout, и крупный вывод агента падает с BlockingIOError.
+    """
+    global _session
+    if not sys.stdin.isatty():
+        return "stream"
+    try:
+        from prompt_toolkit import PromptSession
+    except ImportError:
+        return "thread"
+    _session = PromptSession()
+    return "prompt_toolkit"
+
+
+async def _stdin_reader() -> Optional[asyncio.StreamReader]:
+    global _reader
+    if _reader is None:
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader()
+        try:
+            await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+        except (ValueError, OSError, NotImplementedError):
+            # Обычный файл на stdin или платформа без поддержки пайпов в цикле
+            return None
+        _reader = reader
+    return _reader
+
+
+async def _interruptible(read: asyncio.Future) -> Any:
+    """Ждёт чтение строки; Ctrl-C отменяет только его и поднимает KeyboardInterrupt, как input()"""
+    loop = asyncio.get_running_loop()
+    interrupted: bool = False
+
+    def on_sigint() -> None:
+        nonlocal interrupted
+        interrupted = True
+        read.cancel()
+
+    previous = signal.getsignal(signal.SIGINT)
+    try:
+        loop.add_signal_handler(signal.SIGINT, on_sigint)
+    except (NotImplementedError, RuntimeError, ValueError):
+        previous = None
+    try:
+        return await read
+    except asyncio.CancelledError:
+        if interrupted:
+            print()
+            raise KeyboardInterrupt
+        raise
+    finally:
+        if previous is not None:
+            loop.remove_signal_handler(signal.SIGINT)
+            signal.signal(signal.SIGINT, previous)
+
+
+async def _read_stream(reader: asyncio.StreamReader, prompt: str) -> str:
+    sys.stdout.write(prompt)
+    sys.stdout.flush()
+
+    line: bytes = await _interruptible(asyncio.ensure_future(reader.readline()))
+    if not line:
+        raise EOFError
+    return line.decode(errors="replace").rstrip("\r\n")
+
+
+def _input_worker(prompt: str, future: Future) -> None:
+    try:
+        future.set_result(input(prompt))
+    except BaseException as e:
+        future.set_exception(e)
+
+
+async def _read_thread(prompt: str) -> str:
+    """
+    input() в daemon-потоке, а не в executor цикла: при выходе по Ctrl-C завершение цикла
+    ждёт потоки executor, и процесс зависал бы на потоке, застрявшем в input().
+    """
+    global _pending
+    if _pending is None or _pending.done():
+        _pending = Future()
+        threading.Thread(target=_input_worker, args=(prompt, _pending), name="console-input", daemon=True).start()
+    else:
+        # Прошлый поток ещё ждёт строку — он её и вернёт, приглашение выводим сами
+        sys.stdout.write(prompt)
+        sys.stdout.flush()
+    # shield: отмена ожидания не должна отменять Future, который заполнит поток
+    line: str = await _interruptible(asyncio.shield(asyncio.wrap_future(_pending)))
+    _pending = None
+    return line
+
+
+async def ainput(prompt: str = "") -> str:
+    """Аналог input() для цикла событий: EOFError / KeyboardInterrupt как у input()"""
+    global _backend
+    if not _backend:
+        _backend = _init_backend()
+
+    if _backend == "prompt_toolkit":
+        from prompt_toolkit.formatted_text import ANSI
+        from prompt_toolkit.patch_stdout import patch_stdout
+
+        # Фоновый вывод печатается над строкой ввода, не ломая её
+        with patch_stdout(raw=True):
+            return await _session.prompt_async(ANSI(prompt))
+
+    if _backend == "stream":
+        reader = await _stdin_reader()
+        if reader is not None:
+            return await _read_stream(reader, prompt)
+        _backend = "thread"
+    return await _read_thread(prompt)
+
+
+def close() -> None:
+    """connect_read_pipe переводит stdin-пайп в неблокирующий режим — возвращаем как было"""
+    if _reader is not None:
+        try:
+            os.set_blocking(sys.stdin.fileno(), True)
+        except (OSError, ValueError):
+            pass
+
+
+def run(main: Any) -> None:
+    """Запуск корутины на uvloop, если он установлен"""
+    try:
+        import uvloop
+    except ImportError:
+        asyncio.run(main)
+        return
+    uvloop.run(main)
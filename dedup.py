@@ -0,0 +1,108 @@
+import re
+from collections import Counter
+from typing import Any, Callable, Iterable
+
+from config import *
+
+# --- УДАЛЕНИЕ ПОЧТИ-ДУБЛИКАТОВ ---
+# Зеркала документации и агрегаторы отдают почти тот же текст, что и первоисточник.
+# SimHash (64 бита) по шинглам из слов; кандидаты ищутся по 4 полосам по 16 бит:
+# при расстоянии Хэмминга ≤ 3 хотя бы одна полоса совпадает, так что проход линейный.
+
+BITS: int = 64
+BANDS: int = 4
+BAND_BITS: int = BITS // BANDS
+
+WORD_RE = re.compile(r"\w+")
+
+# Короче — SimHash ненадёжен, сравниваем нормализованный текст целиком
+MIN_SIMHASH_CHARS: int = 200
+
+
+# Байт -> 8 «дорожек» по LANE бит с его битами (для каждой из 8 позиций байта в хэше):
+# счётчики всех 64 битов складываются одним сложением длинных целых, а не циклом по битам
+LANE: int = 24
+_SPREAD: list[list[int]] = [
+    [sum(1 << ((8 * k + bit) * LANE) for bit in range(8) if byte >> bit & 1) for byte in range(256)] for k in range(8)
+]
+
+
+def simhash(text: str, shingle: int = 3) -> int:
+    words: list[str] = WORD_RE.findall(text.lower())
+    features: Counter = Counter(
+        " ".join(words[i:i + shingle]) for i in range(max(1, len(words) - shingle + 1))
+    )
+    t0, t1, t2, t3, t4, t5, t6, t7 = _SPREAD
+    lanes: int = 0
+    for feature, count in features.items():
+        h: int = hash(feature)
+        spread: int = (t0[h & 0xFF] | t1[h >> 8 & 0xFF] | t2[h >> 16 & 0xFF] | t3[h >> 24 & 0xFF]
+                       | t4[h >> 32 & 0xFF] | t5[h >> 40 & 0xFF] | t6[h >> 48 & 0xFF] | t7[h >> 56 & 0xFF])
+        lanes += spread * count if count > 1 else spread
+    # Бит отпечатка = 1, если у большинства признаков (с весами) он установлен
+    half: float = sum(features.values()) / 2
+    lane_mask: int = (1 << LANE) - 1
+    return sum(1 << bit for bit in range(BITS) if (lanes >> (bit * LANE) & lane_mask) > half)
+
+
+class NearDuplicateIndex:
+    """Индекс отпечатков: поиск копии за O(число полос)"""
+
+    def __init__(self, threshold: int = DEDUP_MAX_DISTANCE) -> None:
+        self.threshold: int = threshold
+        self.bands: dict[tuple[int, int], list[int]] = {}
+        self.exact: set[str] = set()
+
+    def seen(self, text: str) -> bool:
+        """True, если похожий текст уже был; иначе текст добавляется в индекс"""
+        if len(text) < MIN_SIMHASH_CHARS:
+            key: str = " ".join(WORD_RE.findall(text.lower()))
+            if key in self.exact:
+                return True
+            self.exact.add(key)
+            return False
+
+        h: int = simhash(text)
+        keys: list[tuple[int, int]] = [(b, h >> (b * BAND_BITS) & ((1 << BAND_BITS) - 1)) for b in range(BANDS)]
+        for key in keys:
+            for other in self.bands.get(key, ()):
+                if (h ^ other).bit_count() <= self.threshold:
+                    return True
+        for key in keys:
+            self.bands.setdefault(key, []).append(h)
+        return False
+
+
+def unique(items: Iterable[Any], text_of: Callable[[Any], str]) -> tuple[list[Any], int]:
+    """Первые экземпляры (порядок items = предпочтение) и число отброшенных символов"""
+    index = NearDuplicateIndex()
+    kept: list[Any] = []
+    dropped: int = 0
+    for item in items:
+        text: str = text_of(item)
+        if text and index.seen(text):
+            dropped += len(text)
+            continue
+        kept.append(item)
+    return kept, dropped
+
+
+def drop_duplicates(pages: list[dict[str, Any]]) -> tuple[list[dict[str, Any]], int, int]:
+    """
+    Страницы-копии целиком, затем повторяющиеся фрагменты в оставшихся.
+    Копия остаётся у домена с большим priority (при равенстве — у более раннего результата).
+    Возвращает (страницы в исходном порядке, отброшено страниц, отброшено символов).
+    """
+    preferred: list[dict[str, Any]] = sorted(pages, key=lambda page: -page.get("priority", 0))
+    kept_pages, dropped_chars = unique(preferred, lambda page: "\n".join(p["text"] for p in page["passages"]))
+
+    fragments, passage_chars = unique(
+        (p for page in kept_pages for p in page["passages"]), lambda p: p["text"]
+    )
+    survivors: set[int] = {id(p) for p in fragments}
+    for page in kept_pages:
+        page["passages"] = [p for p in page["passages"] if id(p) in survivors]
+
+    kept_ids: set[int] = {id(page) for page in kept_pages}
+    result: list[dict[str, Any]] = [page for page in pages if id(page) in kept_ids and page["passages"]]
+    return result, len(pages) - len(kept_pages), dropped_chars + passage_chars
@@ -0,0 +1,85 @@
+import json
+from typing import Any, Optional
+
+from config import *
+from store import STORE
+
+# --- СЕССИИ ДИАЛОГА /dialog_web ---
+# У каждой сессии свой список в хранилище истории (REDIS_DIALOG_KEY:<имя>) с TTL: простаивающие
+# сессии истекают сами. Время последней активности — в индексе REDIS_DIALOG_INDEX (для списка сессий).
+# Запись — одно обращение: дописать, ограничить длину, продлить TTL, отметить активность.
+
+CURRENT: str = DIALOG_SESSION
+_migrated: bool = False
+
+
+def key(name: str) -> str:
+    return f"{REDIS_DIALOG_KEY}:{name}"
+
+
+async def _migrate_legacy() -> None:
+    """Общий список до появления сессий становится сессией по умолчанию"""
+    global _migrated
+    if _migrated:
+        return
+    _migrated = True
+    legacy: list[str] = await STORE.read(REDIS_DIALOG_KEY)
+    if legacy and not await STORE.length(key(DIALOG_SESSION)):
+        await STORE.replace(key(DIALOG_SESSION), legacy, ttl=DIALOG_SESSION_TTL, index=(REDIS_DIALOG_INDEX, DIALOG_SESSION))
+        await STORE.delete(REDIS_DIALOG_KEY)
+
+
+async def history(name: str, limit: int = MAX_DIALOG_HISTORY) -> list[dict[str, Any]]:
+    """Последние limit сообщений сессии"""
+    await _migrate_legacy()
+    raw: list[str] = await STORE.read(key(name), -limit, -1)
+    messages: list[dict[str, Any]] = []
+    for item in raw:
+        try:
+            messages.append(json.loads(item))
+        except json.JSONDecodeError:
+            continue
+    return messages
+
+
+async def append(name: str, *messages: dict[str, Any]) -> None:
+    """Дописывает сообщения одним обращением к хранилищу; длина списка не растёт сверх MAX_DIALOG_HISTORY * 2"""
+    await STORE.append(
+        key(name),
+        [json.dumps(m, ensure_ascii=False, default=str) for m in messages],
+        keep=MAX_DIALOG_HISTORY * 2,
+        ttl=DIALOG_SESSION_TTL,
+        index=(REDIS_DIALOG_INDEX, name),
+    )
+
+
+async def sessions() -> list[dict[str, Any]]:
+    """Живые сессии (последняя активность, сообщений, до истечения); истёкшие убираются из индекса"""
+    await _migrate_legacy()
+    index: list[tuple[str, float]] = list(reversed(await STORE.ranked(REDIS_DIALOG_INDEX)))
+    stats: list[tuple[int, int, int]] = await STORE.info([key(name) for name, _score in index])
+
+    alive: list[dict[str, Any]] = []
+    expired: list[str] = []
+    for (name, last_active), (length, memory, ttl) in zip(index, stats):
+        if not length:
+            expired.append(name)
+            continue
+        alive.append({"name": name, "messages": length, "last_active": last_active, "ttl": ttl, "memory": memory})
+    await STORE.forget(REDIS_DIALOG_INDEX, *expired)
+    return alive
+
+
+async def clean(name: Optional[str]) -> int:
+    """Удаляет сессию (name=None — все); возвращает число удалённых"""
+    names: list[str] = [s["name"] for s in await sessions()] if name is None else [name]
+    if not names:
+        return 0
+    deleted: int = await STORE.delete(*[key(n) for n in names])
+    await STORE.forget(REDIS_DIALOG_INDEX, *names)
+    return deleted
+
+
+def switch(name: str) -> None:
+    global CURRENT
+    CURRENT = name
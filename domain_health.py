@@ -0,0 +1,105 @@
+import json
+import time
+import typing as t
+from typing import Any, Optional, cast
+
+from config import *
+from store import STORE
+
+# --- ЗДОРОВЬЕ ДОМЕНОВ ВЕБ-ПОИСКА ---
+# По каждому домену — скользящие средние (EWMA) задержки, доли ошибок и полезного текста.
+# Таблица живёт в Redis между сессиями: медленные и вечно падающие сайты получают короткий
+# таймаут, уходят вниз при выборе, а после серии ошибок временно исключаются (circuit breaker).
+
+
+class DomainHealth:
+    """Таблица домен -> {latency, errors, yield, samples, open_until}"""
+
+    def __init__(self) -> None:
+        self.table: dict[str, dict[str, float]] = {}
+        self._dirty: set[str] = set()
+
+    async def load(self) -> None:
+        """Один HGETALL на поиск; без Redis таблица живёт только в памяти"""
+        client: Optional[Any] = STORE.redis
+        if not client:
+            return
+        try:
+            raw: dict[str, str] = await cast(t.Awaitable[dict], client.hgetall(REDIS_DOMAIN_HEALTH_KEY))
+        except Exception as e:
+            print(f"{C_YELLOW}[WEB]{C_RESET} Таблица доменов недоступна: {e}")
+            return
+        for domain, value in raw.items():
+            try:
+                self.table[domain] = json.loads(value)
+            except json.JSONDecodeError:
+                continue
+
+    async def save(self) -> None:
+        client: Optional[Any] = STORE.redis
+        if not client or not self._dirty:
+            return
+        mapping: dict[str, str] = {d: json.dumps(self.table[d]) for d in self._dirty if d in self.table}
+        self._dirty.clear()
+        try:
+            await cast(t.Awaitable[int], client.hset(REDIS_DOMAIN_HEALTH_KEY, mapping=mapping))
+        except Exception as e:
+            print(f"{C_YELLOW}[WEB]{C_RESET} Не удалось сохранить таблицу доменов: {e}")
+
+    def is_open(self, domain: str) -> bool:
+        """Домен временно исключён после серии ошибок"""
+        return self.table.get(domain, {}).get("open_until", 0) > time.time()
+
+    def timeout(self, domain: str) -> float:
+        """Таймаут по истории домена: с запасом от средней задержки, в пределах [DOMAIN_MIN_TIMEOUT, WEB_SEARCH_TIMEOUT]"""
+        stats: Optional[dict[str, float]] = self.table.get(domain)
+        if not stats or stats["samples"] < 3:
+            return float(WEB_SEARCH_TIMEOUT)
+        return max(DOMAIN_MIN_TIMEOUT, min(float(WEB_SEARCH_TIMEOUT), stats["latency"] * 3 + 1))
+
+    def score(self, domain: str) -> float:
+        """Ожидаемая польза: полезный текст за секунду с поправкой на ошибки (новые домены — авансом)"""
+        stats: Optional[dict[str, float]] = self.table.get(domain)
+        if not stats or stats["samples"] < 2:
+            return 1.0
+        return (1 - stats["errors"]) * min(stats["yield"] / 1000, 3.0) / (1 + stats["latency"] / 5)
+
+    def record(self, domain: str, seconds: float, ok: bool, useful_chars: int = 0) -> None:
+        stats: dict[str, float] = self.table.setdefault(
+            domain, {"latency": seconds, "errors": 0.0 if ok else 1.0, "yield": float(useful_chars), "samples": 0, "open_until": 0}
+        )
+        a: float = DOMAIN_EWMA_ALPHA
+        stats["latency"] += a * (seconds - stats["latency"])
+        stats["errors"] += a * ((0.0 if ok else 1.0) - stats["errors"])
+        stats["yield"] += a * (useful_chars - stats["yield"])
+        stats["samples"] += 1
+        if ok:
+            stats["open_until"] = 0
+        elif stats["samples"] >= 3 and stats["errors"] >= DOMAIN_BREAKER_ERRORS:
+            # Пробная попытка после паузы (half-open): новая ошибка снова закрывает домен
+            stats["open_until"] = time.time() + DOMAIN_BREAKER_SECONDS
+        self._dirty.add(domain)
+
+    def rank(self, selected: list[dict[str, Any]], limit: int) -> tuple[list[dict[str, Any]], list[str]]:
+        """Исключает закрытые домены и упорядочивает равные по приоритету по ожидаемой пользе"""
+        skipped: list[str] = [item["domain"] for item in selected if self.is_open(item["domain"])]
+        alive: list[dict[str, Any]] = [item for item in selected if not self.is_open(item["domain"])]
+        alive.sort(key=lambda item: (-item["priority"], -self.score(item["domain"]), item["position"]))
+        return alive[:limit], skipped
+
+    def report(self, limit: int = 30) -> str:
+        """Таблица для /web_stats"""
+        if not self.table:
+            return "Статистики по доменам ещё нет."
+        rows: list[str] = [f"{'Домен':<34} {'Запросов':>8} {'Задержка':>9} {'Ошибки':>7} {'Текст':>7} {'Таймаут':>8}  Статус"]
+        ordered = sorted(self.table.items(), key=lambda kv: -kv[1]["samples"])[:limit]
+        for domain, s in ordered:
+            status: str = "исключён" if self.is_open(domain) else ""
+            rows.append(
+                f"{domain[:34]:<34} {int(s['samples']):>8} {s['latency']:>8.1f}с {s['errors'] * 100:>6.0f}% "
+                f"{int(s['yield']):>7} {self.timeout(domain):>7.0f}с  {status}"
+            )
+        return "\n".join(rows)
+
+
+HEALTH = DomainHealth()
@@ -0,0 +1,103 @@
+import codecs
+import re
+from typing import Any, Optional
+
+from config import *
+
+# --- ПОТОКОВАЯ ЗАГРУЗКА СТРАНИЦ ---
+# Тело читается кусками до WEB_FETCH_MAX_BYTES (после распаковки): документация на 5 МБ
+# не буферизуется целиком, не-HTML и заведомо огромные ответы обрываются по заголовкам.
+
+CHUNK: int = 64 * 1024
+# Где искать <meta charset>: по стандарту — в первых 1024 байтах, берём с запасом
+SNIFF_BYTES: int = 4096
+
+META_CHARSET_RE = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([A-Za-z0-9_.:-]+)""", re.I)
+HTML_TYPES: tuple[str, ...] = ("text/html", "application/xhtml+xml")
+
+_accept_encoding: str = ""
+
+
+def accept_encoding() -> str:
+    """gzip/deflate всегда; br и zstd — только если aiohttp сможет их распаковать"""
+    global _accept_encoding
+    if not _accept_encoding:
+        encodings: list[str] = ["gzip", "deflate"]
+        try:
+            import brotli  # noqa: F401
+            encodings.append("br")
+        except ImportError:
+            try:
+                import brotlicffi  # noqa: F401
+                encodings.append("br")
+            except ImportError:
+                pass
+        # Класс ZSTDDecompressor есть в aiohttp всегда; распаковка работает, только если найден модуль zstd
+        try:
+            from aiohttp.compression_utils import HAS_ZSTD
+        except ImportError:
+            HAS_ZSTD = False
+        if HAS_ZSTD:
+            encodings.append("zstd")
+        _accept_encoding = ", ".join(encodings)
+    return _accept_encoding
+
+
+def request_headers() -> dict[str, str]:
+    return {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+        'Accept-Language': 'en-US,en;q=0.9',
+        'Accept-Encoding': accept_encoding(),
+    }
+
+
+def detect_charset(header_charset: Optional[str], head: bytes) -> str:
+    """Кодировка: BOM → заголовок Content-Type → <meta charset> → utf-8"""
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    candidates: list[Optional[str]] = [header_charset]
+    m = META_CHARSET_RE.search(head[:SNIFF_BYTES])
+    if m:
+        candidates.append(m.group(1).decode("ascii", "ignore"))
+    for name in candidates:
+        if not name:
+            continue
+        try:
+            return codecs.lookup(name).name
+        except LookupError:
+            continue
+    return "utf-8"
+
+
+async def fetch_html(session: Any, url: str, max_bytes: int = WEB_FETCH_MAX_BYTES) -> tuple[Optional[str], str, int]:
+    """
+    (html или None, пометка для вывода, прочитано байт).
+    Пометка непустая, если страница пропущена или обрезана по лимиту.
+    """
+    async with session.get(url, headers=request_headers(), allow_redirects=True, max_redirects=2) as resp:
+        content_type: str = resp.headers.get('content-type', '').lower()
+        if not any(t in content_type for t in HTML_TYPES):
+            return None, f"Не HTML: {content_type}", 0
+        # Content-Length — размер до распаковки (HTML сжимается ~4x); больше лимита даже с этой поправкой —
+        # дамп или архив, а не документ: не скачиваем вовсе
+        if resp.content_length is not None and resp.content_length > max_bytes * 4:
+            return None, f"Слишком большой ответ: {resp.content_length // 1024} КБ", 0
+
+        html, truncated, size = await read_body(resp, max_bytes)
+    return html, (f"обрезано до {max_bytes // 1024} КБ" if truncated else ""), size
+
+
+async def read_body(resp: Any, max_bytes: int = WEB_FETCH_MAX_BYTES) -> tuple[str, bool, int]:
+    """Тело ответа кусками до max_bytes: (текст, обрезано ли, прочитано байт)"""
+    chunks: list[bytes] = []
+    size: int = 0
+    truncated: bool = False
+    async for chunk in resp.content.iter_chunked(CHUNK):
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= max_bytes:
+            truncated = True
+            break
+    body: bytes = b"".join(chunks)[:max_bytes]
+    return body.decode(detect_charset(resp.charset, body), errors="replace"), truncated, size
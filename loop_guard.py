@@ -0,0 +1,120 @@
+import hashlib
+import json
+import re
+from typing import Any, Optional
+
+from config import *
+
+# --- ДЕТЕКТОР ЗАЦИКЛИВАНИЯ АГЕНТА ---
+
+# Признаки неудачного результата инструмента
+ERROR_RE = re.compile(
+    r"^(Ошибка|Таймаут|Критическая ошибка|Не удалось|Ничего не найдено|Не найдено|\[ERROR\])"
+    r"|\berror(\[E\d+\])?:|Traceback \(most recent call last\)|^EXIT: (?!0 )|\"ok\": false",
+    re.IGNORECASE | re.MULTILINE,
+)
+ANSI_RE = re.compile(r"\033\[[0-9;]*m")
+
+# Статистика за сессию CLI
+SESSION_STATS: dict[str, int] = {"interventions": 0, "escalations": 0, "stops": 0, "iterations_saved": 0}
+
+
+def _digest(value: Any) -> str:
+    return hashlib.sha1(json.dumps(value, sort_keys=True, ensure_ascii=False, default=str).encode()).hexdigest()[:16]
+
+
+def is_failure(result: str) -> bool:
+    """Результат инструмента похож на ошибку или пустой ответ"""
+    text: str = ANSI_RE.sub("", result or "").strip()
+    return not text or text.startswith("[MEMO]") or bool(ERROR_RE.search(text[:2000]))
+
+
+class LoopGuard:
+    """Отслеживает повторы вызовов инструментов и итерации без прогресса"""
+
+    def __init__(self, max_iterations: int, label: str = "AGENT") -> None:
+        self.max_iterations: int = max_iterations
+        self.label: str = label
+        self.fingerprints: list[str] = []
+        self.seen: dict[str, int] = {}
+        self.streak: int = 0
+        self.level: int = 0
+        self.last_calls: list[str] = []
+
+    def _cycle(self) -> bool:
+        """Хвост истории — повтор блока длины 1..3 (A A, A B A B, A B C A B C)"""
+        fps: list[str] = self.fingerprints
+        for period in (1, 2, 3):
+            if len(fps) >= period * 2 and fps[-period:] == fps[-2 * period:-period]:
+                return True
+        return False
+
+    def observe(self, calls: list[tuple[str, dict[str, Any], str]]) -> Optional[str]:
+        """
+        Учитывает итерацию (имя, аргументы, результат каждого вызова).
+        Возвращает действие: None, "warn", "escalate" или "stop".
+        """
+        progress = False
+        parts: list[str] = []
+        self.last_calls = []
+        for name, args, result in calls:
+            call_key: str = f"{name}:{_digest(args)}:{_digest(result)}"
+            parts.append(call_key)
+            self.last_calls.append(f"{name}({json.dumps(args, ensure_ascii=False, default=str)[:120]})")
+            if call_key not in self.seen and not is_failure(result):
+                progress = True
+            self.seen[call_key] = self.seen.get(call_key, 0) + 1
+
+        self.fingerprints.append(_digest(sorted(parts)))
+        self.streak = 0 if progress else self.streak + 1
+
+        if not self._cycle() and self.streak < LOOP_NO_PROGRESS_LIMIT:
+            return None
+
+        self.streak = 0
+        self.fingerprints.clear()
+        self.level += 1
+        match self.level:
+            case 1:
+                SESSION_STATS["interventions"] += 1
+                return "warn"
+            case 2 if LOOP_ESCALATION_MODEL:
+                SESSION_STATS["escalations"] += 1
+                return "escalate"
+            case 2:
+                SESSION_STATS["interventions"] += 1
+                return "warn"
+            case _:
+                return "stop"
+
+    def note(self) -> dict[str, str]:
+        """Корректирующее системное сообщение для модели"""
+        calls: str = ", ".join(self.last_calls) or "—"
+        return {
+            "role": "system",
+            "content": (
+                "ВНИМАНИЕ: ты повторяешь одни и те же вызовы инструментов без прогресса "
+                f"(последние: {calls}). Не повторяй их. Измени подход: другие аргументы, "
+                "другой инструмент, либо дай итоговый ответ на основе уже полученных данных."
+            ),
+        }
+
+    def final_message(self) -> str:
+        """Ответ пользователю при остановке: ход не обрывается молча"""
+        calls: str = ", ".join(self.last_calls) or "—"
+        return (f"Остановился: повторял одни и те же вызовы инструментов без прогресса (последние: {calls}). "
+                "Уточните задачу или подскажите другой подход.")
+
+    def stop(self, iteration: int) -> int:
+        """Фиксирует досрочную остановку, возвращает число сэкономленных итераций"""
+        saved: int = max(0, self.max_iterations - iteration - 1)
+        SESSION_STATS["stops"] += 1
+        SESSION_STATS["iterations_saved"] += saved
+        print(f"{C_YELLOW}[LOOP]{C_RESET} [{self.label}] Агент зациклился — остановлен на итерации {iteration + 1}, "
+              f"сэкономлено итераций: {saved}")
+        return saved
+
+
+def session_report() -> str:
+    return (f"вмешательств: {SESSION_STATS['interventions']}, эскалаций: {SESSION_STATS['escalations']}, "
+            f"остановок: {SESSION_STATS['stops']}, сэкономлено итераций: {SESSION_STATS['iterations_saved']}")
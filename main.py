@@ -1,5 +1,20 @@
+# Первым: хук профилирования импортов (--profile-startup)
+from startup import PROFILE
 import asyncio
+import time
+from datetime import datetime, timedelta
 import bd
+import ant
+import console
+import dialogs
+import domain_health
+import loop_guard
+import mirror
+import routing
+import watcher
+import scanner
+import store
+import transcripts
 from tools import *
 from config import *
 
@@ -9,25 +24,42 @@ async def main() -> None:
     """Главная CLI-функция"""
     global ACTIVE_PROJECT, r
 
-    if not await bd.init_db():
+    PROFILE.mark("импорты")
+
+    # Сервисы независимы — подключаемся параллельно
+    db_ok, redis_ok, ollama_ok = await asyncio.gather(
+        PROFILE.timed("init_db", bd.init_db()),
+        PROFILE.timed("init_redis", bd.init_redis()),
+        PROFILE.timed("init_ollama", bd.init_ollama()),
+    )
+
+    if not db_ok:
         print(f"{C_RED}Ошибка инициализации БД. Выход.{C_RESET}")
         return
 
-    if not await bd.init_redis():
-        print(f"{C_YELLOW}Предупреждение: Redis недоступен. История не будет сохранена.{C_RESET}")
+    if not redis_ok and STORE_BACKEND == "auto":
+        print(f"{C_YELLOW}Предупреждение: Redis недоступен — история в памяти процесса с журналом в PostgreSQL.{C_RESET}")
+    await store.STORE.start(bd.r)
 
-    if not await bd.init_ollama():
-        print(f"{C_RED}Ошибка подключения к Ollama. Выход.{C_RESET}")
-        return
+    if not ollama_ok:
+        if not ANTHROPIC_FAILOVER:
+            print(f"{C_RED}Ошибка подключения к Ollama. Выход.{C_RESET}")
+            return
+        print(f"{C_YELLOW}Ollama недоступна — запросы пойдут через Anthropic ({ANTHROPIC_MODEL}, {ANTHROPIC_BASE_URL}).{C_RESET}")
+
+    # Зеркало документации обновляется в фоне по расписанию
+    mirror.MIRROR.start()
 
     print_header()
     print_help()
+    PROFILE.mark("первый промпт")
+    PROFILE.report()
 
     try:
         while True:
             try:
                 prompt_proj: str = f"{C_CYAN}[{bd.ACTIVE_PROJECT['name']}]{C_RESET} " if bd.ACTIVE_PROJECT else ""
-                user_input: str = input(f"{C_YELLOW}➜ {C_RESET}{prompt_proj}")
+                user_input: str = await console.ainput(f"{C_YELLOW}➜ {C_RESET}{prompt_proj}")
             except (EOFError, KeyboardInterrupt):
                 break
 
@@ -43,8 +75,9 @@ async def main() -> None:
 
                 case "/close":
                     if bd.ACTIVE_PROJECT:
-                        await bd.sync_redis_to_db(project_id=bd.ACTIVE_PROJECT["id"])
+                        await transcripts.persist(bd.ACTIVE_PROJECT["id"])
                         await bd.update_project_fields(fields={"status": "closed"})
+                        await watcher.stop_watching()
                         name = bd.ACTIVE_PROJECT["name"]
                         bd.ACTIVE_PROJECT = None
                         print(f"{C_GREEN}[CLOSED]{C_RESET} Проект '{name}' сохранен.")
@@ -103,6 +136,7 @@ async def main() -> None:
                         name: str = parts[1]
                         if bd.ACTIVE_PROJECT and bd.ACTIVE_PROJECT.get("name") == name:
                             bd.ACTIVE_PROJECT = None
+                            await watcher.stop_watching()
                         await bd.delete_project(name)
                     else:
                         print(f"{C_RED}[ERROR]{C_RESET} Укажите имя проекта для удаления.")
@@ -132,6 +166,41 @@ async def main() -> None:
                         print(f"{C_RED}[ERROR]{C_RESET} Не удалось удалить путь к документации.")
                     continue
 
+                case "/scan_profile":
+                    if not bd.ACTIVE_PROJECT:
+                        print(f"{C_RED}[ERROR]{C_RESET} Нет проекта.{C_RESET}")
+                        continue
+                    current: dict = json.loads(bd.ACTIVE_PROJECT.get("scan_profile") or "{}")
+                    if len(parts) == 1:
+                        effective: dict = scanner.load_profile(bd.ACTIVE_PROJECT.get("scan_profile"))
+                        for key, value in effective.items():
+                            mark: str = "" if key in current else f" {C_GRAY}(по умолчанию){C_RESET}"
+                            shown: str = ", ".join(value) if isinstance(value, list) else str(value)
+                            print(f"{C_CYAN}{key}{C_RESET}: {shown}{mark}")
+                        continue
+                    if parts[1] == "reset":
+                        current = {}
+                    else:
+                        # Формат: include=*.py,*.rs exclude=tests/fixtures/* max_bytes=200000
+                        # Сначала проверяются все параметры: при любой ошибке профиль не меняется
+                        changes: dict = {}
+                        invalid: list[str] = []
+                        for item in parts[1:]:
+                            key, _, value = item.partition("=")
+                            if key in ("include", "exclude"):
+                                changes[key] = [v for v in value.split(",") if v]
+                            elif key in ("max_bytes", "max_file_bytes") and value.isdigit():
+                                changes[key] = int(value)
+                            else:
+                                invalid.append(item)
+                        if invalid:
+                            print(f"{C_RED}[ERROR]{C_RESET} Неизвестные параметры: {' '.join(invalid)}. Профиль не изменён.")
+                            continue
+                        current.update(changes)
+                    await bd.update_project_fields(fields={"scan_profile": json.dumps(current) if current else None})
+                    print(f"{C_GREEN}[OK]{C_RESET} Профиль сканирования сохранен.")
+                    continue
+
                 case "/analyze":
                     if not bd.ACTIVE_PROJECT:
                         print(f"{C_RED}[ERROR]{C_RESET} Нет проекта.{C_RESET}")
@@ -193,20 +262,31 @@ async def main() -> None:
                     question: str = " ".join(parts[1:]) if len(parts) > 1 else ""
                     if not question:
                         print(f"{C_BLUE}[DIALOG]{C_RESET} Режим свободного диалога активирован.")
-                        print(f"{C_GRAY}История сохраняется в Redis. Введите сообщение для общения или 'выход' для завершения.{C_RESET}")
+                        print(f"{C_GRAY}Сессия «{dialogs.CURRENT}», история сохраняется в Redis. Введите сообщение для общения или 'выход' для завершения.{C_RESET}")
                         DIALOG_MODE = True
                         continue
                     else:
                         await dialog_web_loop(user_input=question)
                     continue
 
+                case "/dialog_session":
+                    if len(parts) > 1:
+                        dialogs.switch(parts[1])
+                        print(f"{C_BLUE}[DIALOG]{C_RESET} Текущая сессия: {parts[1]}")
+                    else:
+                        print(f"{C_BLUE}[DIALOG]{C_RESET} Текущая сессия: {dialogs.CURRENT}")
+                    continue
+
                 case "/dialog_status":
-                    status: str = await get_dialog_status()
+                    status: str = await get_dialog_status(parts[1] if len(parts) > 1 else None)
                     print(status)
                     continue
 
                 case "/dialog_clean":
-                    result: str = await clean_dialog_history()
+                    if len(parts) > 1 and parts[1] == "--all":
+                        result: str = await clean_dialog_history(all_sessions=True)
+                    else:
+                        result = await clean_dialog_history(parts[1] if len(parts) > 1 else None)
                     print(result)
                     continue
 
@@ -214,6 +294,80 @@ async def main() -> None:
                     print_help()
                     continue
 
+                case "/history":
+                    if len(parts) < 3 or parts[1] != "search":
+                        print(f"{C_GRAY}Использование: /history search <запрос> [--all] [--days N] [--since ГГГГ-ММ-ДД] [--until ГГГГ-ММ-ДД]{C_RESET}")
+                        continue
+                    words: list[str] = []
+                    all_projects: bool = not bd.ACTIVE_PROJECT
+                    since = until = None
+                    tokens = iter(parts[2:])
+                    try:
+                        for token in tokens:
+                            match token:
+                                case "--all":
+                                    all_projects = True
+                                case "--days":
+                                    since = datetime.now() - timedelta(days=int(next(tokens)))
+                                case "--since":
+                                    since = datetime.fromisoformat(next(tokens))
+                                case "--until":
+                                    until = datetime.fromisoformat(next(tokens))
+                                case _:
+                                    words.append(token)
+                    except (StopIteration, ValueError):
+                        print(f"{C_RED}Некорректные параметры поиска.{C_RESET}")
+                        continue
+                    if not words:
+                        print(f"{C_GRAY}Пустой запрос.{C_RESET}")
+                        continue
+                    try:
+                        started = time.perf_counter()
+                        rows = await bd.search_history(
+                            " ".join(words),
+                            project_id=None if all_projects else bd.ACTIVE_PROJECT["id"],
+                            since=since,
+                            until=until,
+                        )
+                    except Exception as e:
+                        print(f"{C_RED}[DB ERROR]{C_RESET} {e}")
+                        continue
+                    print(format_history(rows) if rows else f"{C_GRAY}Ничего не найдено.{C_RESET}")
+                    print(f"{C_GRAY}[HISTORY]{C_RESET} {len(rows)} совпадений за {(time.perf_counter() - started) * 1000:.0f} мс")
+                    continue
+
+                case "/routes":
+                    print(routing.routes_report())
+                    continue
+
+                case "/transcripts":
+                    if len(parts) > 1 and parts[1] == "compact":
+                        if TRANSCRIPT_COLD_DAYS <= 0:
+                            print(f"{C_GRAY}Сжатый архив выключен (TRANSCRIPT_COLD_DAYS=0).{C_RESET}")
+                            continue
+                        segments, moved = await transcripts.compact()
+                        print(f"{C_GRAY}[HISTORY]{C_RESET} Перенесено {moved} сообщений в {segments} сжатых сегментов.")
+                    print(await transcripts.report())
+                    continue
+
+                case "/web_stats":
+                    await domain_health.HEALTH.load()
+                    print(domain_health.HEALTH.report())
+                    continue
+
+                case "/mirror":
+                    if len(parts) > 1 and parts[1] == "refresh":
+                        if not MIRROR_ROOTS:
+                            print(f"{C_GRAY}MIRROR_ROOTS не задан.{C_RESET}")
+                            continue
+                        print(f"{C_GRAY}[MIRROR]{C_RESET} Обход: {', '.join(MIRROR_ROOTS)}")
+                        stats = await mirror.MIRROR.refresh()
+                        print(f"{C_GRAY}[MIRROR]{C_RESET} Новых/изменённых {stats['fetched']}, без изменений {stats['unchanged']}, ошибок {stats['failed']} за {stats['seconds']:.0f}с")
+                        # Первый ручной обход включает обновление по расписанию
+                        mirror.MIRROR.start()
+                    print(mirror.MIRROR.report())
+                    continue
+
                 case "/ant":
                     question: str = " ".join(parts[1:]) if len(parts) > 1 else ""
                     if not question:
@@ -221,16 +375,16 @@ async def main() -> None:
                         print(f"{C_GRAY}Модель: {ANTHROPIC_MODEL} | URL: {ANTHROPIC_BASE_URL}{C_RESET}")
                         while True:
                             try:
-                                user_q: str = input(f"{C_YELLOW}ant> {C_RESET}")
+                                user_q: str = await console.ainput(f"{C_YELLOW}ant> {C_RESET}")
                                 if user_q.lower() in ["exit", "quit", "/exit"]:
                                     break
                                 if user_q.strip():
-                                    await bd.stream_anthropic(user_input=user_q)
+                                    await ant.converse(user_q)
                             except (KeyboardInterrupt, EOFError):
                                 break
                         print(f"\n{C_GRAY}[ANT] Диалог завершен{C_RESET}")
                     else:
-                        await bd.stream_anthropic(user_input=question)
+                        await ant.converse(question)
                     continue
 
                 case _:
@@ -252,15 +406,22 @@ async def main() -> None:
                     await bd.agent_loop(user_input, mode=mode)
 
     finally:
+        if loop_guard.SESSION_STATS["interventions"] or loop_guard.SESSION_STATS["stops"]:
+            print(f"{C_GRAY}[LOOP]{C_RESET} За сессию: {loop_guard.session_report()}")
+        await watcher.stop_watching()
+        await mirror.MIRROR.stop()
         if bd.ACTIVE_PROJECT:
-            await bd.sync_redis_to_db(project_id=bd.ACTIVE_PROJECT["id"])
+            await transcripts.persist(bd.ACTIVE_PROJECT["id"])
             print(f"{C_GRAY}💾{C_RESET} Проект сохранен.")
+        await store.STORE.stop()
+        await ant.close()
         if bd.r:
             await bd.r.aclose()
+        console.close()
 
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main=main())
+        console.run(main())
     except KeyboardInterrupt:
         print(f"\n{C_GRAY}👋 До свидания!{C_RESET}")
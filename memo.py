@@ -0,0 +1,111 @@
+import json
+import os
+from typing import Any, Optional
+
+from config import *
+
+# --- МЕМОИЗАЦИЯ READ-ONLY ИНСТРУМЕНТОВ ---
+
+# Инструменты без побочных эффектов: их результат зависит только от файлов
+MEMO_TOOLS: set[str] = {"read_file", "search_code", "search_docs", "scan_directory"}
+
+# Префиксы ответов-ошибок, которые нет смысла кэшировать
+ERROR_PREFIXES: tuple[str, ...] = ("Ошибка", "Таймаут", "Файл не найден", "Нет проекта", "Нет документации", C_RED)
+
+
+class ToolMemo:
+    """Кэш результатов инструментов в пределах одного запроса к агенту"""
+
+    def __init__(self) -> None:
+        self.calls: int = 0
+        self.reset()
+
+    def reset(self) -> None:
+        """Сбрасывает записи (история прошлых запросов может быть уже обрезана)"""
+        self.entries: dict[str, dict[str, Any]] = {}
+        self.generation: int = 0
+        self.hits: int = 0
+        self.saved_chars: int = 0
+
+    @staticmethod
+    def make_key(name: str, args: dict[str, Any]) -> str:
+        """Ключ вызова: имя инструмента + нормализованные аргументы"""
+        norm: dict[str, Any] = {}
+        for k, v in args.items():
+            if isinstance(v, str):
+                v = v.strip()
+                if k == "path":
+                    v = os.path.normpath(v)
+            norm[k] = v
+        return f"{name}:{json.dumps(norm, sort_keys=True, ensure_ascii=False, default=str)}"
+
+    def fingerprint(self, name: str, args: dict[str, Any], base_path: str) -> Any:
+        """Отпечаток входных данных: mtime/размер файла или поколение проекта"""
+        if name == "read_file":
+            try:
+                st = os.stat(os.path.join(base_path, str(args.get("path", "")).strip()))
+                return st.st_mtime_ns, st.st_size
+            except OSError:
+                return None
+        return self.generation
+
+    def lookup(self, name: str, args: dict[str, Any], base_path: str) -> Optional[str]:
+        """Возвращает короткую ссылку на прошлый вызов, если данные не менялись"""
+        if name not in MEMO_TOOLS:
+            return None
+
+        key: str = self.make_key(name, args)
+        entry = self.entries.get(key)
+        if not entry:
+            return None
+
+        if entry["fp"] != self.fingerprint(name, args, base_path):
+            del self.entries[key]
+            return None
+
+        self.hits += 1
+        self.saved_chars += entry["size"]
+        return (f"[MEMO] Результат {name} не изменился с вызова #{entry['call']}. "
+                f"Используй вывод вызова #{entry['call']} выше, повторять его не нужно.")
+
+    def record(self, name: str, args: dict[str, Any], base_path: str, result: str) -> str:
+        """Запоминает результат вызова и применяет побочные эффекты инструмента"""
+        self.calls += 1
+
+        match name:
+            case "write_file":
+                self.invalidate_paths([os.path.join(base_path, str(args.get("path", "")).strip())], base_path)
+                return result
+            case "run_shell_command":
+                # Shell может изменить что угодно — сбрасываем всё
+                self.entries.clear()
+                self.generation += 1
+                return result
+
+        if name not in MEMO_TOOLS or len(result) < MEMO_MIN_LENGTH or result.startswith(ERROR_PREFIXES):
+            return result
+
+        self.entries[self.make_key(name, args)] = {
+            "call": self.calls,
+            "fp": self.fingerprint(name, args, base_path),
+            "size": len(result),
+        }
+        return f"[вызов #{self.calls}]\n{result}"
+
+    def invalidate_paths(self, paths: list[str], base_path: str) -> None:
+        """Сбрасывает записи для изменённых файлов и поколение для сканов/поиска"""
+        changed: set[str] = {os.path.normpath(os.path.abspath(p)) for p in paths}
+        for key in list(self.entries):
+            name, _, raw_args = key.partition(":")
+            if name != "read_file":
+                continue
+            path = json.loads(raw_args).get("path", "")
+            if os.path.normpath(os.path.abspath(os.path.join(base_path, path))) in changed:
+                del self.entries[key]
+        self.generation += 1
+
+    def stats(self) -> str:
+        return f"повторных вызовов: {self.hits}, сэкономлено ~{self.saved_chars} символов"
+
+
+MEMO = ToolMemo()
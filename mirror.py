@@ -0,0 +1,237 @@
+import asyncio
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+from urllib.parse import urldefrag, urljoin, urlparse
+
+from config import *
+import fetch
+import passages
+from ranking import tokenize
+
+# --- ЛОКАЛЬНОЕ ЗЕРКАЛО ДОКУМЕНТАЦИИ ---
+# Корни из MIRROR_ROOTS обходятся по расписанию; повторный обход — условными GET
+# (If-None-Match / If-Modified-Since), неизменённые страницы не скачиваются.
+# Текст страниц лежит в SQLite FTS5: search_backends опрашивает зеркало до выхода в сеть.
+
+SKIP_EXT_RE = re.compile(r"\.(?:png|jpe?g|gif|svg|ico|css|js|json|zip|gz|tar|pdf|woff2?|ttf|txt|xml)$", re.I)
+# Слова, по которым не стоит требовать совпадения в документации
+QUERY_STOPWORDS: set[str] = {
+    "what", "how", "is", "the", "a", "an", "of", "in", "to", "for", "and", "or", "does", "do", "can", "with",
+    "latest", "version", "new", "use", "using", "example", "examples",
+}
+# Сколько символов текста страницы хранить
+MAX_BODY_CHARS: int = 200_000
+
+SCHEMA: str = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    root TEXT NOT NULL,
+    title TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    links TEXT,
+    fetched_at REAL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS docs USING fts5(url UNINDEXED, title, body, tokenize = 'porter unicode61');
+"""
+
+
+def _fts_query(query: str) -> Optional[str]:
+    """Все значимые латинские слова запроса (неявный AND); кириллица в английской документации не найдётся"""
+    terms: list[str] = [t for t in dict.fromkeys(tokenize(query)) if t.isascii() and t not in QUERY_STOPWORDS]
+    if not terms:
+        return None
+    return " ".join(f'"{t}"' for t in terms[:8])
+
+
+class DocMirror:
+    """Локальная копия документации: обход корней, хранение и полнотекстовый поиск"""
+
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+        self._db: Optional[sqlite3.Connection] = None
+        self._task: Optional[asyncio.Task] = None
+        # Разбор и запись страниц идут в потоках: транзакции одного соединения не должны перемешиваться
+        self._write_lock: threading.Lock = threading.Lock()
+        self.last_refresh: dict[str, Any] = {}
+
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.executescript(SCHEMA)
+        return self._db
+
+    def search(self, query: str, limit: int = MIRROR_MAX_HITS) -> list[dict[str, str]]:
+        """Страницы зеркала по запросу (bm25, заголовок весомее текста)"""
+        match: Optional[str] = _fts_query(query)
+        if not match or not os.path.exists(self.path):
+            return []
+        try:
+            rows = self.db().execute(
+                "SELECT url, title, body FROM docs WHERE docs MATCH ? ORDER BY bm25(docs, 0.0, 5.0, 1.0) LIMIT ?",
+                (match, limit),
+            ).fetchall()
+        except sqlite3.Error as e:
+            print(f"{C_YELLOW}[MIRROR]{C_RESET} Ошибка поиска: {e}")
+            return []
+        return [{"url": url, "title": title, "body": body} for url, title, body in rows]
+
+    def _newest(self) -> Optional[float]:
+        """Время последней загрузки страницы; None — зеркало пусто"""
+        if not os.path.exists(self.path):
+            return None
+        return self.db().execute("SELECT MAX(fetched_at) FROM pages").fetchone()[0]
+
+    def _store(self, url: str, root: str, title: str, body: str, etag: Optional[str],
+               last_modified: Optional[str], links: list[str]) -> None:
+        db = self.db()
+        with self._write_lock, db:
+            db.execute(
+                "INSERT INTO pages (url, root, title, etag, last_modified, links, fetched_at) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET title = excluded.title, etag = excluded.etag, "
+                "last_modified = excluded.last_modified, links = excluded.links, fetched_at = excluded.fetched_at",
+                (url, root, title, etag, last_modified, "\n".join(links), time.time()),
+            )
+            db.execute("DELETE FROM docs WHERE url = ?", (url,))
+            db.execute("INSERT INTO docs (url, title, body) VALUES (?, ?, ?)", (url, title, body[:MAX_BODY_CHARS]))
+
+    def _touch(self, url: str) -> None:
+        """Страница не изменилась (304) — только время проверки"""
+        db = self.db()
+        with self._write_lock, db:
+            db.execute("UPDATE pages SET fetched_at = ? WHERE url = ?", (time.time(), url))
+
+    def _parse_and_store(self, html: str, url: str, root: str, etag: Optional[str], last_modified: Optional[str]) -> list[str]:
+        """Разбор страницы, выделение текста и запись; возвращает ссылки для обхода. Выполняется в потоке"""
+        from bs4 import BeautifulSoup
+
+        soup = BeautifulSoup(html, "html.parser")
+        links: list[str] = self._links(soup, url, root)
+        title: str = soup.title.get_text(strip=True) if soup.title else url
+        for tag in soup(["script", "style", "nav", "footer", "header", "aside", "form", "iframe", "noscript"]):
+            tag.decompose()
+        main = soup.find("main") or soup.find("article") or soup.find("div", role="main") or soup
+        body: str = passages.to_text(passages.extract(main, 0))
+        self._store(url, root, title, body, etag, last_modified, links)
+        return links
+
+    @staticmethod
+    def _links(soup: Any, url: str, root: str) -> list[str]:
+        """Ссылки внутри корня (без якорей и параметров)"""
+        found: dict[str, None] = {}
+        for a in soup.find_all("a", href=True):
+            link: str = urldefrag(urljoin(url, a["href"]))[0].split("?")[0]
+            if link.startswith(root) and not SKIP_EXT_RE.search(urlparse(link).path):
+                found[link] = None
+        return list(found)
+
+    async def _crawl(self, session: Any, root: str, stats: dict[str, int]) -> None:
+        queue: list[str] = [root]
+        seen: set[str] = {root}
+        visited: int = 0
+        while queue and visited < MIRROR_MAX_PAGES:
+            url: str = queue.pop(0)
+            visited += 1
+            row = self.db().execute("SELECT etag, last_modified, links FROM pages WHERE url = ?", (url,)).fetchone()
+            headers: dict[str, str] = fetch.request_headers()
+            if row and row[0]:
+                headers["If-None-Match"] = row[0]
+            if row and row[1]:
+                headers["If-Modified-Since"] = row[1]
+
+            links: list[str] = []
+            try:
+                async with session.get(url, headers=headers, allow_redirects=True, max_redirects=2) as resp:
+                    if resp.status == 304 and row:
+                        stats["unchanged"] += 1
+                        links = (row[2] or "").split("\n")
+                        await asyncio.to_thread(self._touch, url)
+                    elif resp.status == 200 and "html" in resp.headers.get("content-type", "").lower():
+                        html, _truncated, _size = await fetch.read_body(resp)
+                        # Разбор больших страниц занимает десятки миллисекунд — не на цикле событий
+                        links = await asyncio.to_thread(
+                            self._parse_and_store, html, url, root, resp.headers.get("ETag"), resp.headers.get("Last-Modified")
+                        )
+                        stats["fetched"] += 1
+                    else:
+                        stats["failed"] += 1
+            except Exception:
+                stats["failed"] += 1
+
+            for link in links:
+                if link and link not in seen:
+                    seen.add(link)
+                    queue.append(link)
+            await asyncio.sleep(MIRROR_CRAWL_DELAY)
+
+    async def refresh(self) -> dict[str, Any]:
+        """Один проход по всем корням; корни обходятся параллельно"""
+        import aiohttp
+
+        stats: dict[str, int] = {"fetched": 0, "unchanged": 0, "failed": 0}
+        started: float = time.monotonic()
+        timeout = aiohttp.ClientTimeout(total=WEB_SEARCH_TIMEOUT, connect=5, sock_read=10)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            await asyncio.gather(*(self._crawl(session, root, stats) for root in MIRROR_ROOTS))
+        self.last_refresh = {**stats, "seconds": time.monotonic() - started, "at": time.time()}
+        return self.last_refresh
+
+    async def _schedule(self) -> None:
+        while True:
+            newest: Optional[float] = self._newest()
+            due: float = (newest or 0) + MIRROR_REFRESH_HOURS * 3600 - time.time()
+            if due > 0:
+                await asyncio.sleep(due)
+            try:
+                stats = await self.refresh()
+                print(f"{C_GRAY}[MIRROR]{C_RESET} Обновлено: новых/изменённых {stats['fetched']}, без изменений {stats['unchanged']}, ошибок {stats['failed']}")
+            except Exception as e:
+                print(f"{C_YELLOW}[MIRROR]{C_RESET} Обновление не удалось: {e}")
+                await asyncio.sleep(MIRROR_REFRESH_HOURS * 3600)
+
+    def start(self) -> None:
+        """
+        Фоновое обновление по расписанию (MIRROR_REFRESH_HOURS). Пустое зеркало с корнями по умолчанию
+        не скачивается при первом запуске — только если MIRROR_ROOTS задан явно или после /mirror refresh.
+        """
+        if not MIRROR_ROOTS or self._task is not None:
+            return
+        if not MIRROR_AUTOSTART and self._newest() is None:
+            return
+        self._task = asyncio.create_task(self._schedule())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def report(self) -> str:
+        """Сводка для /mirror: страниц по корням и время последнего обхода"""
+        if not os.path.exists(self.path):
+            return "Зеркало пусто. /mirror refresh — скачать документацию из MIRROR_ROOTS."
+        rows = self.db().execute("SELECT root, COUNT(*), MAX(fetched_at) FROM pages GROUP BY root ORDER BY root").fetchall()
+        lines: list[str] = [f"{self.path} ({os.path.getsize(self.path) // 1024} КБ)"]
+        for root, count, fetched_at in rows:
+            lines.append(f"  {root}: {count} стр., обновлено {time.strftime('%Y-%m-%d %H:%M', time.localtime(fetched_at))}")
+        return "\n".join(lines)
+
+
+def as_page(hit: dict[str, str], index: int) -> dict[str, Any]:
+    """Страница зеркала в формате web_search_tool (официальная документация — высший приоритет)"""
+    return {"index": index, "title": hit["title"], "url": hit["url"], "priority": 100,
+            "passages": passages.from_text(hit["body"], index)}
+
+
+MIRROR = DocMirror(os.path.join(CACHE_DIR, "docs_mirror.db"))
@@ -0,0 +1,181 @@
+import ast
+import hashlib
+import os
+import re
+from collections import OrderedDict
+from typing import Optional
+
+from config import *
+
+# --- СТРУКТУРНАЯ КАРТА ПРОЕКТА (OUTLINE) ---
+
+# Символ: (уровень вложенности, первая строка, последняя строка, сигнатура)
+Symbol = tuple[int, int, int, str]
+
+_RUST_VIS = r"(?:pub(?:\([^)]*\))?\s+)?"
+REGEX_PATTERNS: dict[str, list[re.Pattern]] = {
+    "rust": [
+        re.compile(rf"^\s*{_RUST_VIS}(?:default\s+)?(?:const\s+)?(?:async\s+)?(?:unsafe\s+)?(?:extern\s+\"[^\"]*\"\s+)?fn\s+\w+[^{{;]*"),
+        re.compile(rf"^\s*{_RUST_VIS}(?:unsafe\s+)?(?:struct|enum|union|trait|mod|type)\s+\w+[^{{;=]*"),
+        re.compile(r"^\s*(?:unsafe\s+)?impl\b[^{]*"),
+        re.compile(r"^\s*macro_rules!\s*\w+"),
+    ],
+    "go": [
+        re.compile(r"^func\s+(?:\([^)]*\)\s*)?\w+\s*\([^{]*"),
+        re.compile(r"^type\s+\w+\s+(?:struct|interface)\b"),
+    ],
+    "js": [
+        re.compile(r"^\s*(?:export\s+)?(?:default\s+)?(?:async\s+)?function\s*\*?\s*\w+\s*\([^{]*"),
+        re.compile(r"^\s*(?:export\s+)?(?:default\s+)?(?:abstract\s+)?class\s+\w+[^{]*"),
+        re.compile(r"^\s*(?:export\s+)?(?:declare\s+)?(?:interface|enum|type)\s+\w+[^{=]*"),
+        re.compile(r"^\s*(?:export\s+)?(?:const|let)\s+\w+\s*=\s*(?:async\s+)?(?:\([^)]*\)|\w+)\s*=>"),
+        re.compile(r"^\s+(?:public\s+|private\s+|protected\s+|static\s+|async\s+)*(?!if\b|for\b|while\b|switch\b|catch\b|return\b)\w+\s*\([^)]*\)\s*(?::\s*[^{]+)?\{"),
+    ],
+    "c": [
+        re.compile(r"^(?!\s*(?:if|for|while|switch|return|else)\b)[A-Za-z_][\w\s\*&:<>,]*?[\s\*&]([A-Za-z_~][\w:~]*)\s*\([^;{]*\)\s*(?:const\s*)?(?:noexcept\s*)?\{?\s*$"),
+        re.compile(r"^\s*(?:typedef\s+)?(?:struct|class|union|enum|namespace)\s+\w+[^;]*$"),
+    ],
+    "java": [
+        re.compile(r"^\s*(?:(?:public|private|protected|internal|static|final|abstract|sealed|open|data|partial)\s+)*(?:class|interface|enum|record|object|struct)\s+\w+[^{]*"),
+        re.compile(r"^\s*(?:(?:public|private|protected|internal|static|final|abstract|override|virtual|async|synchronized|suspend)\s+)+[\w<>\[\],\s]*?\b\w+\s*\([^;{]*\)[^;{]*\{?\s*$"),
+        re.compile(r"^\s*(?:(?:private|public|internal|override|suspend|inline)\s+)*fun\s+[^{=]*"),
+    ],
+    "ruby": [
+        re.compile(r"^\s*(?:class|module)\s+[\w:]+.*"),
+        re.compile(r"^\s*def\s+[\w.?!=]+.*"),
+    ],
+    "php": [
+        re.compile(r"^\s*(?:abstract\s+|final\s+)?(?:class|interface|trait)\s+\w+[^{]*"),
+        re.compile(r"^\s*(?:(?:public|private|protected|static|abstract|final)\s+)*function\s+\w+\s*\([^{]*"),
+    ],
+    "markdown": [re.compile(r"^#{1,4}\s+.+")],
+    "toml": [re.compile(r"^\[\[?[^\]]+\]\]?")],
+}
+
+EXTENSIONS: dict[str, str] = {
+    ".rs": "rust", ".go": "go",
+    ".js": "js", ".jsx": "js", ".mjs": "js", ".cjs": "js", ".ts": "js", ".tsx": "js", ".vue": "js", ".svelte": "js",
+    ".c": "c", ".h": "c", ".cc": "c", ".cpp": "c", ".hpp": "c", ".cxx": "c",
+    ".java": "java", ".kt": "java", ".kts": "java", ".scala": "java", ".cs": "java", ".swift": "java",
+    ".rb": "ruby", ".php": "php", ".md": "markdown", ".rst": "markdown", ".toml": "toml",
+}
+
+# Языки с фигурными скобками: конец символа ищется по балансу скобок
+BRACE_LANGS: set[str] = {"rust", "go", "js", "c", "java", "php"}
+
+# Кэш outline по хэшу содержимого
+_CACHE: "OrderedDict[str, list[Symbol]]" = OrderedDict()
+
+
+def _signature(node: ast.AST) -> str:
+    if isinstance(node, ast.ClassDef):
+        bases: str = ", ".join(ast.unparse(b) for b in node.bases + node.keywords)
+        return f"class {node.name}({bases})" if bases else f"class {node.name}"
+    prefix: str = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+    returns: str = f" -> {ast.unparse(node.returns)}" if node.returns else ""
+    return f"{prefix} {node.name}({ast.unparse(node.args)}){returns}"
+
+
+def outline_python(text: str) -> list[Symbol]:
+    """Классы и функции Python через ast (с сигнатурами и диапазонами строк)"""
+    tree = ast.parse(text)
+    symbols: list[Symbol] = []
+
+    def visit(body: list[ast.stmt], depth: int) -> None:
+        for node in body:
+            if isinstance(node, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+                start: int = min([node.lineno] + [d.lineno for d in node.decorator_list])
+                symbols.append((depth, start, node.end_lineno or node.lineno, _signature(node)))
+                if isinstance(node, ast.ClassDef):
+                    visit(node.body, depth + 1)
+
+    visit(tree.body, 0)
+    return symbols
+
+
+def _block_end(lines: list[str], start: int) -> int:
+    """Последняя строка блока по балансу фигурных скобок (строки и комментарии — грубо)"""
+    depth: int = 0
+    opened: bool = False
+    for i in range(start, min(len(lines), start + 5000)):
+        line: str = re.sub(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])\'|//.*', "", lines[i])
+        depth += line.count("{") - line.count("}")
+        if "{" in line:
+            opened = True
+        if opened and depth <= 0:
+            return i + 1
+        if not opened and line.rstrip().endswith(";"):
+            return i + 1
+    return start + 1
+
+
+def outline_regex(text: str, lang: str) -> list[Symbol]:
+    """Символы по регулярным выражениям для языков без парсера"""
+    lines: list[str] = text.splitlines()
+    symbols: list[Symbol] = []
+    patterns: list[re.Pattern] = REGEX_PATTERNS[lang]
+    # Концы охватывающих блоков: вложенность = сколько из них ещё не закрыто
+    enclosing: list[int] = []
+    for i, line in enumerate(lines):
+        if len(line) > 400:
+            continue
+        for pattern in patterns:
+            m = pattern.match(line)
+            if not m:
+                continue
+            end: int = _block_end(lines, i) if lang in BRACE_LANGS else i + 1
+            while enclosing and enclosing[-1] <= i:
+                enclosing.pop()
+            if lang == "markdown":
+                depth: int = line.index(" ") - 1
+            elif lang in BRACE_LANGS:
+                depth = len(enclosing)
+            else:
+                depth = min((len(line) - len(line.lstrip())) // 2, 3)
+            symbols.append((depth, i + 1, end, m.group(0).strip().rstrip("{").strip()))
+            if end > i + 1:
+                enclosing.append(end)
+            break
+    return symbols
+
+
+def outline_file(path: str, text: str) -> Optional[list[Symbol]]:
+    """Outline файла (с кэшем по хэшу содержимого); None — язык не поддерживается"""
+    ext: str = os.path.splitext(path)[1].lower()
+    lang: Optional[str] = "python" if ext in (".py", ".pyi") else EXTENSIONS.get(ext)
+    if not lang:
+        return None
+
+    key: str = hashlib.sha1(f"{lang}\0{text}".encode(errors="replace")).hexdigest()
+    cached = _CACHE.get(key)
+    if cached is not None:
+        _CACHE.move_to_end(key)
+        return cached
+
+    try:
+        symbols: list[Symbol] = outline_python(text) if lang == "python" else outline_regex(text, lang)
+    except (SyntaxError, ValueError):
+        # Файл с синтаксической ошибкой — хотя бы def/class по регуляркам
+        symbols = [(0, i + 1, i + 1, line.strip().rstrip(":"))
+                   for i, line in enumerate(text.splitlines()) if re.match(r"\s*(async\s+def|def|class)\s", line)]
+
+    _CACHE[key] = symbols
+    if len(_CACHE) > OUTLINE_CACHE_SIZE:
+        _CACHE.popitem(last=False)
+    return symbols
+
+
+def render(path: str, text: str) -> str:
+    """Компактное текстовое представление outline одного файла"""
+    line_count: int = text.count("\n") + (0 if text.endswith("\n") or not text else 1)
+    header: str = f">>> {path} ({line_count} строк)"
+    symbols: Optional[list[Symbol]] = outline_file(path, text)
+    if not symbols:
+        return header
+    rows: list[str] = [header]
+    for depth, start, end, signature in symbols[:OUTLINE_MAX_SYMBOLS]:
+        span: str = f"L{start}" if start == end else f"L{start}-{end}"
+        rows.append(f"{'  ' * (depth + 1)}{span} {signature[:160]}")
+    if len(symbols) > OUTLINE_MAX_SYMBOLS:
+        rows.append(f"  ... ещё {len(symbols) - OUTLINE_MAX_SYMBOLS} символов")
+    return "\n".join(rows)
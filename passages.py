@@ -0,0 +1,150 @@
+from collections import Counter
+from typing import Any, Callable, Optional
+
+from config import *
+from ranking import BM25, tokenize
+
+# --- ИЗВЛЕЧЕНИЕ ФРАГМЕНТОВ ИЗ ВЕБ-СТРАНИЦ ---
+# Страница режется на фрагменты по блокам (абзацы, пункты списков, код) с привязкой к заголовку.
+# Фрагменты всех источников ранжируются по запросу (BM25 + совпадение с заголовком раздела),
+# в бюджет WEB_SEARCH_MAX_LENGTH попадают лучшие — а не навигация из начала страницы.
+
+HEADING_TAGS: tuple[str, ...] = ("h1", "h2", "h3", "h4", "h5", "h6")
+BLOCK_TAGS: list[str] = [*HEADING_TAGS, "p", "li", "pre", "blockquote", "dd", "dt", "td", "th", "figcaption"]
+
+# Строки короче — меню, кнопки, подписи
+MIN_LINE: int = 20
+
+
+def _blocks(root: Any) -> list[tuple[str, str]]:
+    """(тег, текст) блоков верхнего уровня; без разметки блоков — строки текста"""
+    blocks: list[tuple[str, str]] = []
+    for el in root.find_all(BLOCK_TAGS):
+        if el.find_parent(BLOCK_TAGS):
+            continue
+        text: str = el.get_text("\n" if el.name == "pre" else " ", strip=True)
+        if text:
+            blocks.append((el.name, text))
+    if not blocks:
+        blocks = [("p", line.strip()) for line in root.get_text("\n", strip=True).splitlines() if line.strip()]
+    return blocks
+
+
+def extract(root: Any, source: int, keep: Optional[Callable[[str], bool]] = None) -> list[dict[str, Any]]:
+    """
+    Фрагменты страницы: текст до WEB_PASSAGE_CHARS, ближайший заголовок
+    и номер фрагмента под ним (distance).
+    """
+    passages: list[dict[str, Any]] = []
+    heading: str = ""
+    distance: int = 0
+    chunk: list[str] = []
+
+    def flush() -> None:
+        nonlocal distance
+        if chunk:
+            passages.append({"source": source, "order": len(passages), "heading": heading,
+                             "distance": distance, "text": "\n".join(chunk)})
+            chunk.clear()
+            distance += 1
+
+    for tag, text in _blocks(root):
+        if tag in HEADING_TAGS:
+            flush()
+            heading, distance = text[:200], 0
+            continue
+        if keep is not None and not keep(text):
+            continue
+        if len(text) < MIN_LINE and tag != "pre":
+            continue
+        # Длинный блок (листинг, сплошной текст) режется по строкам
+        lines: list[str] = text.splitlines() if len(text) > WEB_PASSAGE_CHARS else [text]
+        for line in lines:
+            if chunk and sum(map(len, chunk)) + len(line) > WEB_PASSAGE_CHARS:
+                flush()
+            chunk.append(line[:WEB_PASSAGE_CHARS * 2])
+    flush()
+    return passages
+
+
+def to_text(passages: list[dict[str, Any]]) -> str:
+    """Фрагменты в текст с заголовками «## ...» (для хранения; обратно — from_text)"""
+    parts: list[str] = []
+    heading: str = ""
+    for p in passages:
+        if p["heading"] and p["heading"] != heading:
+            parts.append(f"## {p['heading']}")
+            heading = p["heading"]
+        parts.append(p["text"])
+    return "\n\n".join(parts)
+
+
+def from_text(text: str, source: int) -> list[dict[str, Any]]:
+    """Фрагменты из текста to_text: заголовки «## », фрагменты разделены пустой строкой"""
+    passages: list[dict[str, Any]] = []
+    heading: str = ""
+    distance: int = 0
+    for block in text.split("\n\n"):
+        block = block.strip()
+        if not block:
+            continue
+        if block.startswith("## ") and "\n" not in block:
+            heading, distance = block[3:], 0
+            continue
+        passages.append({"source": source, "order": len(passages), "heading": heading,
+                         "distance": distance, "text": block})
+        distance += 1
+    return passages
+
+
+def score(passages: list[dict[str, Any]], query: str) -> None:
+    """Проставляет passage["score"]: BM25 по всем фрагментам + бонус за запрос в заголовке раздела"""
+    terms: set[str] = set(tokenize(query))
+    bm25 = BM25({i: Counter(tokenize(p["text"])) for i, p in enumerate(passages)})
+    scores: dict[Any, float] = bm25.scores(terms)
+    for i, p in enumerate(passages):
+        in_heading: float = len(terms & set(tokenize(p["heading"]))) / len(terms) if terms else 0.0
+        p["score"] = scores.get(i, 0.0) + WEB_PASSAGE_HEADING_WEIGHT * in_heading / (1 + p["distance"])
+
+
+def pack(pages: list[dict[str, Any]], query: str, budget: int) -> list[str]:
+    """
+    Лучшие фрагменты всех страниц в пределах budget символов.
+    pages: {"index", "title", "url", "passages"}; у каждого источника сначала берётся его лучший фрагмент.
+    """
+    passages: list[dict[str, Any]] = [p for page in pages for p in page["passages"]]
+    if not passages:
+        return []
+    score(passages, query)
+    headers: dict[int, str] = {page["index"]: f"=== Источник {page['index']}: {page['title']} ({page['url']}) ===" for page in pages}
+
+    ranked: list[dict[str, Any]] = sorted(passages, key=lambda p: (-p["score"], p["source"], p["order"]))
+    best: dict[int, dict[str, Any]] = {}
+    for p in ranked:
+        best.setdefault(p["source"], p)
+    candidates: list[dict[str, Any]] = list(best.values()) + [p for p in ranked if best[p["source"]] is not p]
+
+    chosen: dict[int, list[dict[str, Any]]] = {}
+    used: int = 0
+    for p in candidates:
+        # С запасом на заголовок раздела и разделитель «[...]»
+        cost: int = len(p["text"]) + len(p["heading"]) + 12 + (0 if p["source"] in chosen else len(headers[p["source"]]) + 2)
+        if used + cost > budget:
+            continue
+        chosen.setdefault(p["source"], []).append(p)
+        p["packed"] = True
+        used += cost
+
+    texts: list[str] = []
+    for source in sorted(chosen):
+        parts: list[str] = []
+        previous: int = -1
+        for p in sorted(chosen[source], key=lambda p: p["order"]):
+            if previous >= 0 and p["order"] != previous + 1:
+                parts.append("[...]")
+            if p["heading"] and (previous < 0 or p["order"] != previous + 1 or p["distance"] == 0):
+                parts.append(f"## {p['heading']}")
+            parts.append(p["text"])
+            previous = p["order"]
+        texts.append(headers[source] + "\n" + "\n\n".join(parts))
+    return texts
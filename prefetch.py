@@ -0,0 +1,122 @@
+import asyncio
+import os
+import re
+import shutil
+from typing import Any, Optional
+
+from config import *
+from memo import MEMO
+from outline import EXTENSIONS
+
+# --- СПЕКУЛЯТИВНАЯ ПРЕДЗАГРУЗКА ---
+# Пока модель генерирует ответ, инструменты простаивают. Следующие вызовы часто предсказуемы:
+# read_file для файлов из ошибок компилятора, search_code для идентификаторов из запроса,
+# повторный scan_directory после write_file. Их результаты готовятся заранее (только чтение).
+
+_EXT: str = "|".join(sorted({e.lstrip(".") for e in EXTENSIONS} | {"py", "pyi", "cfg", "ini", "yaml", "yml", "json"}, key=len, reverse=True))
+PATH_RE = re.compile(rf"(?<![\w/.-])((?:/|\./)?(?:[\w.-]+/)*[\w-][\w.-]*\.(?:{_EXT}))(?![\w])")
+# Идентификаторы, которые модель скорее всего станет искать: `в_кавычках`, CamelCase, snake_case, вызовы foo()
+SYMBOL_RE = re.compile(r"`([A-Za-z_][\w.:]{2,60})`|\b([A-Z][a-z0-9]+(?:[A-Z][a-z0-9]+)+|[a-z][a-z0-9]*(?:_[a-z0-9]+)+)\b|\b([A-Za-z_]\w{2,40})\(\)")
+
+
+class Prefetcher:
+    """Фоновые read-only вызовы инструментов, результат которых отдаётся при совпадении вызова модели"""
+
+    def __init__(self) -> None:
+        # Ключ вызова (MEMO.make_key) -> (задача, отпечаток входных данных на момент запуска)
+        self.entries: dict[str, tuple[asyncio.Task, Any]] = {}
+        self.scheduled: int = 0
+        self.hits: int = 0
+        self.stale: int = 0
+        self._limit = asyncio.Semaphore(PREFETCH_CONCURRENCY)
+
+    def reset(self) -> None:
+        """Отменяет невостребованные предзагрузки (конец запроса)"""
+        for task, _fp in self.entries.values():
+            task.cancel()
+        self.entries.clear()
+
+    @staticmethod
+    def _relative(path: str, base_path: str) -> Optional[str]:
+        full: str = os.path.normpath(path if os.path.isabs(path) else os.path.join(base_path, path))
+        if not full.startswith(base_path.rstrip(os.sep) + os.sep) or not os.path.isfile(full):
+            return None
+        if os.path.getsize(full) > PREFETCH_MAX_FILE_BYTES:
+            return None
+        return os.path.relpath(full, base_path)
+
+    def predict(self, user_input: Optional[str], last_calls: list[tuple[str, dict[str, Any], str]],
+                base_path: str) -> list[tuple[str, dict[str, Any]]]:
+        """Вероятные следующие вызовы по запросу пользователя и выводам прошлых инструментов"""
+        calls: list[tuple[str, dict[str, Any]]] = []
+        texts: list[str] = [user_input] if user_input else []
+        for name, args, result in last_calls:
+            if name == "write_file":
+                calls.append(("scan_directory", {}))
+            elif name in ("run_shell_command", "run_checks", "search_code"):
+                texts.append(result)
+
+        read: set[str] = {os.path.normpath(str(a.get("path", ""))) for n, a, _ in last_calls if n == "read_file"}
+        for text in texts:
+            for m in PATH_RE.finditer(text[:20000]):
+                rel = self._relative(m.group(1), base_path)
+                if rel and rel not in read:
+                    calls.append(("read_file", {"path": rel}))
+
+        if user_input and shutil.which("rga"):
+            for m in SYMBOL_RE.finditer(user_input):
+                symbol: str = next(g for g in m.groups() if g)
+                if not PATH_RE.fullmatch(symbol):
+                    calls.append(("search_code", {"query": symbol}))
+
+        unique: dict[str, tuple[str, dict[str, Any]]] = {}
+        for name, args in calls:
+            unique.setdefault(MEMO.make_key(name, args), (name, args))
+        return list(unique.values())[:PREFETCH_MAX_TASKS]
+
+    def start(self, user_input: Optional[str], last_calls: list[tuple[str, dict[str, Any], str]], base_path: str) -> None:
+        """Запускает предзагрузку на время генерации ответа моделью"""
+        if not PREFETCH_ENABLED or not base_path:
+            return
+        # Импорт здесь: tools импортирует bd, а bd — этот модуль
+        import tools
+
+        runners = {
+            "read_file": lambda a: tools.read_file_tool(a["path"]),
+            "search_code": lambda a: tools.search_code_tool(a["query"], quiet=True),
+            "scan_directory": lambda a: tools.scan_directory_tool(quiet=True),
+        }
+        for name, args in self.predict(user_input, last_calls, base_path):
+            key: str = MEMO.make_key(name, args)
+            if key in self.entries:
+                continue
+
+            async def run(coro_factory=runners[name], call_args=args) -> str:
+                async with self._limit:
+                    return await coro_factory(call_args)
+
+            self.entries[key] = (asyncio.create_task(run()), MEMO.fingerprint(name, args, base_path))
+            self.scheduled += 1
+
+    async def take(self, name: str, args: dict[str, Any], base_path: str) -> Optional[str]:
+        """Готовый результат предзагрузки, если вызов совпал и данные не менялись"""
+        entry = self.entries.pop(MEMO.make_key(name, args), None)
+        if entry is None:
+            return None
+        task, fingerprint = entry
+        try:
+            result: str = await task
+        except (asyncio.CancelledError, Exception):
+            return None
+        if fingerprint != MEMO.fingerprint(name, args, base_path):
+            self.stale += 1
+            return None
+        self.hits += 1
+        return result
+
+    def stats(self) -> str:
+        rate: float = self.hits / self.scheduled * 100 if self.scheduled else 0.0
+        return f"предсказано {self.scheduled}, попаданий {self.hits} ({rate:.0f}%), устарело {self.stale}"
+
+
+PREFETCH = Prefetcher()
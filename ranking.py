@@ -0,0 +1,128 @@
+import math
+import os
+import re
+import time
+from collections import Counter
+from typing import Any, Iterable
+
+# --- РАНЖИРОВАНИЕ ФАЙЛОВ ПО ЗАПРОСУ ---
+
+WORD_RE = re.compile(r"[A-Za-zА-Яа-яЁё_][A-Za-zА-Яа-яЁё0-9_]*")
+CAMEL_RE = re.compile(r"[A-ZА-ЯЁ]?[a-zа-яё0-9]+|[A-ZА-ЯЁ]+(?![a-zа-яё])")
+
+# Вклад сигналов в итоговый балл
+W_BM25: float = 0.55
+W_PATH: float = 0.2
+W_RECENT: float = 0.1
+W_WRITES: float = 0.15
+
+# Сколько байт файла индексировать (начало файла — импорты, объявления)
+INDEX_BYTES: int = 200_000
+
+# Файлы, недавно записанные через write_file: абсолютный путь -> время записи
+RECENT_WRITES: dict[str, float] = {}
+
+# Кэш токенов файла по (mtime, size)
+_TOKENS: dict[str, tuple[float, int, Counter]] = {}
+
+
+def tokenize(text: str) -> list[str]:
+    """Слова и части идентификаторов (snake_case, CamelCase) в нижнем регистре"""
+    tokens: list[str] = []
+    for word in WORD_RE.findall(text):
+        lower: str = word.lower()
+        if len(lower) > 1:
+            tokens.append(lower)
+        parts: list[str] = [p.lower() for chunk in word.split("_") for p in CAMEL_RE.findall(chunk)]
+        if len(parts) > 1:
+            tokens.extend(p for p in parts if len(p) > 1)
+    return tokens
+
+
+class BM25:
+    """Okapi BM25 по набору документов (документ — счётчик токенов)"""
+
+    def __init__(self, docs: dict[str, Counter], k1: float = 1.2, b: float = 0.75) -> None:
+        self.docs: dict[str, Counter] = docs
+        self.k1: float = k1
+        self.b: float = b
+        self.lengths: dict[str, int] = {key: sum(tf.values()) for key, tf in docs.items()}
+        self.avg_length: float = (sum(self.lengths.values()) / len(docs)) if docs else 0.0
+        df: Counter = Counter()
+        for tf in docs.values():
+            df.update(tf.keys())
+        n: int = len(docs)
+        self.idf: dict[str, float] = {t: math.log(1 + (n - f + 0.5) / (f + 0.5)) for t, f in df.items()}
+
+    def scores(self, query: Iterable[str]) -> dict[str, float]:
+        terms: set[str] = {t for t in query if t in self.idf}
+        result: dict[str, float] = {}
+        if not terms or not self.avg_length:
+            return result
+        for key, tf in self.docs.items():
+            norm: float = self.k1 * (1 - self.b + self.b * self.lengths[key] / self.avg_length)
+            score: float = 0.0
+            for term in terms:
+                f: int = tf.get(term, 0)
+                if f:
+                    score += self.idf[term] * f * (self.k1 + 1) / (f + norm)
+            if score:
+                result[key] = score
+        return result
+
+
+def note_write(full_path: str) -> None:
+    """Отмечает файл, записанный агентом (поднимается в ранжировании)"""
+    RECENT_WRITES[os.path.abspath(full_path)] = time.time()
+
+
+def _file_tokens(full_path: str, mtime: float, size: int) -> Counter:
+    cached = _TOKENS.get(full_path)
+    if cached and cached[:2] == (mtime, size):
+        return cached[2]
+    try:
+        with open(full_path, "r", encoding="utf-8", errors="replace") as f:
+            tf = Counter(tokenize(f.read(INDEX_BYTES)))
+    except OSError:
+        tf = Counter()
+    _TOKENS[full_path] = (mtime, size, tf)
+    return tf
+
+
+def rank_files(base: str, entries: list[dict[str, Any]], query: str) -> list[dict[str, Any]]:
+    """
+    Сортирует файлы по релевантности запросу: BM25 по содержимому, совпадения в пути,
+    свежесть изменения и недавние записи агента. В каждую запись добавляется "score".
+    """
+    base = os.path.abspath(base)
+    terms: list[str] = tokenize(query)
+    query_set: set[str] = set(terms)
+    now: float = time.time()
+
+    docs: dict[str, Counter] = {
+        e["path"]: _file_tokens(os.path.join(base, e["path"]), e["mtime"], e["size"]) for e in entries
+    }
+    bm25: dict[str, float] = BM25(docs).scores(terms)
+    top_bm25: float = max(bm25.values(), default=0.0) or 1.0
+
+    ranked: list[dict[str, Any]] = []
+    for entry in entries:
+        rel: str = entry["path"]
+        path_terms: set[str] = set(tokenize(rel.replace("/", " ").replace(".", " ")))
+        path_score: float = len(query_set & path_terms) / len(query_set) if query_set else 0.0
+        # Свежесть: полураспад — сутки
+        recent_score: float = 0.5 ** (max(now - entry["mtime"], 0.0) / 86400)
+        written: float = RECENT_WRITES.get(os.path.join(base, rel), 0.0)
+        # Записи агента: полураспад — час
+        write_score: float = 0.5 ** ((now - written) / 3600) if written else 0.0
+
+        score: float = (
+            W_BM25 * bm25.get(rel, 0.0) / top_bm25
+            + W_PATH * path_score
+            + W_RECENT * recent_score
+            + W_WRITES * write_score
+        )
+        ranked.append({**entry, "score": round(score, 4)})
+
+    ranked.sort(key=lambda e: (-e["score"], e["path"]))
+    return ranked
@@ -0,0 +1,138 @@
+import json
+import time
+from typing import Any, Optional
+
+from config import *
+
+# --- МАРШРУТИЗАЦИЯ МОДЕЛЕЙ ---
+# Промежуточные шаги («теперь вызови read_file») делает лёгкая модель. Её ответ принимается,
+# только если это корректные вызовы read-only инструментов; финальный ответ, запись кода,
+# план и кривые вызовы пересчитываются большой моделью.
+# Пересчёт — это лишний вызов лёгкой модели, поэтому уровень выбирается до генерации:
+# ответ на сообщение пользователя, шаг после записи и всё после первого отказа в ходе
+# сразу идут в большую модель. Время отвергнутых вызовов видно в /routes («Впустую»).
+
+# (режим, маршрут, модель) -> счётчики
+ROUTE_STATS: dict[tuple[str, str, str], dict[str, float]] = {}
+
+
+def _record(mode: str, route: str, model: str, seconds: float, outcome: str) -> None:
+    stats: dict[str, float] = ROUTE_STATS.setdefault(
+        (mode, route, model), {"calls": 0, "seconds": 0.0, "ok": 0, "rejected": 0, "errors": 0, "wasted": 0.0}
+    )
+    stats["calls"] += 1
+    stats["seconds"] += seconds
+    stats[outcome] += 1
+    if outcome == "rejected":
+        # Ответ выброшен, шаг всё равно генерирует большая модель
+        stats["wasted"] += seconds
+
+
+def routes_report() -> str:
+    """Таблица маршрутов для /routes: вызовы, средняя задержка, доля принятых ответов"""
+    if not ROUTE_STATS:
+        return "Маршрутизация ещё не использовалась."
+    rows: list[str] = [f"{'Режим':<11} {'Маршрут':<9} {'Модель':<28} {'Вызовы':>6} {'Сред.,с':>8} {'Принято':>8} {'Ошибки':>6} {'Впустую,с':>10}"]
+    for (mode, route, model), s in sorted(ROUTE_STATS.items()):
+        accepted: float = s["ok"] / s["calls"] * 100 if s["calls"] else 0.0
+        rows.append(
+            f"{mode:<11} {route:<9} {model[:28]:<28} {int(s['calls']):>6} {s['seconds'] / s['calls']:>8.1f} "
+            f"{accepted:>7.0f}% {int(s['errors']):>6} {s['wasted']:>10.1f}"
+        )
+    return "\n".join(rows)
+
+
+class ModelRouter:
+    """Выбор модели на каждой итерации цикла агента"""
+
+    def __init__(self, mode: str) -> None:
+        routes: dict[str, str] = MODEL_ROUTES.get(mode, MODEL_ROUTES["dev"])
+        self.mode: str = mode
+        self.fast: str = routes["fast"]
+        self.strong: str = routes["strong"]
+        # Модель, на которую переключил детектор зацикливания
+        self.override: Optional[str] = None
+        # Ответ лёгкой модели уже отвергали в этом ходе — дальше сразу большая
+        self.rejected: bool = False
+
+    def escalate(self, model: str) -> None:
+        self.override = model
+
+    def pick(self, messages: list) -> Optional[str]:
+        """Причина сразу звать большую модель (None — шаг похож на промежуточный, пробуем лёгкую)"""
+        if self.rejected:
+            return "лёгкая модель уже отвергнута в этом ходе"
+        last: Any = messages[-1] if messages else {}
+        if last.get("role") != "tool":
+            # Первый шаг хода (или после подсказки) часто сразу финальный ответ
+            return "начало хода"
+        # Результаты последнего шага: после записи идёт итог или новые правки
+        for message in reversed(messages):
+            if message.get("role") != "tool":
+                break
+            if message.get("name") in ROUTE_STRONG_TOOLS:
+                return f"после {message['name']}"
+        return None
+
+    def review(self, msg: Any, tools: list[dict]) -> Optional[str]:
+        """Причина не принимать ответ лёгкой модели (None — ответ годится)"""
+        calls = msg.get("tool_calls") or []
+        if not calls:
+            content: str = (msg.get("content") or "").strip()
+            if content.startswith("{") and '"name"' in content:
+                return "вызов инструмента текстом"
+            return "финальный ответ"
+
+        schemas: dict[str, dict] = {t["function"]["name"]: t["function"].get("parameters", {}) for t in tools}
+        for call in calls:
+            fn = call.get("function", {})
+            name = fn.get("name")
+            args = fn.get("arguments")
+            if isinstance(args, str):
+                try:
+                    args = json.loads(args)
+                except json.JSONDecodeError:
+                    return f"аргументы {name} — не JSON"
+            if name not in schemas:
+                return f"неизвестный инструмент {name}"
+            if not isinstance(args, dict) or any(k not in args for k in schemas[name].get("required", [])):
+                return f"неполные аргументы {name}"
+            if name in ROUTE_STRONG_TOOLS:
+                return name
+        return None
+
+    async def _call(self, client: Any, route: str, model: str, **kwargs: Any) -> tuple[Any, float]:
+        started: float = time.monotonic()
+        try:
+            response = await client.chat(model=model, **kwargs)
+        except Exception:
+            _record(self.mode, route, model, time.monotonic() - started, "errors")
+            raise
+        return response, time.monotonic() - started
+
+    async def chat(self, client: Any, messages: list, tools: list[dict], options: dict) -> Any:
+        """Запрос к лёгкой модели с эскалацией на большую, если её ответ не подходит"""
+        kwargs: dict[str, Any] = {"messages": messages, "tools": tools, "options": options}
+
+        if self.override:
+            response, seconds = await self._call(client, "escalated", self.override, **kwargs)
+            _record(self.mode, "escalated", self.override, seconds, "ok")
+            return response
+
+        if self.fast and self.fast != self.strong and self.pick(messages) is None:
+            try:
+                response, seconds = await self._call(client, "fast", self.fast, **kwargs)
+            except Exception as e:
+                print(f"{C_YELLOW}[ROUTE]{C_RESET} {self.fast} недоступна ({type(e).__name__}) — {self.strong}")
+            else:
+                reason: Optional[str] = self.review(response["message"], tools)
+                if reason is None:
+                    _record(self.mode, "fast", self.fast, seconds, "ok")
+                    return response
+                _record(self.mode, "fast", self.fast, seconds, "rejected")
+                self.rejected = True
+                print(f"{C_GRAY}[ROUTE]{C_RESET} ↑ {self.strong}: {reason}")
+
+        response, seconds = await self._call(client, "strong", self.strong, **kwargs)
+        _record(self.mode, "strong", self.strong, seconds, "ok")
+        return response
@@ -0,0 +1,261 @@
+import fnmatch
+import json
+import os
+import re
+import shutil
+import subprocess
+from typing import Any, Optional
+
+from config import *
+from checks import SKIP_DIRS
+import watcher
+
+# --- ПЕРЕЧИСЛЕНИЕ ФАЙЛОВ ПРОЕКТА ---
+
+# Профиль по умолчанию: исходники и конфиги популярных языков
+DEFAULT_PROFILE: dict[str, Any] = {
+    "include": [
+        "*.py", "*.pyi", "*.rs", "*.go", "*.c", "*.h", "*.cc", "*.cpp", "*.hpp", "*.cxx", "*.cs", "*.java",
+        "*.kt", "*.kts", "*.scala", "*.swift", "*.m", "*.rb", "*.php", "*.lua", "*.zig", "*.nim", "*.dart",
+        "*.js", "*.jsx", "*.mjs", "*.cjs", "*.ts", "*.tsx", "*.vue", "*.svelte", "*.html", "*.css", "*.scss",
+        "*.sql", "*.sh", "*.bash", "*.zsh", "*.ps1", "*.toml", "*.yaml", "*.yml", "*.json", "*.ini", "*.cfg",
+        "*.md", "*.rst", "*.txt", "*.proto", "*.graphql", "Makefile", "Dockerfile", "CMakeLists.txt", "Justfile",
+    ],
+    "exclude": ["*.min.js", "*.min.css", "*.map", "package-lock.json", "yarn.lock", "pnpm-lock.yaml",
+                "Cargo.lock", "poetry.lock", "*.lock"],
+    "max_bytes": SCAN_MAX_BYTES,
+    "max_file_bytes": SCAN_MAX_FILE_BYTES,
+}
+
+SNIFF_BYTES: int = 8192
+TEXT_CHARS: bytes = bytes({7, 8, 9, 10, 12, 13, 27} | set(range(0x20, 0x100)) - {0x7F})
+
+# Кэш «бинарный ли файл» по (mtime, size)
+_BINARY: dict[str, tuple[int, int, bool]] = {}
+# Списки файлов при запущенном наблюдателе: (каталог, профиль) -> (поколение наблюдателя, записи)
+_LISTED: dict[tuple[str, str], tuple[int, list[dict[str, Any]]]] = {}
+
+
+def load_profile(raw: Optional[str]) -> dict[str, Any]:
+    """Профиль проекта (JSON из projects.scan_profile) поверх профиля по умолчанию"""
+    profile: dict[str, Any] = dict(DEFAULT_PROFILE)
+    if raw:
+        try:
+            profile.update({k: v for k, v in json.loads(raw).items() if k in DEFAULT_PROFILE})
+        except (json.JSONDecodeError, AttributeError):
+            print(f"{C_YELLOW}[SCAN]{C_RESET} Некорректный профиль сканирования, используется стандартный.")
+    return profile
+
+
+def is_binary(path: str) -> bool:
+    """Бинарный файл: есть NUL-байт или много непечатаемых символов в начале"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return True
+    cached = _BINARY.get(path)
+    if cached and cached[:2] == (st.st_mtime_ns, st.st_size):
+        return cached[2]
+
+    try:
+        with open(path, "rb") as f:
+            head: bytes = f.read(SNIFF_BYTES)
+    except OSError:
+        return True
+    binary: bool = b"\0" in head
+    if not binary and head:
+        try:
+            # Последние байты могут оказаться обрезанным многобайтовым символом
+            head[:-4].decode("utf-8")
+        except UnicodeDecodeError:
+            # Не UTF-8: текст в однобайтовой кодировке почти не содержит управляющих символов
+            binary = len(head.translate(None, TEXT_CHARS)) / len(head) > 0.05
+    _BINARY[path] = (st.st_mtime_ns, st.st_size, binary)
+    return binary
+
+
+# --- .gitignore ---
+
+def _translate(pattern: str) -> str:
+    """Глоб .gitignore -> регулярное выражение"""
+    out: list[str] = []
+    i: int = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == len(pattern):
+            out.append("/.*")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            out.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            out.append("[^/]")
+            i += 1
+        elif pattern[i] == "[":
+            end: int = pattern.find("]", i + 1)
+            if end < 0:
+                out.append(re.escape(pattern[i]))
+                i += 1
+            else:
+                body: str = pattern[i + 1:end].replace("\\", "\\\\")
+                out.append(f"[^{body[1:]}]" if body.startswith("!") else f"[{body}]")
+                i = end + 1
+        else:
+            out.append(re.escape(pattern[i]))
+            i += 1
+    return "".join(out)
+
+
+class GitIgnore:
+    """Правила одного .gitignore (пути сопоставляются относительно его каталога)"""
+
+    def __init__(self, lines: list[str]) -> None:
+        self.rules: list[tuple[re.Pattern, bool, bool, bool]] = []
+        for line in lines:
+            line = line.rstrip("\n")
+            if not line.strip() or line.startswith("#"):
+                continue
+            line = line.rstrip(" ")
+            negate: bool = line.startswith("!")
+            if negate or line.startswith("\\"):
+                line = line[1:]
+            dir_only: bool = line.endswith("/")
+            line = line.rstrip("/")
+            anchored: bool = "/" in line
+            line = line.lstrip("/")
+            if line:
+                self.rules.append((re.compile(_translate(line) + r"\Z"), negate, dir_only, anchored))
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["GitIgnore"]:
+        try:
+            with open(os.path.join(directory, ".gitignore"), encoding="utf-8", errors="replace") as f:
+                ignore = cls(f.readlines())
+        except OSError:
+            return None
+        return ignore if ignore.rules else None
+
+    def match(self, rel: str, is_dir: bool) -> Optional[bool]:
+        """True — игнорировать, False — явно вернуть (!), None — правило не найдено"""
+        verdict: Optional[bool] = None
+        name: str = rel.rsplit("/", 1)[-1]
+        for regex, negate, dir_only, anchored in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(rel if anchored else name):
+                verdict = not negate
+        return verdict
+
+
+def _walk_with_gitignore(base: str) -> list[str]:
+    """Обход без git: .gitignore на каждом уровне, пропуск venv и служебных каталогов"""
+    found: list[str] = []
+    stack: list[tuple[str, GitIgnore]] = []
+
+    def ignored(rel: str, is_dir: bool) -> bool:
+        verdict: bool = False
+        for scope, ignore in stack:
+            if scope and not rel.startswith(scope + "/"):
+                continue
+            sub: str = rel[len(scope) + 1:] if scope else rel
+            result = ignore.match(sub, is_dir)
+            if result is not None:
+                verdict = result
+        return verdict
+
+    for root, dirs, files in os.walk(base):
+        rel_root: str = os.path.relpath(root, base).replace(os.sep, "/")
+        rel_root = "" if rel_root == "." else rel_root
+        stack = [(scope, ig) for scope, ig in stack if not scope or rel_root == scope or rel_root.startswith(scope + "/")]
+        ignore = GitIgnore.load(root)
+        if ignore:
+            stack.append((rel_root, ignore))
+
+        kept: list[str] = []
+        for d in dirs:
+            rel: str = f"{rel_root}/{d}" if rel_root else d
+            if d in SKIP_DIRS or d == ".git" or ignored(rel, True):
+                continue
+            # Виртуальное окружение с любым именем
+            if os.path.isfile(os.path.join(root, d, "pyvenv.cfg")):
+                continue
+            kept.append(d)
+        dirs[:] = kept
+
+        for name in files:
+            rel = f"{rel_root}/{name}" if rel_root else name
+            if not ignored(rel, False):
+                found.append(rel)
+    return found
+
+
+def _git_files(base: str) -> Optional[list[str]]:
+    """Отслеживаемые и новые неигнорируемые файлы по данным git"""
+    if not shutil.which("git") or not os.path.exists(os.path.join(base, ".git")):
+        return None
+    try:
+        out: bytes = subprocess.run(
+            ["git", "-C", base, "ls-files", "-z", "--cached", "--others", "--exclude-standard"],
+            capture_output=True, timeout=20, check=True,
+        ).stdout
+    except (subprocess.SubprocessError, OSError):
+        return None
+    return [p for p in out.decode(errors="replace").split("\0") if p]
+
+
+def _matches(rel: str, patterns: list[str]) -> bool:
+    name: str = rel.rsplit("/", 1)[-1]
+    return any(fnmatch.fnmatchcase(name, p) or fnmatch.fnmatchcase(rel, p) for p in patterns)
+
+
+def list_files(base: str, profile: Optional[dict[str, Any]] = None) -> list[dict[str, Any]]:
+    """
+    Исходные файлы проекта: git ls-files (или обход с .gitignore),
+    фильтр include/exclude профиля, без бинарных и слишком больших файлов.
+    При запущенном наблюдателе размеры и время берутся из его таблицы, а список переиспользуется,
+    пока файлы не менялись (изменение .gitignore — тоже изменение файла).
+    """
+    profile = profile or DEFAULT_PROFILE
+    base = os.path.abspath(base)
+    active: Optional[watcher.ProjectWatcher] = watcher.active(base)
+    key: tuple[str, str] = (base, json.dumps(profile, sort_keys=True))
+    generation: int = active.generation if active else 0
+    cached = _LISTED.get(key) if active else None
+    if cached and cached[0] == generation:
+        # Копии: ранжирование дописывает в записи "score"
+        return [dict(entry) for entry in cached[1]]
+
+    paths: list[str] = _git_files(base)
+    source: str = "git"
+    if paths is None:
+        paths = _walk_with_gitignore(base)
+        source = "walk"
+
+    entries: list[dict[str, Any]] = []
+    for rel in sorted(paths):
+        if not _matches(rel, profile["include"]) or _matches(rel, profile["exclude"]):
+            continue
+        full: str = os.path.join(base, rel)
+        # Файлы в скрытых каталогах (.github) наблюдатель не отслеживает — их читаем с диска
+        state: Optional[tuple[int, int]] = active.state(os.path.normpath(full)) if active else None
+        if state is None:
+            try:
+                st = os.stat(full)
+            except OSError:
+                continue
+            if not os.path.isfile(full):
+                continue
+            state = (st.st_mtime_ns, st.st_size)
+        mtime_ns, size = state
+        if size > profile["max_file_bytes"] or is_binary(full):
+            continue
+        entries.append({"path": rel, "size": size, "mtime": mtime_ns / 1e9, "source": source})
+    if active:
+        _LISTED[key] = (generation, entries)
+        return [dict(entry) for entry in entries]
+    return entries
@@ -0,0 +1,171 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+from urllib.parse import urldefrag, urlparse
+
+from config import *
+import mirror
+
+# --- ПОИСКОВЫЕ БЭКЕНДЫ ---
+# Сначала локальные источники (зеркало документации): набралось MIRROR_MIN_HITS страниц — в сеть не ходим.
+# Иначе запрос уходит во все сетевые источники сразу (DuckDuckGo, SearxNG), результаты сливаются
+# без повторов URL. Ответ возвращается, как только набралось SEARCH_EARLY_HITS приоритетных ссылок, —
+# медленный или ограниченный DDG не держит диалог.
+
+# Результат: {"href", "title", "body", "backend"}; у страниц зеркала ещё "local" — сохранённый текст
+Result = dict[str, Any]
+
+# Клиент DDGS синхронный; свой ограниченный пул, чтобы зависший запрос не занял общий executor
+_DDGS_POOL: Optional[ThreadPoolExecutor] = None
+
+
+class SearchBackend:
+    name: str = ""
+    # Локальный источник опрашивается до сети
+    local: bool = False
+
+    def enabled(self) -> bool:
+        return True
+
+    async def search(self, query: str, limit: int) -> list[Result]:
+        raise NotImplementedError
+
+
+class DDGSBackend(SearchBackend):
+    name = "ddg"
+
+    def __init__(self, region: str = "wt-wt") -> None:
+        self.region: str = region
+
+    def _search(self, query: str, limit: int) -> list[Result]:
+        from ddgs import DDGS
+
+        return [
+            {"href": r.get("href", ""), "title": r.get("title", ""), "body": r.get("body", "")}
+            for r in DDGS().text(query, max_results=limit, region=self.region)
+        ]
+
+    async def search(self, query: str, limit: int) -> list[Result]:
+        global _DDGS_POOL
+        if _DDGS_POOL is None:
+            _DDGS_POOL = ThreadPoolExecutor(max_workers=SEARCH_DDGS_WORKERS, thread_name_prefix="ddgs")
+        return await asyncio.get_running_loop().run_in_executor(_DDGS_POOL, self._search, query, limit)
+
+
+class SearxBackend(SearchBackend):
+    """SearxNG (или совместимый) JSON API: /search?q=...&format=json"""
+
+    name = "searx"
+
+    def enabled(self) -> bool:
+        return bool(SEARXNG_URL)
+
+    async def search(self, query: str, limit: int) -> list[Result]:
+        import aiohttp
+
+        timeout = aiohttp.ClientTimeout(total=SEARCH_BACKEND_TIMEOUT)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            async with session.get(f"{SEARXNG_URL.rstrip('/')}/search", params={"q": query, "format": "json"}) as resp:
+                resp.raise_for_status()
+                data: dict = await resp.json(content_type=None)
+        return [
+            {"href": r.get("url", ""), "title": r.get("title", ""), "body": r.get("content", "")}
+            for r in data.get("results", [])[:limit]
+        ]
+
+
+class MirrorBackend(SearchBackend):
+    name = "mirror"
+    local = True
+
+    def enabled(self) -> bool:
+        return bool(MIRROR_ROOTS)
+
+    async def search(self, query: str, limit: int) -> list[Result]:
+        return [
+            {"href": hit["url"], "title": hit["title"], "body": hit["body"][:300], "local": hit["body"]}
+            for hit in mirror.MIRROR.search(query, min(limit, MIRROR_MAX_HITS))
+        ]
+
+
+BACKENDS: list[SearchBackend] = [MirrorBackend(), DDGSBackend(), SearxBackend()]
+
+
+def _url_key(href: str) -> str:
+    url: str = urldefrag(href)[0]
+    parsed = urlparse(url)
+    host: str = (parsed.hostname or "").lower().removeprefix("www.")
+    return f"{host}{parsed.path.rstrip('/')}?{parsed.query}"
+
+
+async def search(query: str, limit: int = 30, good: Optional[Callable[[Result], bool]] = None) -> tuple[list[Result], dict[str, str]]:
+    """
+    Результаты всех бэкендов без повторов URL и сводка по бэкендам (для вывода).
+    Локальные бэкенды опрашиваются первыми: MIRROR_MIN_HITS их результатов — сетевые не запускаются.
+    Досрочный выход: good() вернул True для SEARCH_EARLY_HITS результатов.
+    """
+    backends: list[SearchBackend] = [b for b in BACKENDS if b.enabled()]
+    started: float = time.monotonic()
+    report: dict[str, str] = {}
+    # URL -> (ранг в выдаче своего бэкенда, порядок бэкенда, результат)
+    merged: dict[str, tuple[int, int, Result]] = {}
+    good_hits: int = 0
+    order: dict[str, int] = {b.name: n for n, b in enumerate(backends)}
+
+    def elapsed() -> str:
+        return f"{(time.monotonic() - started) * 1000:.0f} мс"
+
+    def add(backend: SearchBackend, results: list[Result]) -> int:
+        """Сливает выдачу бэкенда; возвращает число новых URL"""
+        nonlocal good_hits
+        report[backend.name] = f"{len(results)}, {elapsed()}"
+        added: int = 0
+        for rank, r in enumerate(results):
+            if not r.get("href"):
+                continue
+            key: str = _url_key(r["href"])
+            if key in merged:
+                continue
+            merged[key] = (rank, order[backend.name], {**r, "backend": backend.name})
+            added += 1
+            if good is not None and good(r):
+                good_hits += 1
+        return added
+
+    def ordered() -> list[Result]:
+        # Выдачи чередуются по рангу: первые ссылки каждого бэкенда идут раньше хвостов
+        return [r for _rank, _order, r in sorted(merged.values(), key=lambda item: (item[0], item[1]))][:limit]
+
+    local_hits: int = 0
+    for backend in [b for b in backends if b.local]:
+        try:
+            local_hits += add(backend, await backend.search(query, limit))
+        except Exception as e:
+            report[backend.name] = f"ошибка {type(e).__name__}, {elapsed()}"
+    if local_hits >= MIRROR_MIN_HITS:
+        return ordered(), report
+
+    tasks: dict[asyncio.Task, SearchBackend] = {
+        asyncio.create_task(b.search(query, limit)): b for b in backends if not b.local
+    }
+    pending: set[asyncio.Task] = set(tasks)
+    deadline: float = started + SEARCH_BACKEND_TIMEOUT
+    while pending:
+        done, pending = await asyncio.wait(pending, timeout=max(0.0, deadline - time.monotonic()),
+                                           return_when=asyncio.FIRST_COMPLETED)
+        if not done:
+            break
+        for task in done:
+            if task.exception() is not None:
+                report[tasks[task].name] = f"ошибка {type(task.exception()).__name__}, {elapsed()}"
+                continue
+            add(tasks[task], task.result())
+        if good is not None and good_hits >= SEARCH_EARLY_HITS:
+            break
+
+    for task in pending:
+        report[tasks[task].name] = "не дождались"
+        task.cancel()
+
+    return ordered(), report
@@ -0,0 +1,193 @@
+import asyncio
+import codecs
+import os
+import re
+import signal
+import sys
+import time
+from collections import deque
+from typing import Optional
+
+from config import *
+
+# --- ПОТОКОВЫЙ ЗАПУСК SHELL-КОМАНД ---
+
+# Строки, которые стоит показать модели в первую очередь (rustc/cargo, pytest, gcc/clang, python)
+ERROR_LINE_RE = re.compile(
+    rb"^(?:error(?:\[E\d+\])?:.*"
+    rb"|[ \t]*--> \S+:\d+:\d+.*"
+    rb"|FAILED \S+.*"
+    rb"|ERROR \S+.*"
+    rb"|E {3}.*"
+    rb"|\S+:\d+:\d+: (?:fatal )?error:.*"
+    rb"|[ \t]*File \".+\", line \d+.*"
+    rb"|(?:\w+\.)*\w*(?:Error|Exception): .*"
+    rb"|thread '.+' panicked at .*"
+    rb"|npm ERR!.*)$",
+    re.MULTILINE,
+)
+
+
+class OutputBuffer:
+    """Начало и хвост потока фиксированного размера: память не растёт с объёмом вывода"""
+
+    def __init__(self, head_limit: int, tail_limit: int) -> None:
+        self.head_limit: int = head_limit
+        self.tail_limit: int = tail_limit
+        self.head = bytearray()
+        self.tail: deque[bytes] = deque()
+        self.tail_size: int = 0
+        self.total: int = 0
+
+    def feed(self, chunk: bytes) -> None:
+        self.total += len(chunk)
+        if len(self.head) < self.head_limit:
+            room: int = self.head_limit - len(self.head)
+            self.head += chunk[:room]
+            chunk = chunk[room:]
+        if not chunk:
+            return
+        self.tail.append(chunk)
+        self.tail_size += len(chunk)
+        while self.tail_size > self.tail_limit:
+            extra: int = self.tail_size - self.tail_limit
+            first: bytes = self.tail[0]
+            if len(first) <= extra:
+                self.tail.popleft()
+                self.tail_size -= len(first)
+            else:
+                self.tail[0] = first[extra:]
+                self.tail_size -= extra
+
+    def render(self) -> str:
+        head: str = self.head.decode(errors="replace")
+        tail: str = b"".join(self.tail).decode(errors="replace")
+        skipped: int = self.total - len(self.head) - self.tail_size
+        if skipped > 0:
+            return f"{head}\n... [пропущено {skipped} байт] ...\n{tail}"
+        return head + tail
+
+
+class ErrorLines:
+    """Построчный разбор одного потока с выборкой строк-ошибок в общий список"""
+
+    MAX_LINE: int = 8192
+
+    def __init__(self, lines: deque[str]) -> None:
+        self.lines: deque[str] = lines
+        self.carry = bytearray()
+
+    def feed(self, chunk: bytes) -> None:
+        cut: int = chunk.rfind(b"\n")
+        if cut < 0:
+            self.carry += chunk
+            if len(self.carry) > self.MAX_LINE:
+                self._scan(bytes(self.carry))
+                self.carry.clear()
+            return
+        self._scan(bytes(self.carry) + chunk[:cut])
+        self.carry = bytearray(chunk[cut + 1:])
+
+    def close(self) -> None:
+        if self.carry:
+            self._scan(bytes(self.carry))
+            self.carry.clear()
+
+    def _scan(self, block: bytes) -> None:
+        for m in ERROR_LINE_RE.finditer(block):
+            self.lines.append(m.group(0)[:300].decode(errors="replace").rstrip())
+
+
+class ShellResult:
+    """Итог выполнения команды"""
+
+    def __init__(self, cmd: str) -> None:
+        self.cmd: str = cmd
+        self.exit_code: Optional[int] = None
+        self.timed_out: bool = False
+        self.duration: float = 0.0
+        self.stdout = OutputBuffer(SHELL_HEAD_BYTES, SHELL_TAIL_BYTES)
+        self.stderr = OutputBuffer(SHELL_HEAD_BYTES, SHELL_TAIL_BYTES)
+        self.error_lines: deque[str] = deque(maxlen=SHELL_ERROR_LINES)
+
+    def format(self, timeout: float) -> str:
+        """Компактный текст для модели: код выхода, строки ошибок, начало и хвост вывода"""
+        status: str = f"EXIT: {self.exit_code} ({self.duration:.1f}s)"
+        if self.timed_out:
+            status += f" — ТАЙМАУТ {timeout:.0f}s, группа процессов остановлена"
+        out: list[str] = [status]
+        if self.error_lines:
+            out.append("ОШИБКИ:\n" + "\n".join(self.error_lines))
+        if self.stdout.total:
+            out.append(f"STDOUT ({self.stdout.total} байт):\n{self.stdout.render()}")
+        if self.stderr.total:
+            out.append(f"STDERR ({self.stderr.total} байт):\n{self.stderr.render()}")
+        result: str = "\n".join(out)
+        return result[:SHELL_OUTPUT_LIMIT]
+
+
+def _kill_group(proc: asyncio.subprocess.Process, sig: int) -> None:
+    try:
+        os.killpg(proc.pid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+async def _terminate(proc: asyncio.subprocess.Process) -> None:
+    """SIGTERM всей группе, через паузу — SIGKILL"""
+    _kill_group(proc, signal.SIGTERM)
+    try:
+        await asyncio.wait_for(proc.wait(), timeout=3.0)
+    except asyncio.TimeoutError:
+        _kill_group(proc, signal.SIGKILL)
+        await proc.wait()
+
+
+async def run_command(cmd: str, cwd: str, timeout: float, echo: bool = SHELL_ECHO) -> ShellResult:
+    """Запускает команду в отдельной группе процессов и читает оба потока по мере поступления"""
+    result = ShellResult(cmd)
+    started: float = time.monotonic()
+
+    proc = await asyncio.create_subprocess_shell(
+        cmd,
+        cwd=cwd,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        start_new_session=True,
+    )
+
+    async def pump(stream: asyncio.StreamReader, buf: OutputBuffer, sink) -> None:
+        errors = ErrorLines(result.error_lines)
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        while chunk := await stream.read(65536):
+            buf.feed(chunk)
+            errors.feed(chunk)
+            if echo:
+                sink.write(decoder.decode(chunk))
+                sink.flush()
+        errors.close()
+
+    readers = asyncio.ensure_future(asyncio.gather(
+        pump(proc.stdout, result.stdout, sys.stdout),
+        pump(proc.stderr, result.stderr, sys.stderr),
+    ))
+    waiter = asyncio.ensure_future(proc.wait())
+
+    try:
+        _, pending = await asyncio.wait({readers, waiter}, timeout=timeout)
+        if pending:
+            result.timed_out = True
+            await _terminate(proc)
+            _, pending = await asyncio.wait({readers}, timeout=2.0)
+            if pending:
+                # Пайпы держат потомки, сменившие группу — дальше не ждём
+                readers.cancel()
+    except asyncio.CancelledError:
+        await _terminate(proc)
+        readers.cancel()
+        raise
+
+    result.exit_code = proc.returncode
+    result.duration = time.monotonic() - started
+    return result
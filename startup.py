@@ -0,0 +1,67 @@
+import builtins
+import sys
+import time
+from typing import Any, Awaitable, TypeVar
+
+# --- ПРОФИЛИРОВАНИЕ ЗАПУСКА (--profile-startup) ---
+# Модуль импортируется первым в main.py: хук импорта должен встать до тяжёлых зависимостей,
+# поэтому здесь нет `from config import *` и цветов.
+
+T = TypeVar("T")
+
+
+class StartupProfile:
+    """Время импортов (по пакетам верхнего уровня) и этапов инициализации до первого промпта"""
+
+    def __init__(self, enabled: bool) -> None:
+        self.enabled: bool = enabled
+        self.started: float = time.perf_counter()
+        self.imports: dict[str, float] = {}
+        self.phases: list[tuple[str, float]] = []
+        self._depth: int = 0
+        self._original_import = builtins.__import__
+        if enabled:
+            builtins.__import__ = self._timed_import
+
+    def _timed_import(self, name: str, *args: Any, **kwargs: Any) -> Any:
+        root: str = name.partition(".")[0]
+        # Меряем только внешний импорт ещё не загруженного пакета: вложенные входят в его время
+        if self._depth or not root or root in sys.modules:
+            return self._original_import(name, *args, **kwargs)
+        self._depth += 1
+        t0: float = time.perf_counter()
+        try:
+            return self._original_import(name, *args, **kwargs)
+        finally:
+            self._depth -= 1
+            self.imports[root] = self.imports.get(root, 0.0) + time.perf_counter() - t0
+
+    def mark(self, phase: str) -> None:
+        """Отметка этапа: время от старта процесса"""
+        if self.enabled:
+            self.phases.append((phase, time.perf_counter() - self.started))
+
+    async def timed(self, phase: str, aw: Awaitable[T]) -> T:
+        """Длительность корутины (для параллельной инициализации сервисов)"""
+        t0: float = time.perf_counter()
+        try:
+            return await aw
+        finally:
+            if self.enabled:
+                self.phases.append((f"{phase} ({(time.perf_counter() - t0) * 1000:.0f} мс)", time.perf_counter() - self.started))
+
+    def report(self) -> None:
+        if not self.enabled:
+            return
+        builtins.__import__ = self._original_import
+        print("\n[STARTUP] Импорты (пакеты верхнего уровня):")
+        for name, seconds in sorted(self.imports.items(), key=lambda kv: -kv[1])[:15]:
+            print(f"  {seconds * 1000:8.1f} мс  {name}")
+        print(f"  {sum(self.imports.values()) * 1000:8.1f} мс  всего")
+        print("[STARTUP] Этапы (от старта процесса):")
+        for phase, at in self.phases:
+            print(f"  {at * 1000:8.1f} мс  {phase}")
+        print()
+
+
+PROFILE = StartupProfile(enabled="--profile-startup" in sys.argv)
@@ -0,0 +1,537 @@
+import asyncio
+import json
+import sys
+import time
+from collections import deque
+from typing import Any, Optional
+
+import asyncpg
+import redis.asyncio as redis
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+
+from config import *
+
+# --- ХРАНИЛИЩЕ ИСТОРИИ ---
+# Истории диалогов (проекты, /dialog_web, /ant) пишутся через TranscriptStore с двумя бэкендами:
+#   RedisStore  — списки, ключи и ZSET в Redis;
+#   MemoryStore — ограниченный deque на ключ в памяти процесса; каждая запись сначала уходит
+#                 в журнал transcript_wal в PostgreSQL (write-ahead), при запуске память из него восстанавливается.
+# STORE выбирает бэкенд при запуске (STORE_BACKEND) и сам переходит в память при потере Redis;
+# когда Redis возвращается, журнал проигрывается в Redis и очищается.
+
+# Ошибки, после которых Redis считается потерянным
+REDIS_DOWN: tuple[type[BaseException], ...] = (RedisConnectionError, RedisTimeoutError, OSError)
+
+# (ключ индекса, член): отметка «член использован сейчас» — для LRU и списка сессий
+Index = tuple[str, str]
+
+
+def _lrange(items: list[str], start: int, stop: int) -> list[str]:
+    """Срез с семантикой LRANGE (stop включительно, отрицательные индексы с конца)"""
+    n: int = len(items)
+    if start < 0:
+        start = max(0, n + start)
+    if stop < 0:
+        stop = n + stop
+    return items[start:stop + 1]
+
+
+async def _connect() -> Any:
+    return await asyncpg.connect(user=DB_USER, password=DB_PASS, database=DB_NAME, host=DB_HOST, port=DB_PORT)
+
+
+class TranscriptStore:
+    """Списки сообщений (JSON-строки) по ключам, строковые значения и индексы «член -> время последнего использования»"""
+
+    name: str = ""
+
+    async def read(self, key: str, start: int = 0, stop: int = -1,
+                   ttl: Optional[int] = None, index: Optional[Index] = None) -> list[str]:
+        """Срез списка; ttl продлевает жизнь ключа, index отмечает использование"""
+        raise NotImplementedError
+
+    async def length(self, key: str) -> int:
+        raise NotImplementedError
+
+    async def append(self, key: str, items: list[str], keep: Optional[int] = None,
+                     ttl: Optional[int] = None, index: Optional[Index] = None) -> None:
+        """Дописывает в конец; keep — сколько последних элементов оставить"""
+        raise NotImplementedError
+
+    async def replace(self, key: str, items: list[str], ttl: Optional[int] = None, index: Optional[Index] = None) -> None:
+        raise NotImplementedError
+
+    async def drop_head(self, key: str, count: int) -> None:
+        """Убирает count первых элементов"""
+        raise NotImplementedError
+
+    async def delete(self, *keys: str) -> int:
+        raise NotImplementedError
+
+    async def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: str) -> None:
+        raise NotImplementedError
+
+    async def mark(self, index: str, mapping: dict[str, float]) -> None:
+        raise NotImplementedError
+
+    async def ranked(self, index: str) -> list[tuple[str, float]]:
+        """Члены индекса от давно не использованных к свежим"""
+        raise NotImplementedError
+
+    async def forget(self, index: str, *members: str) -> None:
+        raise NotImplementedError
+
+    async def info(self, keys: list[str]) -> list[tuple[int, int, int]]:
+        """(элементов, байт памяти, секунд до истечения или -1) по каждому ключу"""
+        raise NotImplementedError
+
+    async def keys(self, prefix: str) -> list[str]:
+        raise NotImplementedError
+
+
+class RedisStore(TranscriptStore):
+    name = "redis"
+
+    def __init__(self, client: Any) -> None:
+        self.r: Any = client
+
+    async def read(self, key: str, start: int = 0, stop: int = -1,
+                   ttl: Optional[int] = None, index: Optional[Index] = None) -> list[str]:
+        pipe = self.r.pipeline(transaction=False)
+        pipe.lrange(key, start, stop)
+        if ttl:
+            pipe.expire(key, ttl)
+        if index:
+            pipe.zadd(index[0], {index[1]: time.time()})
+        return (await pipe.execute())[0]
+
+    async def length(self, key: str) -> int:
+        return await self.r.llen(key)
+
+    async def append(self, key: str, items: list[str], keep: Optional[int] = None,
+                     ttl: Optional[int] = None, index: Optional[Index] = None) -> None:
+        pipe = self.r.pipeline(transaction=False)
+        pipe.rpush(key, *items)
+        if keep:
+            pipe.ltrim(key, -keep, -1)
+        if ttl:
+            pipe.expire(key, ttl)
+        if index:
+            pipe.zadd(index[0], {index[1]: time.time()})
+        await pipe.execute()
+
+    async def replace(self, key: str, items: list[str], ttl: Optional[int] = None, index: Optional[Index] = None) -> None:
+        pipe = self.r.pipeline(transaction=True)
+        pipe.delete(key)
+        if items:
+            pipe.rpush(key, *items)
+            if ttl:
+                pipe.expire(key, ttl)
+        if index:
+            pipe.zadd(index[0], {index[1]: time.time()})
+        await pipe.execute()
+
+    async def drop_head(self, key: str, count: int) -> None:
+        if count > 0:
+            await self.r.ltrim(key, count, -1)
+
+    async def delete(self, *keys: str) -> int:
+        return await self.r.delete(*keys) if keys else 0
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self.r.get(key)
+
+    async def set(self, key: str, value: str) -> None:
+        await self.r.set(key, value)
+
+    async def mark(self, index: str, mapping: dict[str, float]) -> None:
+        if mapping:
+            await self.r.zadd(index, mapping)
+
+    async def ranked(self, index: str) -> list[tuple[str, float]]:
+        return await self.r.zrange(index, 0, -1, withscores=True)
+
+    async def forget(self, index: str, *members: str) -> None:
+        if members:
+            await self.r.zrem(index, *members)
+
+    async def info(self, keys: list[str]) -> list[tuple[int, int, int]]:
+        if not keys:
+            return []
+        pipe = self.r.pipeline(transaction=False)
+        for key in keys:
+            pipe.llen(key)
+            pipe.memory_usage(key)
+            pipe.ttl(key)
+        replies: list[Any] = await pipe.execute()
+        return [(replies[n], replies[n + 1] or 0, replies[n + 2]) for n in range(0, len(replies), 3)]
+
+    async def keys(self, prefix: str) -> list[str]:
+        return [key async for key in self.r.scan_iter(match=f"{prefix}*")]
+
+
+class MemoryStore(TranscriptStore):
+    """Всё в памяти процесса; изменения сначала записываются в журнал transcript_wal"""
+
+    name = "memory"
+
+    def __init__(self, max_items: int = STORE_MEMORY_MAX_ITEMS) -> None:
+        self.max_items: int = max_items
+        self.lists: dict[str, deque[str]] = {}
+        self.values: dict[str, str] = {}
+        self.indexes: dict[str, dict[str, float]] = {}
+        self.expires: dict[str, float] = {}
+        self.wal_rows: int = 0
+        self._wal: Optional[Any] = None
+
+    async def load(self) -> None:
+        """Восстанавливает состояние из журнала; длинный журнал сворачивается в снимок"""
+        try:
+            self._wal = await _connect()
+            rows: Any = await self._wal.fetch("SELECT op, args FROM transcript_wal ORDER BY id")
+        except Exception as e:
+            print(f"{C_YELLOW}[STORE]{C_RESET} Журнал истории недоступен, история только в памяти: {e}")
+            self._wal = None
+            return
+        for row in rows:
+            data: dict[str, Any] = json.loads(row["args"])
+            getattr(self, f"_{row['op']}")(*data["args"], **data["kwargs"])
+        self.wal_rows = len(rows)
+        if self.wal_rows > STORE_WAL_CHECKPOINT:
+            await self.checkpoint()
+
+    async def checkpoint(self) -> None:
+        """Заменяет журнал снимком текущего состояния"""
+        if self._wal is None:
+            return
+        now: float = time.time()
+        snapshot: list[tuple[str, str]] = []
+        for key in list(self.lists):
+            items: Optional[deque[str]] = self._alive(key)
+            if items:
+                ttl: Optional[int] = int(self.expires[key] - now) if key in self.expires else None
+                snapshot.append(("replace", json.dumps({"args": [key, list(items), ttl], "kwargs": {}}, ensure_ascii=False)))
+        for key, value in self.values.items():
+            snapshot.append(("set", json.dumps({"args": [key, value], "kwargs": {}})))
+        for index, mapping in self.indexes.items():
+            snapshot.append(("mark", json.dumps({"args": [index, mapping], "kwargs": {}})))
+        async with self._wal.transaction():
+            await self._wal.execute("DELETE FROM transcript_wal")
+            await self._wal.executemany("INSERT INTO transcript_wal (op, args) VALUES ($1, $2::jsonb)", snapshot)
+        self.wal_rows = len(snapshot)
+
+    async def close(self) -> None:
+        if self._wal is not None:
+            await self._wal.close()
+            self._wal = None
+
+    async def _log(self, op: str, *args: Any, **kwargs: Any) -> None:
+        if self._wal is None:
+            return
+        try:
+            await self._wal.execute(
+                "INSERT INTO transcript_wal (op, args) VALUES ($1, $2::jsonb)",
+                op,
+                json.dumps({"args": args, "kwargs": kwargs}, ensure_ascii=False),
+            )
+            self.wal_rows += 1
+        except Exception as e:
+            print(f"{C_YELLOW}[STORE]{C_RESET} Запись в журнал не удалась, дальше история только в памяти: {e}")
+            self._wal = None
+
+    def _alive(self, key: str) -> Optional[deque[str]]:
+        if key in self.expires and self.expires[key] <= time.time():
+            self.lists.pop(key, None)
+            self.expires.pop(key)
+        return self.lists.get(key)
+
+    def _touch(self, key: str, ttl: Optional[int], index: Optional[Index]) -> None:
+        if ttl:
+            self.expires[key] = time.time() + ttl
+        if index:
+            self.indexes.setdefault(index[0], {})[index[1]] = time.time()
+
+    # Изменения: _метод применяет к памяти (и при восстановлении из журнала), метод — журнал, затем память
+
+    def _append(self, key: str, items: list[str], keep: Optional[int] = None,
+                ttl: Optional[int] = None, index: Optional[Index] = None) -> None:
+        target: Optional[deque[str]] = self._alive(key)
+        if target is None:
+            target = self.lists[key] = deque(maxlen=self.max_items)
+        target.extend(items)
+        while keep and len(target) > keep:
+            target.popleft()
+        self._touch(key, ttl, index)
+
+    def _replace(self, key: str, items: list[str], ttl: Optional[int] = None, index: Optional[Index] = None) -> None:
+        self.expires.pop(key, None)
+        if items:
+            self.lists[key] = deque(items, maxlen=self.max_items)
+        else:
+            self.lists.pop(key, None)
+        self._touch(key, ttl if items else None, index)
+
+    def _drop_head(self, key: str, count: int) -> None:
+        target: Optional[deque[str]] = self._alive(key)
+        for _ in range(min(count, len(target or ()))):
+            target.popleft()
+
+    def _delete(self, *keys: str) -> int:
+        deleted: int = 0
+        for key in keys:
+            found: bool = self._alive(key) is not None or key in self.values
+            self.lists.pop(key, None)
+            self.values.pop(key, None)
+            self.expires.pop(key, None)
+            deleted += found
+        return deleted
+
+    def _set(self, key: str, value: str) -> None:
+        self.values[key] = str(value)
+
+    def _mark(self, index: str, mapping: dict[str, float]) -> None:
+        self.indexes.setdefault(index, {}).update(mapping)
+
+    def _forget(self, index: str, *members: str) -> None:
+        for member in members:
+            self.indexes.get(index, {}).pop(member, None)
+
+    async def append(self, key: str, items: list[str], keep: Optional[int] = None,
+                     ttl: Optional[int] = None, index: Optional[Index] = None) -> None:
+        await self._log("append", key, items, keep, ttl, index)
+        self._append(key, items, keep, ttl, index)
+
+    async def replace(self, key: str, items: list[str], ttl: Optional[int] = None, index: Optional[Index] = None) -> None:
+        await self._log("replace", key, items, ttl, index)
+        self._replace(key, items, ttl, index)
+
+    async def drop_head(self, key: str, count: int) -> None:
+        if count > 0:
+            await self._log("drop_head", key, count)
+            self._drop_head(key, count)
+
+    async def delete(self, *keys: str) -> int:
+        await self._log("delete", *keys)
+        return self._delete(*keys)
+
+    async def set(self, key: str, value: str) -> None:
+        await self._log("set", key, str(value))
+        self._set(key, value)
+
+    async def mark(self, index: str, mapping: dict[str, float]) -> None:
+        await self._log("mark", index, mapping)
+        self._mark(index, mapping)
+
+    async def forget(self, index: str, *members: str) -> None:
+        await self._log("forget", index, *members)
+        self._forget(index, *members)
+
+    # Чтение — без журнала
+
+    async def read(self, key: str, start: int = 0, stop: int = -1,
+                   ttl: Optional[int] = None, index: Optional[Index] = None) -> list[str]:
+        items: Optional[deque[str]] = self._alive(key)
+        if items is None:
+            self._touch(key, None, index)
+            return []
+        self._touch(key, ttl, index)
+        return _lrange(list(items), start, stop)
+
+    async def length(self, key: str) -> int:
+        return len(self._alive(key) or ())
+
+    async def get(self, key: str) -> Optional[str]:
+        return self.values.get(key)
+
+    async def ranked(self, index: str) -> list[tuple[str, float]]:
+        return sorted(self.indexes.get(index, {}).items(), key=lambda kv: kv[1])
+
+    async def info(self, keys: list[str]) -> list[tuple[int, int, int]]:
+        result: list[tuple[int, int, int]] = []
+        for key in keys:
+            items: deque[str] = self._alive(key) or deque()
+            memory: int = sys.getsizeof(items) + sum(sys.getsizeof(item) for item in items) if items else 0
+            ttl: int = int(self.expires[key] - time.time()) if key in self.expires else -1
+            result.append((len(items), memory, ttl if items else -2))
+        return result
+
+    async def keys(self, prefix: str) -> list[str]:
+        return [key for key in [*self.lists, *self.values] if key.startswith(prefix) and (key in self.values or self._alive(key))]
+
+
+class FailoverStore(TranscriptStore):
+    """Текущий бэкенд: Redis, пока он отвечает, иначе память с журналом; переключение прозрачно для вызывающих"""
+
+    def __init__(self) -> None:
+        self.backend: TranscriptStore = MemoryStore()
+        self._client: Optional[Any] = None
+        # Клиент создан здесь (переподключение), а не передан в start() — закрываем сами
+        self._owns_client: bool = False
+        self._task: Optional[asyncio.Task] = None
+        self._switching: asyncio.Lock = asyncio.Lock()
+
+    @property
+    def name(self) -> str:
+        return self.backend.name
+
+    @property
+    def redis(self) -> Optional[Any]:
+        """Клиент Redis для остальных модулей (здоровье доменов); None — Redis потерян, работают без него"""
+        if STORE_BACKEND == "memory" or isinstance(self.backend, RedisStore):
+            return self._client
+        return None
+
+    async def start(self, client: Optional[Any] = None) -> None:
+        """Выбор бэкенда после init_db/init_redis; client — подключение к Redis или None"""
+        self._client = client
+        if STORE_BACKEND != "memory" and client is not None:
+            try:
+                # Записи, оставшиеся в журнале с прошлого запуска без Redis
+                await self._reconcile()
+                return
+            except Exception as e:
+                if isinstance(self.backend, RedisStore):
+                    # Переключились, не удалось только очистить журнал
+                    print(f"{C_YELLOW}[STORE]{C_RESET} Журнал перенесён в Redis, но не очищен: {e}")
+                    return
+                print(f"{C_YELLOW}[STORE]{C_RESET} Перенос журнала в Redis не удался, повтор через {STORE_RECONNECT_SECONDS}с: {e}")
+        memory = MemoryStore()
+        await memory.load()
+        self.backend = memory
+        if STORE_BACKEND != "memory":
+            self._watch()
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+        if isinstance(self.backend, MemoryStore):
+            await self.backend.close()
+        if self._client is not None and self._owns_client:
+            await self._client.aclose()
+
+    async def _fall_back(self, failed: TranscriptStore, error: BaseException) -> None:
+        async with self._switching:
+            if self.backend is not failed:
+                # Параллельный вызов уже переключил бэкенд
+                return
+            await self._switch_to_memory(error)
+
+    async def _switch_to_memory(self, error: BaseException) -> None:
+        print(f"{C_YELLOW}[STORE]{C_RESET} Redis недоступен ({type(error).__name__}) — история в памяти процесса с журналом в PostgreSQL.")
+        memory = MemoryStore()
+        await memory.load()
+        self.backend = memory
+        self._watch()
+
+    def _watch(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self) -> None:
+        while True:
+            await asyncio.sleep(STORE_RECONNECT_SECONDS)
+            try:
+                if self._client is None:
+                    self._client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0, decode_responses=True, socket_timeout=10)
+                    self._owns_client = True
+                await self._client.ping()
+            except Exception:
+                continue
+            try:
+                await self._reconcile()
+                return
+            except Exception as e:
+                print(f"{C_YELLOW}[STORE]{C_RESET} Перенос журнала в Redis не удался, повтор через {STORE_RECONNECT_SECONDS}с: {e}")
+
+    async def _reconcile(self) -> None:
+        """Проигрывает журнал в Redis, переключается на Redis и очищает проигранное"""
+        target = RedisStore(self._client)
+        previous: TranscriptStore = self.backend
+        conn: Any = await _connect()
+        try:
+            last: int = 0
+            replayed: int = 0
+            while True:
+                rows: Any = await conn.fetch("SELECT id, op, args FROM transcript_wal WHERE id > $1 ORDER BY id", last)
+                if not rows:
+                    break
+                for row in rows:
+                    data: dict[str, Any] = json.loads(row["args"])
+                    await getattr(target, row["op"])(*data["args"], **data["kwargs"])
+                last = rows[-1]["id"]
+                replayed += len(rows)
+            # Между последней выборкой и переключением нет await — новых записей в памяти не появится
+            self.backend = target
+            if replayed:
+                await conn.execute("DELETE FROM transcript_wal WHERE id <= $1", last)
+                print(f"{C_GRAY}[STORE]{C_RESET} Redis доступен: из журнала перенесено {replayed} записей.")
+        finally:
+            await conn.close()
+        if isinstance(previous, MemoryStore):
+            await previous.close()
+
+    async def _call(self, op: str, *args: Any, **kwargs: Any) -> Any:
+        backend: TranscriptStore = self.backend
+        try:
+            return await getattr(backend, op)(*args, **kwargs)
+        except REDIS_DOWN as e:
+            if not isinstance(backend, RedisStore):
+                raise
+            await self._fall_back(backend, e)
+            return await getattr(self.backend, op)(*args, **kwargs)
+
+    async def read(self, *args: Any, **kwargs: Any) -> list[str]:
+        return await self._call("read", *args, **kwargs)
+
+    async def length(self, key: str) -> int:
+        return await self._call("length", key)
+
+    async def append(self, *args: Any, **kwargs: Any) -> None:
+        await self._call("append", *args, **kwargs)
+
+    async def replace(self, *args: Any, **kwargs: Any) -> None:
+        await self._call("replace", *args, **kwargs)
+
+    async def drop_head(self, key: str, count: int) -> None:
+        await self._call("drop_head", key, count)
+
+    async def delete(self, *keys: str) -> int:
+        return await self._call("delete", *keys)
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._call("get", key)
+
+    async def set(self, key: str, value: str) -> None:
+        await self._call("set", key, value)
+
+    async def mark(self, index: str, mapping: dict[str, float]) -> None:
+        await self._call("mark", index, mapping)
+
+    async def ranked(self, index: str) -> list[tuple[str, float]]:
+        return await self._call("ranked", index)
+
+    async def forget(self, index: str, *members: str) -> None:
+        await self._call("forget", index, *members)
+
+    async def info(self, keys: list[str]) -> list[tuple[int, int, int]]:
+        return await self._call("info", keys)
+
+    async def keys(self, prefix: str) -> list[str]:
+        return await self._call("keys", prefix)
+
+    def report(self) -> str:
+        if isinstance(self.backend, MemoryStore):
+            journal: str = f"журнал {self.backend.wal_rows} записей" if self.backend._wal is not None else "без журнала"
+            return f"память процесса ({len(self.backend.lists)} списков, {journal})"
+        return f"Redis {REDIS_HOST}:{REDIS_PORT}"
+
+
+STORE = FailoverStore()
@@ -0,0 +1,161 @@
+"""Адаптеры реестров версий против локального HTTP-сервера с заготовленными ответами"""
+import asyncio
+import os
+import sys
+import time
+from collections import Counter
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import adapters
+
+CRATE: dict = {
+    "crate": {"max_stable_version": "1.40.0", "updated_at": "2024-09-01T10:00:00Z", "description": "async runtime "},
+    "versions": [
+        {"num": "1.41.0-rc1", "created_at": "2024-09-02T00:00:00Z", "yanked": True},
+        {"num": "1.40.0", "created_at": "2024-09-01T00:00:00Z", "yanked": False},
+        {"num": "1.39.3", "created_at": "2024-08-01T00:00:00Z", "yanked": False},
+    ],
+}
+PYPI: dict = {
+    "info": {"version": "2.32.3", "requires_python": ">=3.8", "summary": "HTTP for Humans."},
+    "releases": {
+        "2.32.3": [{"upload_time": "2024-05-29T15:00:00"}],
+        "2.31.0": [{"upload_time": "2023-05-22T15:00:00"}],
+        "0.0.1": [],
+    },
+}
+NPM: dict = {"version": "1.3.0", "description": "pad strings", "engines": {"node": ">=0.10"}}
+RELEASES: list = [
+    {"tag_name": "v3.0.0", "draft": True, "published_at": None, "name": "draft", "body": "secret"},
+    {"tag_name": "v2.1.0-rc1", "prerelease": True, "published_at": "2024-06-02T00:00:00Z", "name": "RC", "body": ""},
+    {"tag_name": "v2.0.0", "published_at": "2024-05-01T00:00:00Z", "name": "Two", "body": "Changes:\n- faster"},
+]
+
+
+def make_app(hits: Counter) -> web.Application:
+    async def handler(request: web.Request) -> web.Response:
+        hits[request.path] += 1
+        routes: dict = {
+            "/crates/crates/tokio": CRATE,
+            "/pypi/requests/json": PYPI,
+            "/npm/left-pad/latest": NPM,
+            "/github/repos/acme/tool/releases": RELEASES,
+        }
+        if request.path not in routes:
+            return web.Response(status=404)
+        return web.json_response(routes[request.path])
+
+    app = web.Application()
+    app.router.add_get("/{tail:.*}", handler)
+    return app
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """Запускает запрос к адаптерам рядом с сервером-заглушкой; возвращает (run, счётчик обращений)"""
+    hits: Counter = Counter()
+    adapters._CACHE.clear()
+
+    def run(coro_factory):
+        async def main():
+            server = TestServer(make_app(hits))
+            await server.start_server()
+            base: str = str(server.make_url("")).rstrip("/")
+            monkeypatch.setattr(adapters, "CRATES_API_URL", f"{base}/crates")
+            monkeypatch.setattr(adapters, "PYPI_API_URL", f"{base}/pypi")
+            monkeypatch.setattr(adapters, "NPM_REGISTRY_URL", f"{base}/npm")
+            monkeypatch.setattr(adapters, "GITHUB_API_URL", f"{base}/github")
+            try:
+                return await coro_factory()
+            finally:
+                await server.close()
+
+        return asyncio.run(main())
+
+    yield run, hits
+    adapters._CACHE.clear()
+
+
+def test_crates_skips_yanked_versions(registry):
+    run, _hits = registry
+    answers = run(lambda: adapters.lookup("cargo tokio latest version"))
+    assert [(label, explicit) for label, _text, explicit in answers] == [("crates.io — tokio", True)]
+    text: str = answers[0][1]
+    assert "Последняя стабильная версия: 1.40.0" in text
+    assert "1.39.3 — 2024-08-01" in text
+    assert "1.41.0-rc1" not in text
+
+
+def test_pypi_lists_releases_newest_first(registry):
+    run, _hits = registry
+    [(label, text, explicit)] = run(lambda: adapters.lookup("pip requests latest version"))
+    assert label == "PyPI — requests" and explicit
+    assert "Последняя версия: 2.32.3" in text
+    assert "Требуется Python: >=3.8" in text
+    assert text.index("2.32.3 — 2024-05-29") < text.index("2.31.0 — 2023-05-22")
+    assert "0.0.1" not in text
+
+
+def test_npm_reads_latest_manifest(registry):
+    run, hits = registry
+    [(_label, text, _explicit)] = run(lambda: adapters.lookup("npm left-pad latest version"))
+    assert "Последняя версия: 1.3.0" in text
+    assert "Требования: {'node': '>=0.10'}" in text
+    assert hits["/npm/left-pad/latest"] == 1
+
+
+def test_github_releases_skip_drafts(registry):
+    run, _hits = registry
+    [(label, text, explicit)] = run(lambda: adapters.lookup("latest release github.com/acme/tool"))
+    assert label == "GitHub Releases — acme/tool" and explicit
+    assert "v2.1.0-rc1 (pre-release) — 2024-06-02" in text
+    assert "  Changes:\n  - faster" in text
+    assert "v3.0.0" not in text and "secret" not in text
+
+
+def test_missing_package_is_none_and_cached(registry):
+    run, hits = registry
+
+    async def twice():
+        first = await adapters.lookup("cargo nosuchcrate latest version")
+        second = await adapters.lookup("cargo nosuchcrate latest version")
+        return first, second
+
+    first, second = run(twice)
+    assert first == [] and second == []
+    assert hits["/crates/crates/nosuchcrate"] == 1
+    assert adapters._CACHE[("crates.io", "nosuchcrate")][1] is None
+
+
+def test_cache_hit_until_ttl_expires(registry, monkeypatch):
+    run, hits = registry
+
+    async def lookups(n: int):
+        for _ in range(n):
+            await adapters.lookup("pip requests latest version")
+
+    run(lambda: lookups(3))
+    assert hits["/pypi/requests/json"] == 1
+
+    # Часы уходят за ADAPTER_CACHE_TTL: запись устарела, следующий запрос снова идёт в реестр
+    later: float = time.time() + adapters.ADAPTER_CACHE_TTL + 1
+    monkeypatch.setattr(adapters.time, "time", lambda: later)
+    run(lambda: lookups(2))
+    assert hits["/pypi/requests/json"] == 2
+
+
+def test_ambiguous_words_are_not_explicit(registry):
+    run, _hits = registry
+    answers = run(lambda: adapters.lookup("what is new in the latest release of tokio"))
+    assert answers and not any(explicit for _label, _text, explicit in answers)
+
+
+def test_no_version_intent_no_requests(registry):
+    run, hits = registry
+    assert run(lambda: adapters.lookup("how to pad a string in npm left-pad")) == []
+    assert not hits
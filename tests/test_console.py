@@ -0,0 +1,88 @@
+"""Ввод с терминала: Ctrl-C в приглашении завершает процесс, а не вешает его на потоке input()"""
+import os
+import select
+import signal
+import sys
+import time
+
+import pytest
+
+ROOT: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Как цикл main.py: приглашение, выход по Ctrl-C, уборка в finally. Без prompt_toolkit — ввод в потоке
+SCRIPT: str = """
+import asyncio, sys
+sys.path.insert(0, sys.argv[1])
+if sys.argv[2] == "thread":
+    sys.modules["prompt_toolkit"] = None
+import console
+
+async def main():
+    try:
+        while True:
+            try:
+                line = await console.ainput("prompt> ")
+            except (EOFError, KeyboardInterrupt):
+                break
+            print("got", line)
+    finally:
+        print("cleanup", console._backend)
+        console.close()
+
+console.run(main())
+"""
+
+
+def read_until(fd: int, marker: bytes, timeout: float) -> bytes:
+    output: bytes = b""
+    deadline: float = time.monotonic() + timeout
+    while marker not in output and time.monotonic() < deadline:
+        ready, _, _ = select.select([fd], [], [], 0.1)
+        if ready:
+            try:
+                chunk: bytes = os.read(fd, 1024)
+            except OSError:
+                break
+            if not chunk:
+                break
+            output += chunk
+    return output
+
+
+def wait_exit(pid: int, timeout: float) -> bool:
+    deadline: float = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if os.waitpid(pid, os.WNOHANG)[0]:
+            return True
+        time.sleep(0.05)
+    return False
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="нужен pty")
+@pytest.mark.parametrize("backend", ["thread", "prompt_toolkit"])
+def test_ctrl_c_at_prompt_exits(backend):
+    import pty
+
+    if backend == "prompt_toolkit":
+        pytest.importorskip("prompt_toolkit")
+    pid, fd = pty.fork()
+    if pid == 0:
+        os.execv(sys.executable, [sys.executable, "-c", SCRIPT, ROOT, backend])
+
+    try:
+        assert b"prompt>" in read_until(fd, b"prompt>", 10)
+        os.write(fd, b"first\r")
+        assert b"got first" in read_until(fd, b"got first", 5)
+        read_until(fd, b"prompt>", 5)
+
+        os.write(fd, b"\x03")
+        marker: bytes = f"cleanup {backend}".encode()
+        assert marker in read_until(fd, marker, 5)
+        assert wait_exit(pid, 5), "процесс не завершился после Ctrl-C"
+    finally:
+        try:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        except (ProcessLookupError, ChildProcessError):
+            pass
+        os.close(fd)
@@ -0,0 +1,72 @@
+"""Выбор модели до генерации: большая модель не ждёт заведомо отвергнутого ответа лёгкой"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import routing
+
+TOOLS: list = [
+    {"function": {"name": "read_file", "parameters": {"required": ["path"]}}},
+    {"function": {"name": "write_file", "parameters": {"required": ["path", "content"]}}},
+]
+READ_CALL: dict = {"message": {"tool_calls": [{"function": {"name": "read_file", "arguments": {"path": "a.py"}}}]}}
+ANSWER: dict = {"message": {"content": "готово"}}
+
+
+class Client:
+    """Ollama-клиент: ответы по модели, список вызванных моделей"""
+
+    def __init__(self, answers: dict) -> None:
+        self.answers: dict = answers
+        self.models: list[str] = []
+
+    async def chat(self, model: str, **kwargs):
+        self.models.append(model)
+        return self.answers[model]
+
+
+@pytest.fixture
+def router(monkeypatch):
+    monkeypatch.setattr(routing, "ROUTE_STATS", {})
+    monkeypatch.setattr(routing, "ROUTE_STRONG_TOOLS", {"write_file"})
+    router = routing.ModelRouter("dev")
+    router.fast, router.strong = "small", "big"
+    return router
+
+
+def chat(router, client, messages):
+    return asyncio.run(router.chat(client, messages, TOOLS, {}))
+
+
+def test_user_message_goes_to_strong(router):
+    client = Client({"small": READ_CALL, "big": ANSWER})
+    assert chat(router, client, [{"role": "user", "content": "привет"}]) == ANSWER
+    assert client.models == ["big"]
+
+
+def test_after_read_only_tool_fast_is_tried(router):
+    client = Client({"small": READ_CALL, "big": ANSWER})
+    messages = [{"role": "user", "content": "q"}, {"role": "tool", "name": "read_file", "content": "..."}]
+    assert chat(router, client, messages) == READ_CALL
+    assert client.models == ["small"]
+
+
+def test_after_write_goes_to_strong(router):
+    client = Client({"small": READ_CALL, "big": ANSWER})
+    messages = [{"role": "user", "content": "q"}, {"role": "tool", "name": "write_file", "content": "ok"}]
+    chat(router, client, messages)
+    assert client.models == ["big"]
+
+
+def test_rejection_is_counted_and_sticky(router):
+    client = Client({"small": ANSWER, "big": ANSWER})
+    messages = [{"role": "user", "content": "q"}, {"role": "tool", "name": "read_file", "content": "..."}]
+    chat(router, client, messages)
+    chat(router, client, messages)
+    assert client.models == ["small", "big", "big"]
+    assert routing.ROUTE_STATS[("dev", "fast", "small")]["rejected"] == 1
+    assert "Впустую" in routing.routes_report()
@@ -0,0 +1,56 @@
+"""Список файлов проекта при запущенном наблюдателе: таблица вместо обхода диска"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scanner
+import watcher
+
+
+def write(path: str, text: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def test_listing_reused_until_files_change(tmp_path, monkeypatch):
+    base: str = str(tmp_path)
+    write(os.path.join(base, "app.py"), "print(1)\n")
+    write(os.path.join(base, "pkg", "util.py"), "x = 1\n")
+    walks: list[str] = []
+    walk = scanner._walk_with_gitignore
+    monkeypatch.setattr(scanner, "_git_files", lambda _base: None)
+    monkeypatch.setattr(scanner, "_walk_with_gitignore", lambda b: walks.append(b) or walk(b))
+
+    async def run():
+        project = watcher.ProjectWatcher(base)
+        project._files = project._snapshot()
+        monkeypatch.setattr(watcher, "_ACTIVE", project)
+
+        first = scanner.list_files(base)
+        first[0]["score"] = 1.0
+        second = scanner.list_files(base)
+        assert [e["path"] for e in second] == ["app.py", "pkg/util.py"]
+        assert "score" not in second[0]
+        assert len(walks) == 1
+
+        write(os.path.join(base, "new.py"), "y = 2\n")
+        project._publish({os.path.join(base, "new.py")})
+        third = scanner.list_files(base)
+        assert [e["path"] for e in third] == ["app.py", "new.py", "pkg/util.py"]
+        assert len(walks) == 2
+
+    asyncio.run(run())
+
+
+def test_without_watcher_reads_disk(tmp_path, monkeypatch):
+    base: str = str(tmp_path)
+    write(os.path.join(base, "app.py"), "print(1)\n")
+    monkeypatch.setattr(scanner, "_git_files", lambda _base: None)
+    monkeypatch.setattr(watcher, "_ACTIVE", None)
+
+    assert [e["path"] for e in scanner.list_files(base)] == ["app.py"]
+    write(os.path.join(base, "b.py"), "z = 3\n")
+    assert [e["path"] for e in scanner.list_files(base)] == ["app.py", "b.py"]
@@ -0,0 +1,136 @@
+"""Слияние выдач поисковых бэкендов на заглушках вместо DDG, SearxNG и зеркала"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import search_backends
+from search_backends import SearchBackend
+
+
+class StubBackend(SearchBackend):
+    """Отдаёт заготовленные ссылки через delay секунд; error — падает"""
+
+    def __init__(self, name: str, hrefs: list[str], delay: float = 0.0, error: bool = False, local: bool = False) -> None:
+        self.name = name
+        self.local = local
+        self.hrefs: list[str] = hrefs
+        self.delay: float = delay
+        self.error: bool = error
+        self.calls: int = 0
+        self.cancelled: bool = False
+
+    async def search(self, query: str, limit: int) -> list[dict]:
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error:
+            raise ConnectionError("backend down")
+        return [{"href": href, "title": href, "body": ""} for href in self.hrefs[:limit]]
+
+
+@pytest.fixture
+def backends(monkeypatch):
+    def install(*stubs: StubBackend) -> None:
+        monkeypatch.setattr(search_backends, "BACKENDS", list(stubs))
+
+    monkeypatch.setattr(search_backends, "SEARCH_EARLY_HITS", 2)
+    monkeypatch.setattr(search_backends, "SEARCH_BACKEND_TIMEOUT", 0.5)
+    monkeypatch.setattr(search_backends, "MIRROR_MIN_HITS", 3)
+    return install
+
+
+def hrefs(results: list[dict]) -> list[str]:
+    return [r["href"] for r in results]
+
+
+def test_url_key_merges_variants():
+    key = search_backends._url_key
+    assert key("https://www.Docs.rs/tokio/#install") == key("http://docs.rs/tokio")
+    assert key("https://docs.rs/tokio?v=1") != key("https://docs.rs/tokio?v=2")
+
+
+def test_duplicates_merged_and_ranks_interleaved(backends):
+    first = StubBackend("a", ["https://x.org/1", "https://x.org/2"])
+    second = StubBackend("b", ["https://y.org/1", "https://www.x.org/1/"], delay=0.05)
+    backends(first, second)
+
+    results, report = asyncio.run(search_backends.search("q"))
+
+    assert hrefs(results) == ["https://x.org/1", "https://y.org/1", "https://x.org/2"]
+    assert [r["backend"] for r in results] == ["a", "b", "a"]
+    assert set(report) == {"a", "b"}
+
+
+def test_early_return_on_good_hits(backends):
+    fast = StubBackend("fast", ["https://docs.python.org/1", "https://docs.python.org/2"])
+    slow = StubBackend("slow", ["https://slow.org/1"], delay=5)
+    backends(fast, slow)
+
+    async def run():
+        results, report = await search_backends.search("q", good=lambda r: "docs." in r["href"])
+        await asyncio.sleep(0)
+        return results, report
+
+    results, report = asyncio.run(run())
+
+    assert hrefs(results) == ["https://docs.python.org/1", "https://docs.python.org/2"]
+    assert report["slow"] == "не дождались"
+    assert slow.cancelled
+
+
+def test_backend_error_reported(backends):
+    broken = StubBackend("broken", [], error=True)
+    ok = StubBackend("ok", ["https://x.org/1"])
+    backends(broken, ok)
+
+    results, report = asyncio.run(search_backends.search("q"))
+
+    assert hrefs(results) == ["https://x.org/1"]
+    assert report["broken"].startswith("ошибка ConnectionError")
+
+
+def test_timeout_cancels_pending(backends):
+    ok = StubBackend("ok", ["https://x.org/1"])
+    hung = StubBackend("hung", ["https://late.org/1"], delay=5)
+    backends(ok, hung)
+
+    async def run():
+        results, report = await search_backends.search("q")
+        await asyncio.sleep(0)
+        return results, report
+
+    results, report = asyncio.run(run())
+
+    assert hrefs(results) == ["https://x.org/1"]
+    assert report["hung"] == "не дождались"
+    assert hung.cancelled
+
+
+def test_local_hits_skip_network(backends):
+    local = StubBackend("mirror", [f"https://docs.rs/{n}" for n in range(3)], local=True)
+    network = StubBackend("ddg", ["https://x.org/1"])
+    backends(local, network)
+
+    results, report = asyncio.run(search_backends.search("q"))
+
+    assert len(results) == 3
+    assert network.calls == 0
+    assert "ddg" not in report
+
+
+def test_few_local_hits_query_network(backends):
+    local = StubBackend("mirror", ["https://docs.rs/1"], local=True)
+    network = StubBackend("ddg", ["https://x.org/1"])
+    backends(local, network)
+
+    results, _report = asyncio.run(search_backends.search("q"))
+
+    assert hrefs(results) == ["https://docs.rs/1", "https://x.org/1"]
+    assert network.calls == 1
@@ -0,0 +1,75 @@
+"""Выбор бэкенда истории при запуске: сбой переноса журнала не роняет запуск"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import store
+
+
+class Journal:
+    """Подключение к PostgreSQL с пустым transcript_wal"""
+
+    async def fetch(self, *args):
+        return []
+
+    async def execute(self, *args):
+        return None
+
+    async def close(self):
+        return None
+
+
+def test_import_alone():
+    assert store.STORE.name == "memory"
+
+
+def test_reconcile_failure_stays_in_memory(monkeypatch):
+    async def unavailable():
+        raise OSError("journal down")
+
+    monkeypatch.setattr(store, "_connect", unavailable)
+    monkeypatch.setattr(store, "STORE_BACKEND", "auto")
+    monkeypatch.setattr(store, "STORE_RECONNECT_SECONDS", 3600)
+
+    async def run():
+        failover = store.FailoverStore()
+        await failover.start(object())
+        state = (failover.name, failover.redis, failover._task is not None and not failover._task.done())
+        await failover.stop()
+        return state
+
+    assert asyncio.run(run()) == ("memory", None, True)
+
+
+def test_start_on_redis(monkeypatch):
+    async def journal():
+        return Journal()
+
+    monkeypatch.setattr(store, "_connect", journal)
+    monkeypatch.setattr(store, "STORE_BACKEND", "auto")
+    client = object()
+
+    async def run():
+        failover = store.FailoverStore()
+        await failover.start(client)
+        return failover.name, failover.redis
+
+    assert asyncio.run(run()) == ("redis", client)
+
+
+def test_memory_backend_keeps_client_for_other_modules(monkeypatch):
+    async def unavailable():
+        raise OSError("journal down")
+
+    monkeypatch.setattr(store, "_connect", unavailable)
+    monkeypatch.setattr(store, "STORE_BACKEND", "memory")
+    client = object()
+
+    async def run():
+        failover = store.FailoverStore()
+        await failover.start(client)
+        return failover.name, failover.redis, failover._task
+
+    assert asyncio.run(run()) == ("memory", client, None)
@@ -0,0 +1,42 @@
+"""Классификация ссылок фильтром веб-поиска: некорректные хосты и обход блок-листа"""
+import os
+import sys
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web_filter import WebFilter
+
+RULES: dict = {
+    "blocked_domains": ["spam.cn"],
+    "priority_domains": {"docs.rs": 90, "github.com/rust-lang": 80},
+    "blocked_scripts": [],
+}
+
+
+def reason(href: str) -> Optional[str]:
+    return WebFilter(RULES).classify(href, "title", "body")[0]
+
+
+def test_empty_label_is_invalid():
+    assert reason("https://x..cn/page") == "invalid_url"
+    assert reason("https://.docs.rs/") == "invalid_url"
+
+
+def test_trailing_dot_does_not_bypass_block_list():
+    assert reason("https://spam.cn./page") == "domain"
+    assert reason("https://www.spam.cn./page") == "domain"
+    assert WebFilter(RULES).classify("https://docs.rs./tokio", "", "") == (None, 90, "docs.rs")
+
+
+def test_path_rules():
+    web_filter = WebFilter(RULES)
+    assert web_filter.classify("https://github.com/rust-lang/rust", "", "")[1] == 80
+    assert web_filter.classify("https://github.com/other/repo", "", "")[1] == 0
+
+
+def test_select_survives_odd_hosts():
+    results = [{"href": "https://x..cn/"}, {"href": "https://spam.cn./"}, {"href": "https://docs.rs/tokio"}]
+    kept, blocked = WebFilter(RULES).select(results, 10)
+    assert [item["domain"] for item in kept] == ["docs.rs"]
+    assert blocked["invalid_url"] == 1 and blocked["domain"] == 1
@@ -4,19 +4,34 @@ import os
 import re
 import difflib
 import shlex
-import typing as t
-from typing import cast, List
-from urllib.parse import urlparse
+import time
+from typing import Optional
+from datetime import datetime, timedelta
 
-import aiohttp
 import aiofiles
-from bs4 import BeautifulSoup
-from ddgs import DDGS
-from ollama import ChatResponse
 
 # Импорты из наших модулей
 from config import *
+from domain_health import HEALTH
+from loop_guard import LoopGuard
+from routing import ModelRouter
+from store import STORE
+from web_filter import get_filter
+import adapters
+import checks
+import console
+import dedup
+import dialogs
+import fetch
+import mirror
+import outline
+import passages
+import ranking
+import scanner
+import search_backends
+import shell
 import bd
+import ant
 
 # --- ИНСТРУМЕНТЫ (TOOLS) ---
 
@@ -53,8 +68,16 @@ tools_definition_dev = [
         "type": "function",
         "function": {
             "name": "read_file",
-            "description": "Читать файл",
-            "parameters": {"type": "object", "properties": {"path": {"type": "string"}}, "required": ["path"]},
+            "description": "Читать файл целиком или диапазон строк (номера строк — из карты scan_directory)",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "path": {"type": "string"},
+                    "start_line": {"type": "integer", "description": "Первая строка (с 1)"},
+                    "end_line": {"type": "integer", "description": "Последняя строка включительно"},
+                },
+                "required": ["path"],
+            },
         },
     },
     {
@@ -73,20 +96,60 @@ tools_definition_dev = [
             "parameters": {"type": "object", "properties": {"query": {"type": "string"}}, "required": ["query"]},
         },
     },
+    {
+        "type": "function",
+        "function": {
+            "name": "search_history",
+            "description": "Полнотекстовый поиск по прошлым диалогам (архив в БД): прежние решения, ошибки, договорённости",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "query": {"type": "string"},
+                    "all_projects": {"type": "boolean", "description": "Искать во всех проектах, а не только в текущем"},
+                    "days": {"type": "integer", "description": "Только за последние N дней"},
+                },
+                "required": ["query"],
+            },
+        },
+    },
     {
         "type": "function",
         "function": {
             "name": "run_shell_command",
-            "description": "Консоль",
-            "parameters": {"type": "object", "properties": {"command": {"type": "string"}}, "required": ["command"]},
+            "description": "Консоль. Возвращает код выхода, строки ошибок, начало и хвост вывода.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "command": {"type": "string"},
+                    "timeout": {"type": "integer", "description": "Таймаут в секундах (для долгих сборок)"},
+                },
+                "required": ["command"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "run_checks",
+            "description": "Сборка и тесты только для целей, затронутых изменениями с прошлой проверки (pytest / cargo test). Результаты кэшируются по хэшам файлов.",
+            "parameters": {
+                "type": "object",
+                "properties": {"force": {"type": "boolean", "description": "Перезапустить все цели, игнорируя кэш"}},
+            },
         },
     },
     {
         "type": "function",
         "function": {
             "name": "scan_directory",
-            "description": "Сканирует ВСЕ файлы проекта (.rs, .py, .tomл) и возвращает их код.",
-            "parameters": {"type": "object", "properties": {}},
+            "description": "Карта исходных файлов проекта (с учётом .gitignore, без бинарных): классы, функции, сигнатуры и диапазоны строк.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "mode": {"type": "string", "enum": ["outline", "full"], "description": "outline (по умолчанию) — карта символов, full — содержимое файлов"},
+                    "query": {"type": "string", "description": "Тема задачи: файлы будут отсортированы по релевантности"},
+                },
+            },
         },
     },
     {
@@ -116,12 +179,34 @@ tools_definition_analyzer = [
             "parameters": {"type": "object", "properties": {"query": {"type": "string"}}, "required": ["query"]},
         },
     },
+    {
+        "type": "function",
+        "function": {
+            "name": "search_history",
+            "description": "Полнотекстовый поиск по прошлым диалогам (архив в БД): прежние решения, ошибки, договорённости",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "query": {"type": "string"},
+                    "all_projects": {"type": "boolean", "description": "Искать во всех проектах, а не только в текущем"},
+                    "days": {"type": "integer", "description": "Только за последние N дней"},
+                },
+                "required": ["query"],
+            },
+        },
+    },
     {
         "type": "function",
         "function": {
             "name": "scan_directory",
-            "description": "Сканирует файлы проекта",
-            "parameters": {"type": "object", "properties": {}},
+            "description": "Карта файлов проекта (классы, функции, диапазоны строк)",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "mode": {"type": "string", "enum": ["outline", "full"], "description": "outline (по умолчанию) — карта символов, full — содержимое файлов"},
+                    "query": {"type": "string", "description": "Тема задачи: файлы будут отсортированы по релевантности"},
+                },
+            },
         },
     },
     {
@@ -150,10 +235,10 @@ tools_definition_dialog_web = [
 
 def get_full_path(rel_path: str) -> str:
     """Безопасное получение абсолютного пути в рамках проекта"""
-    if not ACTIVE_PROJECT or not ACTIVE_PROJECT.get("path"):
+    if not bd.ACTIVE_PROJECT or not bd.ACTIVE_PROJECT.get("path"):
         raise PermissionError("Нет активного проекта.")
 
-    base_path = os.path.abspath(ACTIVE_PROJECT["path"])
+    base_path = os.path.abspath(bd.ACTIVE_PROJECT["path"])
     rel_path: str = rel_path.strip()
 
     if os.path.isabs(s=rel_path):
@@ -167,161 +252,198 @@ def get_full_path(rel_path: str) -> str:
     return target_path
 
 
-async def scan_directory_tool() -> str:
-    """Сканирует все важные файлы проекта"""
-    if not ACTIVE_PROJECT:
-        return "Нет проекта."
+def _outline_project(base_path: str, entries: list[dict], max_bytes: int) -> str:
+    """Карта проекта: по каждому файлу — классы/функции с диапазонами строк"""
+    parts: list[str] = ["--- КАРТА ПРОЕКТА (read_file с start_line/end_line — для чтения фрагментов) ---"]
+    total: int = 0
+    skipped: list[str] = []
+    for entry in entries:
+        relative_name: str = entry["path"]
+        try:
+            with open(os.path.join(base_path, relative_name), "r", encoding="utf-8", errors="replace") as f:
+                block: str = outline.render(relative_name, f.read())
+        except OSError as e:
+            block = f">>> {relative_name}\n  ОШИБКА ЧТЕНИЯ: {e}"
+        if total + len(block) > max_bytes:
+            skipped.append(relative_name)
+            continue
+        parts.append(block)
+        total += len(block)
 
-    if not ACTIVE_PROJECT.get("path"):
-        return "Путь к проекту не указан в базе данных."
+    if skipped:
+        parts.append(f"--- НЕ ВОШЛО В ЛИМИТ {max_bytes} СИМВОЛОВ ({len(skipped)} файлов) ---")
+        parts.append("\n".join(skipped))
+    return "\n".join(parts) + "\n"
 
-    base_path = os.path.abspath(ACTIVE_PROJECT["path"])
-    print(f"{C_GRAY}[SCAN]{C_RESET} Сканирую {base_path}...")
 
-    cmd: str = (
-        f"find {shlex.quote(base_path)} -type f "
-        r'\( -name "*.rs" -o -name "*.py" -o -name "*.toml" -o -name "*.txt" -o -name "*.yaml" -o -name "*.yml" -o -name "*.md" \) '
-        r'-not -path "*/target/*" -not -path "*/node_modules/*" -not -path "*/.venv/*" -not -path "*/__pycache__/*" -not -path "*/.git/*"'
-    )
+async def _dump_project(base_path: str, entries: list[dict], max_bytes: int) -> str:
+    """Содержимое файлов (первые LENGTH_CONTEXT символов каждого)"""
+    combined_text = "--- СОДЕРЖИМОЕ ПРОЕКТА ---\n"
+    total: int = 0
+    skipped: list[str] = []
 
-    try:
-        proc = await asyncio.create_subprocess_shell(
-            cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-        )
-        stdout, stderr = await asyncio.wait_for(fut=proc.communicate(), timeout=30.0)
+    for entry in entries:
+        relative_name: str = entry["path"]
+        if total + min(entry["size"], LENGTH_CONTEXT) > max_bytes:
+            skipped.append(relative_name)
+            continue
+        try:
+            async with aiofiles.open(os.path.join(base_path, relative_name), "r", encoding="utf-8", errors="replace") as f:
+                content: str = await f.read(LENGTH_CONTEXT + 1)
+                preview: str = content[:LENGTH_CONTEXT] + "... (обрезано)" if len(content) > LENGTH_CONTEXT else content
+                combined_text += f"\n>>> FILE: {relative_name} <<<\n{preview}\n"
+                total += len(preview)
+        except Exception as e:
+            combined_text += f"\n>>> FILE: {relative_name} <<<\nОШИБКА ЧТЕНИЯ: {e}\n"
 
-        if stderr and b"Permission denied" in stderr:
-            print(f"{C_YELLOW}[WARN]{C_RESET} Нет доступа к некоторым файлам.")
+    if skipped:
+        combined_text += f"\n--- НЕ ВОШЛО В ЛИМИТ {max_bytes} СИМВОЛОВ ({len(skipped)} файлов, используй read_file) ---\n"
+        combined_text += "\n".join(skipped) + "\n"
+    return combined_text
 
-        file_paths: list[str] = [f.strip() for f in stdout.decode().splitlines()]
 
-        if not file_paths:
-            return "Файлов не найдено."
+async def scan_directory_tool(mode: str = "outline", query: Optional[str] = None, quiet: bool = False) -> str:
+    """
+    Сканирует исходные файлы проекта: карта символов (outline) или содержимое (full).
+    С запросом файлы ранжируются по релевантности и отбираются в пределах SCAN_TOKEN_BUDGET.
+    """
+    if not bd.ACTIVE_PROJECT:
+        return "Нет проекта."
 
-        print(f"{C_GRAY}[SCAN]{C_RESET} Найдено {len(file_paths)} файлов.")
+    if not bd.ACTIVE_PROJECT.get("path"):
+        return "Путь к проекту не указан в базе данных."
 
-        combined_text = "--- СОДЕРЖИМОЕ ПРОЕКТА ---\n"
+    base_path = os.path.abspath(bd.ACTIVE_PROJECT["path"])
+    if not quiet:
+        print(f"{C_GRAY}[SCAN]{C_RESET} Сканирую {base_path} ({mode})...")
 
-        for f_path in file_paths:
-            relative_name = ""
-            try:
-                relative_name: str = os.path.relpath(f_path, base_path)
-                async with aiofiles.open(f_path, "r", encoding="utf-8", errors="replace") as f:
-                    content: str = await f.read()
-                    preview: str = content[:LENGTH_CONTEXT] + "... (обрезано)" if len(content) > LENGTH_CONTEXT else content
-                    combined_text += f"\n>>> FILE: {relative_name} <<<\n{preview}\n"
-            except Exception as e:
-                combined_text += f"\n>>> FILE: {relative_name} <<<\nОШИБКА ЧТЕНИЯ: {e}\n"
+    try:
+        profile: dict = scanner.load_profile(bd.ACTIVE_PROJECT.get("scan_profile"))
+        entries: list[dict] = await asyncio.wait_for(asyncio.to_thread(scanner.list_files, base_path, profile), timeout=30.0)
+
+        if not entries:
+            return "Файлов не найдено."
 
-        return combined_text
+        if not quiet:
+            print(f"{C_GRAY}[SCAN]{C_RESET} Найдено {len(entries)} файлов ({entries[0]['source']}).")
+
+        limit: int = profile["max_bytes"]
+        if query and query.strip():
+            entries = await asyncio.wait_for(asyncio.to_thread(ranking.rank_files, base_path, entries, query), timeout=30.0)
+            # ~4 символа на токен
+            limit = min(limit, SCAN_TOKEN_BUDGET * 4)
+            top: str = ", ".join(f"{e['path']} ({e['score']})" for e in entries[:3])
+            if not quiet:
+                print(f"{C_GRAY}[SCAN]{C_RESET} Ранжирование по запросу: {top}")
+
+        if mode == "full":
+            return await _dump_project(base_path, entries, limit)
+        return await asyncio.wait_for(asyncio.to_thread(_outline_project, base_path, entries, limit), timeout=60.0)
     except asyncio.TimeoutError:
         return f"{C_RED}Ошибка сканирования: таймаут{C_RESET}"
     except Exception as e:
         return f"Ошибка сканирования: {e}"
 
 
-async def get_dialog_status() -> str:
-    """Показывает статус глобального диалога"""
-    if not bd.r:
-        return "Redis не доступен."
-
+def _preview(raw: list[str], start: int) -> str:
+    lines: str = ""
+    for i, msg in enumerate(raw, start):
+        try:
+            data = json.loads(msg)
+            role = data.get("role", "unknown")
+            content = data.get("content", "")[:50] + "..." if len(data.get("content", "")) > 50 else data.get("content", "")
+            lines += f"  {i}. [{role}] {content}\n"
+        except:
+            lines += f"  {i}. [ошибка чтения]\n"
+    return lines
+
+
+async def get_dialog_status(name: Optional[str] = None) -> str:
+    """Показывает статус сессии диалога (по умолчанию текущей) и список всех сессий"""
+    name = name or dialogs.CURRENT
     try:
-        length: int = await cast(t.Awaitable[int], bd.r.llen(REDIS_DIALOG_KEY))
-        memory_usage = await bd.r.memory_usage(REDIS_DIALOG_KEY) or 0
+        all_sessions: list[dict] = await dialogs.sessions()
+        session: dict = next((s for s in all_sessions if s["name"] == name), {"messages": 0, "memory": 0, "ttl": -2})
+        length: int = session["messages"]
 
         preview = ""
         if length > 0:
-            first_msgs: list[str] = await cast(t.Awaitable[List[str]], bd.r.lrange(REDIS_DIALOG_KEY, 0, 2))
-            last_msgs: list[str] = await cast(t.Awaitable[List[str]], bd.r.lrange(REDIS_DIALOG_KEY, -3, -1))
-
-            preview += f"\n{C_GRAY}Первые сообщения:{C_RESET}\n"
-            for i, msg in enumerate(first_msgs, 1):
-                try:
-                    data = json.loads(msg)
-                    role = data.get("role", "unknown")
-                    content = data.get("content", "")[:50] + "..." if len(data.get("content", "")) > 50 else data.get("content", "")
-                    preview += f"  {i}. [{role}] {content}\n"
-                except:
-                    preview += f"  {i}. [ошибка чтения]\n"
+            # Список ограничен MAX_DIALOG_HISTORY * 2 — читаем целиком одним обращением
+            raw: list[str] = await STORE.read(dialogs.key(name))
+            first_msgs, last_msgs = raw[:3], raw[-3:]
 
+            preview += f"\n{C_GRAY}Первые сообщения:{C_RESET}\n" + _preview(first_msgs, 1)
             if length > 6:
                 preview += f"  ... ({length - 6} сообщений скрыто) ...\n"
-
-            preview += f"\n{C_GRAY}Последние сообщения:{C_RESET}\n"
-            for i, msg in enumerate(last_msgs, max(1, length - 2)):
-                try:
-                    data = json.loads(msg)
-                    role = data.get("role", "unknown")
-                    content = data.get("content", "")[:50] + "..." if len(data.get("content", "")) > 50 else data.get("content", "")
-                    preview += f"  {i}. [{role}] {content}\n"
-                except:
-                    preview += f"  {i}. [ошибка чтения]\n"
-
-        return (f"{C_CYAN}=== Статус диалога ==={C_RESET}\n"
+            if length > 3:
+                preview += f"\n{C_GRAY}Последние сообщения:{C_RESET}\n" + _preview(last_msgs[-(length - 3):], max(4, length - 2))
+
+        listing = ""
+        if all_sessions:
+            listing = f"\n{C_GRAY}Сессии:{C_RESET}\n"
+            for s in all_sessions:
+                mark: str = "➜" if s["name"] == dialogs.CURRENT else " "
+                idle: str = datetime.fromtimestamp(s["last_active"]).strftime("%Y-%m-%d %H:%M")
+                listing += f" {mark} {s['name']:<20} {s['messages']:>4} сообщ.  активность {idle}  истекает через {s['ttl'] // 3600} ч\n"
+
+        return (f"{C_CYAN}=== Статус диалога: {name} ==={C_RESET}\n"
                 f"Количество сообщений: {C_GREEN}{length}{C_RESET}\n"
-                f"Использование памяти: {C_GREEN}{memory_usage / 1024:.2f} KB{C_RESET}\n"
-                f"Лимит истории: {MAX_DIALOG_HISTORY}\n"
-                f"{preview}")
+                f"Использование памяти: {C_GREEN}{session['memory'] / 1024:.2f} KB{C_RESET} ({STORE.report()})\n"
+                f"Лимит истории: {MAX_DIALOG_HISTORY} (хранится до {MAX_DIALOG_HISTORY * 2}), простой до истечения: {DIALOG_SESSION_TTL // 3600} ч\n"
+                f"{preview}{listing}")
     except Exception as e:
         return f"{C_RED}Ошибка получения статуса: {e}{C_RESET}"
 
 
-async def clean_dialog_history() -> str:
-    """Очищает всю историю глобального диалога"""
-    if not bd.r:
-        return f"{C_RED}Redis не доступен.{C_RESET}"
-
+async def clean_dialog_history(name: Optional[str] = None, all_sessions: bool = False) -> str:
+    """Очищает историю сессии диалога (по умолчанию текущей) или всех сессий"""
     try:
-        await bd.r.delete(REDIS_DIALOG_KEY)
-        return f"{C_GREEN}✅{C_RESET} История диалога полностью очищена."
+        if all_sessions:
+            deleted: int = await dialogs.clean(None)
+            return f"{C_GREEN}✅{C_RESET} Удалено сессий диалога: {deleted}."
+        name = name or dialogs.CURRENT
+        await dialogs.clean(name)
+        return f"{C_GREEN}✅{C_RESET} История диалога «{name}» полностью очищена."
     except Exception as e:
         return f"{C_RED}Ошибка очистки: {e}{C_RESET}"
 
 
-async def dialog_web_loop(user_input: str) -> None:
-    """Глобальный диалог с веб-поиском и поддержкой множественных tool_calls"""
+async def dialog_web_loop(user_input: str, session: Optional[str] = None) -> None:
+    """Диалог с веб-поиском (сессия по умолчанию — текущая) и поддержкой множественных tool_calls"""
     global r, client
 
-    if not bd.r or not bd.client:
+    if not (bd.client or ANTHROPIC_FAILOVER):
         print(f"{C_RED}[ERROR]{C_RESET} Система не инициализирована.")
         return
 
     tools: list[dict] = tools_definition_dialog_web
     messages: list[dict] = [{"role": "system", "content": SYSTEM_PROMPT_DIALOG_WEB}]
 
-    # Загружаем историю из Redis
-    previous_msgs: list[str] = await cast(t.Awaitable[List[str]], bd.r.lrange(REDIS_DIALOG_KEY, -MAX_DIALOG_HISTORY, -1))
-    if previous_msgs:
-        try:
-            history: list = [json.loads(s=m) for m in previous_msgs]
-            messages.extend(history)
-            print(f"{C_GRAY}[CONTEXT]{C_RESET} Загружено {len(history)} сообщений из истории диалогов.")
-        except json.JSONDecodeError:
-            pass
+    session = session or dialogs.CURRENT
+
+    # Загружаем историю сессии из Redis
+    history: list[dict] = await dialogs.history(session)
+    if history:
+        messages.extend(history)
+        print(f"{C_GRAY}[CONTEXT]{C_RESET} Загружено {len(history)} сообщений из истории диалога «{session}».")
 
     # Добавляем сообщение пользователя
-    await cast(t.Awaitable[int], bd.r.rpush(REDIS_DIALOG_KEY, json.dumps({"role": "user", "content": user_input})))
+    await dialogs.append(session, {"role": "user", "content": user_input})
     messages.append({"role": "user", "content": user_input})
 
     # ОСНОВНОЙ ЦИКЛ - поддержка множественных tool_calls
     max_iterations: int = DIALOG_MAX_ITERATIONS
+    guard = LoopGuard(max_iterations=max_iterations, label="DIALOG")
+    backend = ant.Failover(ModelRouter("dialog_web"))
     for iteration in range(max_iterations):
         print(f"{C_GRAY}[DIALOG]{C_RESET} Итерация {iteration + 1}/{max_iterations}...")
 
         try:
-            response: ChatResponse = await bd.client.chat(
-                model=OLLAMA_MODEL,
-                messages=messages,
-                tools=tools,
-                options=OLLAMA_OPTIONS
-            )
+            msg = await backend.chat(messages, tools)
         except Exception as e:
             print(f"{C_RED}[ERROR]{C_RESET} Ошибка Ollama: {e}")
             return
 
-        msg = response["message"]
 
         # Если модель хочет использовать инструменты
         if msg.get("tool_calls"):
@@ -331,10 +453,10 @@ async def dialog_web_loop(user_input: str) -> None:
                 msg_dict: dict = dict(msg)
 
             # Сохраняем сообщение с tool_calls
-            await cast(t.Awaitable[int], bd.r.rpush(REDIS_DIALOG_KEY, json.dumps(obj=msg_dict)))
             messages.append(msg_dict)
 
             # Обрабатываем каждый вызов инструмента
+            calls_done: list[tuple[str, dict, str]] = []
             for tool in msg.get("tool_calls"):
                 fn = tool.get("function", {})
                 name = fn.get("name")
@@ -358,8 +480,27 @@ async def dialog_web_loop(user_input: str) -> None:
                     "tool_call_id": tool_id,
                     "name": name,
                 }
-                await cast(t.Awaitable[int], bd.r.rpush(REDIS_DIALOG_KEY, json.dumps(tool_result)))
                 messages.append(tool_result)
+                calls_done.append((name, args, res))
+
+            # Вызовы и их результаты — одной записью
+            await dialogs.append(session, msg_dict, *messages[-len(calls_done):])
+
+            # Проверяем, не зациклилась ли модель на одних и тех же запросах
+            match guard.observe(calls_done):
+                case "warn":
+                    print(f"{C_YELLOW}[LOOP]{C_RESET} Повтор поиска без прогресса — подсказка модели.")
+                    messages.append(guard.note())
+                case "escalate":
+                    print(f"{C_YELLOW}[LOOP]{C_RESET} Повтор поиска без прогресса — эскалация на {LOOP_ESCALATION_MODEL}.")
+                    backend.router.escalate(LOOP_ESCALATION_MODEL)
+                    messages.append(guard.note())
+                case "stop":
+                    guard.stop(iteration)
+                    text = guard.final_message()
+                    print(f"{C_GREEN}🤖 [DIALOG]:{C_RESET} {text}")
+                    await dialogs.append(session, {"role": "assistant", "content": text})
+                    break
 
             # Продолжаем цикл - даём модели возможность обработать результаты
             continue
@@ -368,7 +509,7 @@ async def dialog_web_loop(user_input: str) -> None:
         text = msg.get("content", "")
         if text:
             print(f"{C_GREEN}🤖 [DIALOG]:{C_RESET} {text}")
-            await cast(t.Awaitable[int], bd.r.rpush(REDIS_DIALOG_KEY, json.dumps(obj={"role": "assistant", "content": text})))
+            await dialogs.append(session, {"role": "assistant", "content": text})
             break
         else:
             # Нет ни tool_calls, ни content
@@ -376,21 +517,15 @@ async def dialog_web_loop(user_input: str) -> None:
             if iteration == max_iterations - 1:
                 fallback_text = "Извините, не удалось сформировать ответ. Попробуйте переформулировать вопрос."
                 print(f"{C_GREEN}🤖 [DIALOG]:{C_RESET} {fallback_text}")
-                await cast(t.Awaitable[int], bd.r.rpush(REDIS_DIALOG_KEY, json.dumps({"role": "assistant", "content": fallback_text})))
+                await dialogs.append(session, {"role": "assistant", "content": fallback_text})
             break
 
-    # Обрезаем историю если она слишком длинная
-    current_len = await cast(t.Awaitable[int], bd.r.llen(REDIS_DIALOG_KEY))
-    if current_len > MAX_DIALOG_HISTORY * 2:
-        await bd.r.ltrim(REDIS_DIALOG_KEY, -MAX_DIALOG_HISTORY, -1)
-        print(f"{C_GRAY}[REDIS]{C_RESET} История обрезана до {MAX_DIALOG_HISTORY} сообщений.")
-
 async def search_docs_tool(query: str) -> str:
     """Поиск в каталоге документации"""
-    if not ACTIVE_PROJECT or not ACTIVE_PROJECT.get("doc_path"):
+    if not bd.ACTIVE_PROJECT or not bd.ACTIVE_PROJECT.get("doc_path"):
         return "Нет документации."
 
-    doc_path = ACTIVE_PROJECT["doc_path"]
+    doc_path = bd.ACTIVE_PROJECT["doc_path"]
     if not os.path.exists(doc_path):
         return f"Каталог документации не найден: {doc_path}"
 
@@ -410,13 +545,14 @@ async def search_docs_tool(query: str) -> str:
         return "Ошибка поиска."
 
 
-async def search_code_tool(query: str) -> str:
+async def search_code_tool(query: str, quiet: bool = False) -> str:
     """Поиск в коде проекта"""
-    if not ACTIVE_PROJECT:
+    if not bd.ACTIVE_PROJECT:
         return "Нет проекта."
 
-    path = ACTIVE_PROJECT["path"]
-    print(f"{C_GRAY}[SEARCH]{C_RESET} Поиск кода: {query}")
+    path = bd.ACTIVE_PROJECT["path"]
+    if not quiet:
+        print(f"{C_GRAY}[SEARCH]{C_RESET} Поиск кода: {query}")
     try:
         proc = await asyncio.create_subprocess_shell(
             cmd=f"rga -i -n --glob='!.git' {shlex.quote(s=query)} {shlex.quote(s=path)}",
@@ -432,6 +568,26 @@ async def search_code_tool(query: str) -> str:
         return "Ошибка поиска."
 
 
+def format_history(rows: list) -> str:
+    """Найденные сообщения архива: проект, время, роль, фрагмент с совпадениями"""
+    out: list[str] = []
+    for row in rows:
+        snippet: str = " ".join(row["snippet"].split())
+        out.append(f"[{row['project']} | {row['created_at']:%Y-%m-%d %H:%M} | {row['role']} | #{row['id']}] {snippet}")
+    return "\n".join(out)
+
+
+async def search_history_tool(query: str, all_projects: bool = False, days: Optional[int] = None) -> str:
+    """Поиск по архиву прошлых диалогов"""
+    project_id: Optional[int] = None if all_projects or not bd.ACTIVE_PROJECT else bd.ACTIVE_PROJECT["id"]
+    since: Optional[datetime] = datetime.now() - timedelta(days=days) if days else None
+    try:
+        rows: list = await bd.search_history(query, project_id=project_id, since=since)
+    except Exception as e:
+        return f"Ошибка поиска по истории: {e}"
+    return format_history(rows) if rows else "В истории ничего не найдено."
+
+
 async def write_file_tool(path: str, content: str) -> str:
     """Запись файла с подтверждением и diff"""
     try:
@@ -464,7 +620,7 @@ async def write_file_tool(path: str, content: str) -> str:
                         print(diff_text[:500] + ("..." if len(diff_text) > 500 else ""))
                         print(f"{C_GRAY}--- END ---{C_RESET}")
 
-                    confirm: str = await asyncio.to_thread(input, f"{C_YELLOW}❓ Перезаписать '{path}'? [y/N]: {C_RESET}")
+                    confirm: str = await console.ainput(f"{C_YELLOW}❓ Перезаписать '{path}'? [y/N]: {C_RESET}")
                     if confirm.lower() != "y":
                         return "Запись отменена."
             except Exception as e:
@@ -473,6 +629,7 @@ async def write_file_tool(path: str, content: str) -> str:
         os.makedirs(name=os.path.dirname(full_path), exist_ok=True)
         async with aiofiles.open(full_path, "w", encoding="utf-8") as f:
             await f.write(content)
+        ranking.note_write(full_path)
         status_msg = "Обновлен" if file_exist else "Создан"
         print(f"{C_GREEN}✅ Файл {status_msg}: {path}{C_RESET}")
         return f"{C_GREEN}✅{C_RESET} Файл записан: {path}"
@@ -485,186 +642,83 @@ async def write_file_tool(path: str, content: str) -> str:
         return f"{C_RED}[ERROR]:Критическая ошибка записи: {e}{C_RED}"
 
 
-async def read_file_tool(path: str) -> str:
-    """Чтение файла"""
+async def read_file_tool(path: str, start_line: Optional[int] = None, end_line: Optional[int] = None) -> str:
+    """Чтение файла (целиком или диапазон строк с номерами)"""
     try:
         full_path: str = get_full_path(rel_path=path)
         async with aiofiles.open(full_path, "r", encoding="utf-8", errors="replace") as f:
-            return await f.read()
+            content: str = await f.read()
     except FileNotFoundError:
         return f"Файл не найден: {path}"
     except Exception as e:
         return f"Ошибка чтения: {e}"
 
+    if start_line is None and end_line is None:
+        return content
+
+    lines: list[str] = content.splitlines()
+    first: int = max(1, start_line or 1)
+    last: int = min(len(lines), end_line or len(lines))
+    if first > last:
+        return f"Ошибка: диапазон {first}-{last} вне файла ({len(lines)} строк)"
+    width: int = len(str(last))
+    body: str = "\n".join(f"{n:>{width}}: {lines[n - 1]}" for n in range(first, last + 1))
+    return f"{path} [строки {first}-{last} из {len(lines)}]\n{body}"
+
 
-async def run_shell_tool(cmd: str) -> str:
-    """Выполнение shell-команды в директории проекта"""
-    if not ACTIVE_PROJECT:
+async def run_shell_tool(cmd: str, timeout: Optional[int] = None) -> str:
+    """Выполнение shell-команды в директории проекта с потоковым выводом"""
+    if not bd.ACTIVE_PROJECT:
         return "Нет проекта."
 
-    project_path = ACTIVE_PROJECT["path"]
-    print(f"{C_GRAY}[SHELL]{C_RESET} Команда: {cmd}")
+    project_path = bd.ACTIVE_PROJECT["path"]
+    limit: int = min(max(int(timeout or SHELL_TIMEOUT), 1), SHELL_MAX_TIMEOUT)
+    print(f"{C_GRAY}[SHELL]{C_RESET} Команда: {cmd} (таймаут {limit}с)")
     try:
-        proc = await asyncio.create_subprocess_shell(
-            cmd,
-            cwd=project_path,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-        )
-        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=60.0)
+        result = await shell.run_command(cmd, cwd=project_path, timeout=limit)
+        if result.timed_out:
+            print(f"{C_YELLOW}[SHELL]{C_RESET} Таймаут {limit}с — процесс остановлен.")
+        return result.format(timeout=limit)
+    except Exception as e:
+        return f"{C_RED}Ошибка: {e}{C_RESET}"
 
-        out = []
-        if stdout:
-            out.append(f"STDOUT:\n{stdout.decode()}")
-        if stderr:
-            out.append(f"STDERR:\n{stderr.decode()}")
 
-        result = "\n".join(out)
-        return result[:4000] if result else "Команда выполнена."
-    except asyncio.TimeoutError:
-        return f"{C_RED}Таймаут команды{C_RESET}"
+async def run_checks_tool(force: bool = False) -> str:
+    """Инкрементальные сборка/тесты проекта с кэшированием результатов"""
+    if not bd.ACTIVE_PROJECT:
+        return "Нет проекта."
+
+    try:
+        report: dict = await checks.run_checks(bd.ACTIVE_PROJECT["path"], force=force)
     except Exception as e:
-        return f"{C_RED}Ошибка: {e}{C_RESET}"
+        return f"{C_RED}Ошибка проверок: {e}{C_RESET}"
+
+    status: str = f"{C_GREEN}OK{C_RESET}" if report.get("ok") else f"{C_RED}FAIL{C_RESET}"
+    print(f"{C_GRAY}[CHECKS]{C_RESET} {status}: запущено {len(report.get('ran', []))}, из кэша {report.get('cached_pass', 0)}")
+    return json.dumps(report, ensure_ascii=False)
 
 
 async def web_search_tool(query: str) -> str:
-    """Веб-поиск через DuckDuckGo с фильтрацией китайских и мусорных сайтов"""
+    """Веб-поиск (зеркало документации, DuckDuckGo, SearxNG) с фильтрацией китайских и мусорных сайтов"""
+    # Тяжёлые зависимости загружаются при первом поиске, а не при старте CLI
+    import aiohttp
+    from bs4 import BeautifulSoup
+
     print(f"{C_GRAY}[WEB]{C_RESET} Поиск: {query} (макс. {WEB_SEARCH_MAX_RESULTS} сайтов)")
 
-    loop = asyncio.get_running_loop()
     all_texts = []
 
-    # Определяем специальные случаи для прямого запроса
-    rust_query: bool = 'rust' in query.lower() and ('версия' in query.lower() or 'version' in query.lower())
-    python_query: bool = 'python' in query.lower() and ('версия' in query.lower() or 'version' in query.lower())
-
-    # Для запросов о версиях языков программирования - сразу идем к официальным источникам
-    if rust_query:
-        print(f"{C_CYAN}[DIRECT]{C_RESET} Запрос к официальному источнику Rust...")
-        try:
-            async with aiohttp.ClientSession() as session:
-                # Получаем главную страницу rust-lang.org
-                try:
-                    async with session.get('https://www.rust-lang.org/', timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                        html: str = await resp.text()
-                        soup = BeautifulSoup(html, "html.parser")
-
-                        # Ищем информацию о версии на главной странице
-                        text = soup.get_text(separator="\n", strip=True)
-                        lines = [line.strip() for line in text.splitlines() if line.strip() and len(line.strip()) > 10]
-                        text = "\n".join(lines[:100])  # Увеличено с 50 до 100 строк
-
-                        if text:
-                            all_texts.append(f"=== Источник 1: Rust Official Website (rust-lang.org) ===\n{text[:3500]}")  # Увеличено с 2000 до 3500
-                            print(f"{C_GREEN}✓{C_RESET} Получено с rust-lang.org: {len(text[:3500])} символов")
-                except Exception as e:
-                    print(f"{C_YELLOW}⚠{C_RESET} Ошибка rust-lang.org: {e}")
-
-                # Пробуем получить информацию о релизах из блога
-                try:
-                    async with session.get('https://blog.rust-lang.org/', timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                        html: str = await resp.text()
-                        soup = BeautifulSoup(html, "html.parser")
-
-                        # Ищем последние посты о релизах
-                        posts_found = 0
-                        for article in soup.find_all(['article', 'div'], limit=10):
-                            title_elem = article.find(['h1', 'h2', 'h3', 'a'])
-                            if not title_elem:
-                                continue
-
-                            title = title_elem.get_text(strip=True)
-
-                            if any(keyword in title.lower() for keyword in ['announcing', 'release', '1.', 'rust']):
-                                content = article.get_text(separator="\n", strip=True)
-                                lines = [line.strip() for line in content.splitlines() if line.strip() and len(line.strip()) > 10]
-                                content = "\n".join(lines[:80])  # Увеличено с 40 до 80 строк
-
-                                if len(content) > 100:
-                                    all_texts.append(f"=== Источник {len(all_texts)+1}: Rust Blog - {title[:80]} ===\n{content[:3000]}")  # Увеличено с 1800 до 3000
-                                    print(f"{C_GREEN}✓{C_RESET} Получено с blog.rust-lang.org: {title[:60]}... ({len(content[:3000])} символов)")
-                                    posts_found += 1
-
-                                    if posts_found >= 2:  # Берем максимум 2 поста о релизах
-                                        break
-                except Exception as e:
-                    print(f"{C_YELLOW}⚠{C_RESET} Ошибка blog.rust-lang.org: {e}")
-
-                # Пробуем получить changelog или release notes
-                try:
-                    async with session.get('https://github.com/rust-lang/rust/releases', timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                        html: str = await resp.text()
-                        soup = BeautifulSoup(html, "html.parser")
-
-                        # Ищем первый релиз
-                        release = soup.find('div', class_='release-entry') or soup.find('section')
-                        if release:
-                            content = release.get_text(separator="\n", strip=True)
-                            lines = [line.strip() for line in content.splitlines() if line.strip() and len(line.strip()) > 10]
-                            content = "\n".join(lines[:60])  # Увеличено с 30 до 60 строк
-
-                            if len(content) > 100:
-                                all_texts.append(f"=== Источник {len(all_texts)+1}: GitHub Rust Releases ===\n{content[:2500]}")  # Увеличено с 1500 до 2500
-                                print(f"{C_GREEN}✓{C_RESET} Получено с GitHub releases: {len(content[:2500])} символов")
-                except Exception as e:
-                    print(f"{C_YELLOW}⚠{C_RESET} Ошибка GitHub releases: {e}")
-
-                if all_texts:
-                    combined = "\n\n".join(all_texts)
-                    if len(combined) > WEB_SEARCH_MAX_LENGTH:
-                        combined: str = combined[:WEB_SEARCH_MAX_LENGTH] + f"\n\n... [Обрезано до {WEB_SEARCH_MAX_LENGTH} символов]"
-                    print(f"{C_GRAY}[WEB]{C_RESET} Возвращаю {len(combined)} символов данных из {len(all_texts)} источников")
-                    return combined
-                else:
-                    print(f"{C_YELLOW}[WARN]{C_RESET} Прямой запрос не дал результатов, переключаюсь на поиск...")
-
-        except Exception as e:
-            print(f"{C_YELLOW}[WARN]{C_RESET} Прямой запрос не удался: {e}, переключаюсь на поиск...")
-
-    elif python_query:
-        print(f"{C_CYAN}[DIRECT]{C_RESET} Запрос к официальному источнику Python...")
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get('https://www.python.org/', timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                    html: str = await resp.text()
-                    soup = BeautifulSoup(html, "html.parser")
-                    text = soup.get_text(separator="\n", strip=True)
-                    lines = [line.strip() for line in text.splitlines() if line.strip() and len(line.strip()) > 10]
-                    text = "\n".join(lines[:LIMIT_PARSING])
-
-                    if text:
-                        all_texts.append(f"=== Источник 1: Python Official Website (python.org) ===\n{text[:2000]}")
-                        print(f"{C_GREEN}✓{C_RESET} Получено с python.org: {len(text)} символов")
-                        combined = "\n\n".join(all_texts)
-                        return combined[:WEB_SEARCH_MAX_LENGTH]
-        except Exception as e:
-            print(f"{C_YELLOW}[WARN]{C_RESET} Прямой запрос не удался: {e}, переключаюсь на поиск...")
-
-    # Черный список доменов (развлекательные + КИТАЙСКИЕ + ФОРУМЫ)
-    blocked_domains: set[str] = {
-        # Развлекательные
-        'rutube.ru', 'youtube.com', 'youtu.be', 'kinopoisk.ru',
-        'vk.com', 'ok.ru', 'tiktok.com', 'instagram.com', 'facebook.com',
-        'genius.com', 'wikislovary.ru', 'wiktionary.org', 'urban dictionary',
-        'pinterest.com', 'twitter.com', 'x.com',
-        # КИТАЙСКИЕ ДОМЕНЫ
-        'zhihu.com', 'baidu.com', 'weibo.com', 'qq.com', 'taobao.com',
-        'tmall.com', 'jd.com', 'sina.com.cn', 'sohu.com', '163.com',
-        'douban.com', 'bilibili.com', 'csdn.net', 'cnblogs.com',
-        'jianshu.com', 'oschina.net', 'iteye.com', 'segmentfault.com',
-        'juejin.cn', 'toutiao.com', 'aliyun.com', 'huawei.com',
-        'xiaomi.com', 'oppo.com', 'vivo.com',
-        # ФОРУМЫ И НЕОФИЦИАЛЬНЫЕ ИСТОЧНИКИ
-        'alkad.org'
-    }
-
-    # Паттерны мусорных сайтов
-    blocked_patterns: list[str] = [
-        'как пишется', 'песня', 'текст песни', 'lyrics', 'фильм',
-        'смотреть онлайн', 'трейлер', 'wiki/последняя', 'wiki/последний',
-        'значение слова', 'перевод', 'словарь', 'что значит',
-        'форум', 'обсуждение'
-    ]
+    # Вопросы о версиях пакетов и языков — сначала JSON-API реестров (параллельно, с кэшем)
+    answers = await adapters.lookup(query)
+    if answers:
+        print(f"{C_CYAN}[DIRECT]{C_RESET} Ответили реестры: {', '.join(label for label, _text, _explicit in answers)}")
+        for label, text, _explicit in answers:
+            all_texts.append(f"=== Источник {len(all_texts) + 1}: {label} ===\n{text}")
+        # Веб-поиск пропускаем, только если пакет назван однозначно; иначе справка реестров идёт перед страницами
+        if any(explicit for _label, _text, explicit in answers):
+            combined = "\n\n".join(all_texts)
+            print(f"{C_GRAY}[WEB]{C_RESET} Возвращаю {len(combined)} символов данных из {len(all_texts)} источников")
+            return combined[:WEB_SEARCH_MAX_LENGTH]
 
     try:
         query_lower: str = query.lower()
@@ -686,138 +740,54 @@ async def web_search_tool(query: str) -> str:
                         enhanced_query: str = enhanced_query.replace(rus,eng)
         print(f"{C_GRAY}[WEB]{C_RESET} Запрос к поиску: {enhanced_query}")
 
-        # Получаем результаты
-        search_region = 'wt-wt'  # без региональных фильтров
+        # Правила фильтра (web_filters.json) нужны уже при поиске: по ним решается, хватит ли ссылок
+        web_filter = get_filter()
 
-        print(f"{C_GRAY}[WEB]{C_RESET} DuckDuckGo поиск (регион: {search_region})...")
+        def priority_hit(r: dict) -> bool:
+            reason, priority, _domain = web_filter.classify(r.get("href", ""), r.get("title", ""), r.get("body", ""))
+            return reason is None and priority >= SEARCH_EARLY_PRIORITY
 
-        results = await loop.run_in_executor(
-            executor=None,
-            func=lambda: list(DDGS().text(enhanced_query, max_results=30, region=search_region))
-        )
+        # Зеркало документации, затем сетевые бэкенды параллельно (DuckDuckGo, SearxNG)
+        results, backend_report = await search_backends.search(enhanced_query, limit=30, good=priority_hit)
+        print(f"{C_GRAY}[WEB]{C_RESET} Бэкенды: {', '.join(f'{name}={info}' for name, info in backend_report.items())}")
 
         print(f"{C_GRAY}[WEB]{C_RESET} Найдено результатов: {len(results)}")
 
         if not results:
+            if all_texts:
+                return "\n\n".join(all_texts)[:WEB_SEARCH_MAX_LENGTH]
             return "Ничего не найдено в поисковой системе. Попробуйте переформулировать запрос."
 
         print(f"{C_GRAY}[WEB]{C_RESET} Начинаю фильтрацию результатов...")
 
         # Фильтрация с приоритизацией
-        all_valid_results = []
-        blocked_count: dict[str, int] = {'chinese_domain': 0, 'chinese_title': 0, 'patterns': 0, 'invalid_url': 0, 'forums': 0}
-
-        # Официальные домены для приоритета (с весами)
-        priority_domains: dict[str, int] = {
-            'rust-lang.org': 100,
-            'doc.rust-lang.org': 100,
-            'blog.rust-lang.org': 90,
-            'github.com/rust-lang': 85,
-            'python.org': 100,
-            'docs.python.org': 100,
-            'nodejs.org': 100,
-            'developer.mozilla.org': 95,
-            'golang.org': 100,
-            'go.dev': 100,
-            'docs.oracle.com': 90,
-            'openjdk.org': 90,
-            'wikipedia.org': 90,
-            'en.wikipedia.org': 70,
-            'reddit.com': 95,
-            'habr.com': 80,
-            'stackoverflow.com': 95
-        }
-
-        for r in results:
-            title = r.get("title", "")
-            href = r.get("href", "")
-            body = r.get("body", "")
-
-            # Проверяем URL
-            if not href.startswith(('http://', 'https://')):
-                blocked_count['invalid_url'] += 1
-                continue
-
-            # Проверяем домен
-            parsed = urlparse(href)
-            domain = parsed.netloc.lower()
-
-            if domain.startswith('www.'):
-                domain = domain[4:]
-
-            if not domain or '.' not in domain:
-                blocked_count['invalid_url'] += 1
-                continue
-
-            # БЛОКИРУЕМ форумы
-            if 'forum' in domain or 'форум' in title.lower():
-                blocked_count['forums'] += 1
-                continue
-
-            # БЛОКИРУЕМ домены с китайскими расширениями
-            if domain.endswith(('.cn', '.com.cn')):
-                blocked_count['chinese_domain'] += 1
-                continue
-
-            # БЛОКИРУЕМ известные китайские/мусорные домены
-            if any(blocked in domain for blocked in blocked_domains):
-                blocked_count['chinese_domain'] += 1
-                continue
-
-            # БЛОКИРУЕМ если в домене есть китайские символы
-            if any('\u4e00' <= char <= '\u9fff' for char in domain):
-                blocked_count['chinese_domain'] += 1
-                continue
-
-            # Проверяем заголовок на китайские символы
-            chinese_in_title: int = sum(1 for char in title if '\u4e00' <= char <= '\u9fff')
-            if chinese_in_title > 0:
-                blocked_count['chinese_title'] += 1
-                continue
-
-            # Проверяем паттерны в заголовке и описании
-            title_lower = title.lower()
-            body_lower = body.lower()
-
-            if any(pattern in title_lower or pattern in body_lower for pattern in blocked_patterns):
-                blocked_count['patterns'] += 1
-                continue
-
-            # Определяем приоритет
-            priority_score = 0
-            for priority_domain, score in priority_domains.items():
-                if priority_domain in domain or priority_domain in href:
-                    priority_score: int = score
-                    break
-
-            # Добавляем результат с приоритетом
-            all_valid_results.append({
-                'result': r,
-                'priority': priority_score,
-                'domain': domain,
-                'title': title
-            })
+        selected, blocked_count = web_filter.select(results, len(results))
 
-        # Сортируем: сначала по приоритету (убывание), потом по порядку
-        all_valid_results.sort(key=lambda x: (-x['priority'], results.index(x['result'])))
+        # История доменов: исключённые после серии ошибок пропускаем, медленные и пустые — ниже
+        await HEALTH.load()
+        selected, skipped = HEALTH.rank(selected, WEB_SEARCH_MAX_RESULTS)
+        if skipped:
+            print(f"{C_GRAY}[WEB]{C_RESET} Временно исключены (ошибки): {', '.join(sorted(set(skipped)))}")
 
         # Берем топ результатов
-        final_results = [item['result'] for item in all_valid_results[:WEB_SEARCH_MAX_RESULTS]]
+        final_results = [item['result'] for item in selected]
 
         # Выводим информацию
-        print(f"{C_GRAY}[WEB]{C_RESET} Отфильтровано: домены={blocked_count['chinese_domain']}, заголовки={blocked_count['chinese_title']}, паттерны={blocked_count['patterns']}, форумы={blocked_count['forums']}, некорректные={blocked_count['invalid_url']}")
+        print(f"{C_GRAY}[WEB]{C_RESET} Отфильтровано: домены={blocked_count['domain']}, заголовки={blocked_count['script']}, паттерны={blocked_count['patterns']}, форумы={blocked_count['forums']}, некорректные={blocked_count['invalid_url']}")
 
-        priority_count = sum(1 for item in all_valid_results[:WEB_SEARCH_MAX_RESULTS] if item['priority'] > 0)
+        priority_count = sum(1 for item in selected if item['priority'] > 0)
         print(f"{C_GRAY}[WEB]{C_RESET} Выбрано результатов: {len(final_results)} (приоритетных: {priority_count})")
 
         # Показываем что выбрано
-        for i, item in enumerate(all_valid_results[:WEB_SEARCH_MAX_RESULTS], 1):
+        for i, item in enumerate(selected, 1):
             if item['priority'] > 0:
                 print(f"{C_GREEN}[★ {item['priority']}]{C_RESET} {item['title'][:60]}... ({item['domain']})")
             else:
                 print(f"{C_CYAN}[OK]{C_RESET} {item['title'][:60]}... ({item['domain']})")
 
         if not final_results:
+            if all_texts:
+                return "\n\n".join(all_texts)[:WEB_SEARCH_MAX_LENGTH]
             return f"Не удалось найти релевантные результаты. Всего найдено: {len(results)}, заблокировано: {sum(blocked_count.values())}"
 
         # Создаем connector с увеличенным таймаутом для подключения
@@ -833,32 +803,37 @@ async def web_search_tool(query: str) -> str:
             ttl_dns_cache=300
         )
 
+        # Загруженные страницы: фрагменты отбираются по запросу после обхода всех источников
+        pages: list[dict] = []
+        downloaded: int = 0
+
         async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
             for i, result in enumerate(final_results, 1):
                 url = result.get("href")
                 title = result.get("title", "Без названия")
 
+                domain: str = selected[i - 1]["domain"]
+                domain_timeout: float = HEALTH.timeout(domain)
                 print(f"{C_GRAY}[WEB]{C_RESET} [{i}/{len(final_results)}] {title[:50]}...")
 
+                # Страница из локального зеркала — текст уже есть
+                if result.get("local"):
+                    page = mirror.as_page({"url": url, "title": title, "body": result["local"]}, i)
+                    pages.append({**page, "priority": max(page["priority"], selected[i - 1]["priority"])})
+                    print(f"{C_GREEN}✓{C_RESET} из зеркала")
+                    continue
+
+                started: float = time.monotonic()
                 try:
-                    async with session.get(
-                        url,
-                        headers={
-                            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-                            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-                            'Accept-Language': 'en-US,en;q=0.9',
-                            'Accept-Encoding': 'gzip, deflate',
-                        },
-                        allow_redirects=True,
-                        max_redirects=2
-                    ) as resp:
-
-                        content_type: str = resp.headers.get('content-type', '').lower()
-                        if 'text/html' not in content_type:
-                            all_texts.append(f"=== Источник {i}: {title} ===\n[Не HTML: {content_type}]")
-                            continue
-
-                        html: str = await resp.text(errors='replace')
+                    html, note, size = await asyncio.wait_for(fetch.fetch_html(session, url), domain_timeout)
+                    elapsed: float = time.monotonic() - started
+                    downloaded += size
+                    if html is None:
+                        HEALTH.record(domain, elapsed, True)
+                        all_texts.append(f"=== Источник {i}: {title} ===\n[{note}]")
+                        continue
+                    if note:
+                        print(f"{C_GRAY}[WEB]{C_RESET} {note}")
 
                     # Парсинг
                     soup = BeautifulSoup(html, "html.parser")
@@ -874,42 +849,52 @@ async def web_search_tool(query: str) -> str:
                         soup.find('div', id=re.compile('content|main|article'))
                     )
 
-                    if main_content:
-                        text = main_content.get_text(separator="\n", strip=True)
-                    else:
-                        text = soup.get_text(separator="\n", strip=True)
-
-                    # ФИЛЬТРУЕМ китайские символы из текста
-                    lines = []
-                    for line in text.splitlines():
-                        line = line.strip()
-                        # Пропускаем строки с большим количеством китайских символов
-                        chinese_chars: int = sum(1 for char in line if '\u4e00' <= char <= '\u9fff')
-                        if chinese_chars > len(line) * 0.3:  # Если >30% китайских символов
-                            continue
-                        if line and len(line) > 20:
-                            lines.append(line)
-
-                    text = "\n".join(lines[:50])  # Увеличено с 25 до 50 строк
-
-                    if len(text) < 50:
+                    # Фрагменты страницы; строки с большим количеством китайских символов (>30%) пропускаем
+                    page_passages = passages.extract(
+                        main_content or soup, i, keep=lambda line: web_filter.script_ratio(line) <= 0.3
+                    )
+                    page_chars: int = sum(len(p["text"]) for p in page_passages)
+                    HEALTH.record(domain, elapsed, True, page_chars)
+
+                    if page_chars < 50:
                         all_texts.append(f"=== Источник {i}: {title} ===\n[Содержимое слишком короткое]")
                         continue
 
-                    all_texts.append(f"=== Источник {i}: {title} ({url}) ===\n{text[:2500]}")  # Увеличено с 1800 до 2500
-                    print(f"{C_GREEN}✓{C_RESET} {len(text)} символов")
+                    pages.append({"index": i, "title": title, "url": url, "passages": page_passages,
+                                  "priority": selected[i - 1]["priority"]})
+                    print(f"{C_GREEN}✓{C_RESET} {page_chars} символов, фрагментов: {len(page_passages)}")
 
                 except asyncio.TimeoutError:
-                    print(f"{C_YELLOW}⚠{C_RESET} Таймаут (пропускаем)")
+                    HEALTH.record(domain, domain_timeout, False)
+                    print(f"{C_YELLOW}⚠{C_RESET} Таймаут {domain_timeout:.0f}с (пропускаем)")
                     # НЕ добавляем в all_texts, просто пропускаем
                     continue
-                except aiohttp.ClientError as e:
+                except aiohttp.ClientError:
+                    HEALTH.record(domain, time.monotonic() - started, False)
                     print(f"{C_YELLOW}⚠{C_RESET} Ошибка соединения (пропускаем)")
                     continue
-                except Exception as e:
+                except Exception:
+                    # Битый HTML или кодировка: домен, который так отвечает всегда, тоже должен попасть под отсечку
+                    HEALTH.record(domain, time.monotonic() - started, False)
                     print(f"{C_YELLOW}⚠{C_RESET} Ошибка обработки (пропускаем)")
                     continue
 
+        await HEALTH.save()
+        print(f"{C_GRAY}[WEB]{C_RESET} Загружено: {downloaded // 1024} КБ")
+
+        # Зеркала и перепечатки: копия остаётся у приоритетного домена
+        pages, dropped_pages, dropped_chars = dedup.drop_duplicates(pages)
+        if dropped_chars:
+            print(f"{C_GRAY}[WEB]{C_RESET} Дубликаты: страниц {dropped_pages}, отброшено {dropped_chars} символов")
+
+        budget = WEB_SEARCH_MAX_LENGTH - sum(len(text) + 2 for text in all_texts)
+        packed: list[str] = passages.pack(pages, f"{query} {enhanced_query}", budget)
+        if pages:
+            chosen: int = sum(1 for page in pages for p in page["passages"] if p.get("packed"))
+            total: int = sum(len(page["passages"]) for page in pages)
+            print(f"{C_GRAY}[WEB]{C_RESET} Отобрано фрагментов по запросу: {chosen} из {total}")
+        all_texts.extend(packed)
+
         if not all_texts:
             return "Не удалось получить данные с сайтов (все источники недоступны или по таймауту)."
 
@@ -940,6 +925,7 @@ def print_help() -> None:
     print(f"  {C_YELLOW}/delete <name>{C_RESET}                 {C_GRAY}Удалить проект{C_RESET}")
     print(f"  {C_YELLOW}/doc <directory>{C_RESET}               {C_GRAY}Прикрепить каталог документации{C_RESET}")
     print(f"  {C_YELLOW}/doc_del{C_RESET}                       {C_GRAY}Удалить путь к документации{C_RESET}")
+    print(f"  {C_YELLOW}/scan_profile [k=v ...|reset]{C_RESET}  {C_GRAY}Профиль сканирования (include/exclude/max_bytes){C_RESET}")
     print(f"  {C_YELLOW}/analyze{C_RESET}                       {C_GRAY}Режим анализа{C_RESET}")
     print(f"  {C_YELLOW}/analyze_prompt <text>{C_RESET}         {C_GRAY}Сохранить промпт{C_RESET}")
     print(f"  {C_YELLOW}/architect <text>{C_RESET}              {C_GRAY}Сохранить архитектуру{C_RESET}")
@@ -947,11 +933,17 @@ def print_help() -> None:
     print(f"  {C_YELLOW}/review <file>{C_RESET}                 {C_GRAY}Ревью кода{C_RESET}")
     print(f"  {C_YELLOW}/explain <file>{C_RESET}                {C_GRAY}Объяснить код{C_RESET}")
     print(f"  {C_YELLOW}/dialog_web <question>{C_RESET}         {C_GRAY}Диалог с ИИ (с веб-поиском){C_RESET}")
-    print(f"  {C_YELLOW}/dialog_status{C_RESET}                 {C_GRAY}Показать статус диалога{C_RESET}")
-    print(f"  {C_YELLOW}/dialog_clean{C_RESET}                  {C_GRAY}Очистить историю диалога{C_RESET}")
+    print(f"  {C_YELLOW}/dialog_session [name]{C_RESET}         {C_GRAY}Текущая сессия диалога / переключиться{C_RESET}")
+    print(f"  {C_YELLOW}/dialog_status [name]{C_RESET}          {C_GRAY}Статус сессии и список сессий{C_RESET}")
+    print(f"  {C_YELLOW}/dialog_clean [name|--all]{C_RESET}     {C_GRAY}Очистить историю сессии (или всех){C_RESET}")
     print(f"  {C_YELLOW}/close{C_RESET}                         {C_GRAY}Сохранить и выйти{C_RESET}")
     print(f"  {C_YELLOW}/exit{C_RESET}                          {C_GRAY}Выход{C_RESET}")
     print(f"  {C_YELLOW}/ant <question>{C_RESET}                {C_GRAY}Диалог через Anthropic{C_RESET}")
+    print(f"  {C_YELLOW}/history search <query>{C_RESET}        {C_GRAY}Поиск по архиву диалогов (--all, --days N, --since/--until ДАТА){C_RESET}")
+    print(f"  {C_YELLOW}/routes{C_RESET}                        {C_GRAY}Статистика маршрутизации моделей{C_RESET}")
+    print(f"  {C_YELLOW}/mirror [refresh]{C_RESET}              {C_GRAY}Локальное зеркало документации{C_RESET}")
+    print(f"  {C_YELLOW}/transcripts [compact]{C_RESET}         {C_GRAY}Объём истории проектов: Redis / PostgreSQL / сжатый архив{C_RESET}")
+    print(f"  {C_YELLOW}/web_stats{C_RESET}                     {C_GRAY}Задержки, ошибки и польза сайтов в веб-поиске{C_RESET}")
     print(f"\n{C_GRAY}Настройки поиска: {WEB_SEARCH_MAX_RESULTS} сайтов, {WEB_SEARCH_MAX_LENGTH} символов, таймаут {WEB_SEARCH_TIMEOUT}с{C_RESET}")
     print(f"{C_GRAY}Настройки диалога: макс. итераций {DIALOG_MAX_ITERATIONS}{C_RESET}")
     print()
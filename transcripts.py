@@ -0,0 +1,257 @@
+import json
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+import asyncpg
+
+from config import *
+from store import STORE
+
+# --- ХРАНЕНИЕ ИСТОРИИ ПРОЕКТОВ ---
+# Три уровня:
+#   горячий  — хвост истории (TRANSCRIPT_HOT_MESSAGES) в STORE (Redis или память процесса), project_chat:<id>, с TTL;
+#              проектов в горячем уровне не больше TRANSCRIPT_HOT_PROJECTS, давно не открытые вытесняются (LRU по ZSET);
+#   тёплый   — project_messages в PostgreSQL, полный архив и полнотекстовый поиск;
+#   холодный — (TRANSCRIPT_COLD_DAYS > 0) старые сообщения сжатыми сегментами в project_message_segments,
+#              в поиск по истории они уже не попадают.
+# Хвост поднимается в горячий уровень лениво — при первом обращении и ровно столько, сколько нужно для контекста.
+
+_adopted: bool = False
+
+
+def key(project_id: int) -> str:
+    return f"{REDIS_CHAT_KEY_PREFIX}{project_id}"
+
+
+def _synced_key(project_id: int) -> str:
+    """Сколько первых сообщений горячего списка уже есть в БД"""
+    return f"{key(project_id)}:synced"
+
+
+async def _connect() -> Any:
+    return await asyncpg.connect(user=DB_USER, password=DB_PASS, database=DB_NAME, host=DB_HOST, port=DB_PORT)
+
+
+def _from_row(role: str, content: str, meta: Optional[str]) -> dict[str, Any]:
+    return {"role": role, "content": content, **json.loads(meta or "{}")}
+
+
+def _parse(raw: list[str]) -> list[dict[str, Any]]:
+    messages: list[dict[str, Any]] = []
+    for item in raw:
+        try:
+            messages.append(json.loads(item))
+        except json.JSONDecodeError:
+            print(f"{C_YELLOW}[WARN]{C_RESET} Ошибка чтения истории.")
+    return messages
+
+
+async def _adopt_legacy() -> None:
+    """Списки, созданные до появления уровней (без TTL и вне индекса), — первые кандидаты на вытеснение"""
+    global _adopted
+    if _adopted:
+        return
+    _adopted = True
+    tracked: set[str] = {member for member, _score in await STORE.ranked(REDIS_CHAT_INDEX)}
+    legacy: list[str] = []
+    for name in await STORE.keys(REDIS_CHAT_KEY_PREFIX):
+        project_id: str = name[len(REDIS_CHAT_KEY_PREFIX):]
+        if project_id.isdigit() and project_id not in tracked:
+            legacy.append(project_id)
+    await STORE.mark(REDIS_CHAT_INDEX, {project_id: 0 for project_id in legacy})
+
+
+async def _rehydrate(project_id: int, limit: int) -> list[dict[str, Any]]:
+    """Хвост из PostgreSQL (при нехватке — из холодных сегментов) обратно в горячий уровень"""
+    conn: Any = await _connect()
+    try:
+        rows: Any = await conn.fetch(
+            "SELECT role, content, meta FROM project_messages WHERE project_id = $1 ORDER BY id DESC LIMIT $2",
+            project_id,
+            limit,
+        )
+        messages: list[dict[str, Any]] = [_from_row(row["role"], row["content"], row["meta"]) for row in reversed(rows)]
+        if len(messages) < limit and TRANSCRIPT_COLD_DAYS > 0:
+            segments = await conn.fetch(
+                "SELECT data FROM project_message_segments WHERE project_id = $1 ORDER BY last_id DESC",
+                project_id,
+            )
+            for segment in segments:
+                older: list[dict[str, Any]] = json.loads(zlib.decompress(segment["data"]))
+                messages = [_from_row(m["role"], m["content"], m["meta"]) for m in older] + messages
+                if len(messages) >= limit:
+                    break
+            messages = messages[-limit:]
+    finally:
+        await conn.close()
+
+    if messages:
+        await STORE.replace(key(project_id), [json.dumps(m, ensure_ascii=False, default=str) for m in messages], ttl=TRANSCRIPT_HOT_TTL)
+        await STORE.set(_synced_key(project_id), str(len(messages)))
+        print(f"{C_GRAY}📜{C_RESET} Загружено {len(messages)} сообщений из архива.")
+    return messages
+
+
+async def tail(project_id: int, limit: int = MAX_DB_HISTORY) -> list[dict[str, Any]]:
+    """Последние limit сообщений проекта; продлевает TTL и отмечает обращение для LRU"""
+    await _adopt_legacy()
+    raw: list[str] = await STORE.read(key(project_id), -limit, -1, ttl=TRANSCRIPT_HOT_TTL, index=(REDIS_CHAT_INDEX, str(project_id)))
+
+    messages: list[dict[str, Any]] = _parse(raw) if raw else await _rehydrate(project_id, limit)
+    await _evict_lru()
+    return messages
+
+
+async def append(project_id: int, *messages: dict[str, Any]) -> None:
+    """Дописывает сообщения в горячий хвост одним обращением к хранилищу"""
+    await STORE.append(
+        key(project_id),
+        [json.dumps(m, ensure_ascii=False, default=str) for m in messages],
+        ttl=TRANSCRIPT_HOT_TTL,
+        index=(REDIS_CHAT_INDEX, str(project_id)),
+    )
+
+
+async def persist(project_id: int) -> None:
+    """Дописывает в PostgreSQL новые сообщения хвоста (архив не перезаписывается) и укорачивает хвост"""
+    length: int = await STORE.length(key(project_id))
+    synced: int = int(await STORE.get(_synced_key(project_id)) or 0)
+    if synced > length:
+        # Список пересоздан (очищен или истёк) — маркер устарел
+        synced = 0
+    if length == synced:
+        return
+
+    messages_json: list[str] = await STORE.read(key(project_id), synced, length - 1)
+    rows: list[tuple[int, str, str, Optional[str]]] = []
+    for msg_json in messages_json:
+        msg: dict[str, Any] = json.loads(msg_json)
+        meta: dict[str, Any] = {k: v for k, v in msg.items() if k not in ("role", "content") and v not in (None, "", [], {})}
+        rows.append((project_id, msg["role"], msg.get("content") or "", json.dumps(meta, ensure_ascii=False) if meta else None))
+
+    conn: Any = await _connect()
+    try:
+        await conn.executemany(
+            "INSERT INTO project_messages (project_id, role, content, meta) VALUES ($1, $2, $3, $4::jsonb)",
+            rows,
+        )
+    finally:
+        await conn.close()
+
+    # Всё до length теперь в БД: в горячем уровне остаётся только хвост для контекста
+    drop: int = max(0, length - TRANSCRIPT_HOT_MESSAGES)
+    await STORE.drop_head(key(project_id), drop)
+    await STORE.set(_synced_key(project_id), str(length - drop))
+    print(f"{C_GRAY}💾{C_RESET} Сохранено {len(rows)} новых сообщений в БД.")
+
+
+async def evict(project_id: int) -> None:
+    """Убирает хвост проекта из горячего уровня, предварительно сохранив несинхронизированное"""
+    await persist(project_id)
+    await STORE.delete(key(project_id), _synced_key(project_id))
+    await STORE.forget(REDIS_CHAT_INDEX, str(project_id))
+
+
+async def _evict_lru() -> None:
+    ranked: list[tuple[str, float]] = await STORE.ranked(REDIS_CHAT_INDEX)
+    excess: int = len(ranked) - TRANSCRIPT_HOT_PROJECTS
+    if excess <= 0:
+        return
+    victims: list[str] = [project_id for project_id, _score in ranked[:excess]]
+    for project_id in victims:
+        try:
+            await evict(int(project_id))
+        except Exception as e:
+            print(f"{C_YELLOW}[HISTORY]{C_RESET} Не удалось вытеснить проект {project_id}: {e}")
+    print(f"{C_GRAY}[HISTORY]{C_RESET} Вытеснено из горячего уровня проектов: {len(victims)}.")
+
+
+async def compact(project_id: Optional[int] = None) -> tuple[int, int]:
+    """
+    Переносит сообщения старше TRANSCRIPT_COLD_DAYS в сжатые сегменты (последние
+    TRANSCRIPT_HOT_MESSAGES проекта всегда остаются в таблице). Возвращает (сегментов, сообщений).
+    """
+    if TRANSCRIPT_COLD_DAYS <= 0:
+        return 0, 0
+    cutoff: datetime = datetime.now() - timedelta(days=TRANSCRIPT_COLD_DAYS)
+    segments: int = 0
+    moved: int = 0
+    conn: Any = await _connect()
+    try:
+        if project_id is None:
+            projects: list[int] = [
+                row["project_id"]
+                for row in await conn.fetch("SELECT DISTINCT project_id FROM project_messages WHERE created_at < $1", cutoff)
+            ]
+        else:
+            projects = [project_id]
+
+        for pid in projects:
+            rows: Any = await conn.fetch(
+                """
+                SELECT id, role, content, meta, created_at FROM project_messages
+                WHERE project_id = $1 AND created_at < $2
+                  AND id < (SELECT COALESCE(MIN(id), 0) FROM (
+                      SELECT id FROM project_messages WHERE project_id = $1 ORDER BY id DESC LIMIT $3
+                  ) recent)
+                ORDER BY id
+                """,
+                pid,
+                cutoff,
+                TRANSCRIPT_HOT_MESSAGES,
+            )
+            for start in range(0, len(rows), TRANSCRIPT_SEGMENT_MESSAGES):
+                chunk = rows[start:start + TRANSCRIPT_SEGMENT_MESSAGES]
+                raw: bytes = json.dumps(
+                    [{"role": row["role"], "content": row["content"], "meta": row["meta"]} for row in chunk],
+                    ensure_ascii=False,
+                ).encode()
+                async with conn.transaction():
+                    await conn.execute(
+                        "INSERT INTO project_message_segments "
+                        "(project_id, first_id, last_id, messages, raw_bytes, data, created_from, created_to) "
+                        "VALUES ($1, $2, $3, $4, $5, $6, $7, $8)",
+                        pid, chunk[0]["id"], chunk[-1]["id"], len(chunk), len(raw), zlib.compress(raw, 9),
+                        chunk[0]["created_at"], chunk[-1]["created_at"],
+                    )
+                    await conn.execute("DELETE FROM project_messages WHERE id = ANY($1::int[])", [row["id"] for row in chunk])
+                segments += 1
+                moved += len(chunk)
+    finally:
+        await conn.close()
+    return segments, moved
+
+
+async def report() -> str:
+    """Объём истории по уровням (для /transcripts)"""
+    lines: list[str] = [f"{C_CYAN}=== История проектов по уровням ==={C_RESET}"]
+
+    index: list[tuple[str, float]] = list(reversed(await STORE.ranked(REDIS_CHAT_INDEX)))
+    stats: list[tuple[int, int, int]] = await STORE.info([key(int(project_id)) for project_id, _score in index])
+    total: int = sum(memory for _length, memory, _ttl in stats)
+    lines.append(f"Горячий ({STORE.report()}): проектов {len(index)}/{TRANSCRIPT_HOT_PROJECTS}, {total / 1024:.1f} KB")
+    for (project_id, last_access), (length, memory, ttl) in zip(index, stats):
+        seen: str = datetime.fromtimestamp(last_access).strftime("%Y-%m-%d %H:%M") if last_access else "до уровней"
+        lines.append(f"  проект {project_id:>5}: {length:>4} сообщ., {memory / 1024:>7.1f} KB, "
+                     f"обращение {seen}, TTL {ttl // 3600 if ttl > 0 else '—'} ч")
+
+    conn: Any = await _connect()
+    try:
+        warm = await conn.fetchrow(
+            "SELECT COUNT(*) AS messages, pg_total_relation_size('project_messages') AS size FROM project_messages"
+        )
+        cold = await conn.fetchrow(
+            "SELECT COUNT(*) AS segments, COALESCE(SUM(messages), 0) AS messages, COALESCE(SUM(raw_bytes), 0) AS raw, "
+            "COALESCE(SUM(octet_length(data)), 0) AS stored FROM project_message_segments"
+        )
+    finally:
+        await conn.close()
+    lines.append(f"Тёплый (PostgreSQL): {warm['messages']} сообщ., {warm['size'] / 1024 / 1024:.1f} MB с индексами")
+    if cold["segments"]:
+        lines.append(f"Холодный (сегменты): {cold['segments']} сегм., {cold['messages']} сообщ., "
+                     f"{cold['stored'] / 1024:.1f} KB (без сжатия {cold['raw'] / 1024:.1f} KB)")
+    else:
+        state: str = f"старше {TRANSCRIPT_COLD_DAYS} дн." if TRANSCRIPT_COLD_DAYS > 0 else "выключен (TRANSCRIPT_COLD_DAYS=0)"
+        lines.append(f"Холодный (сегменты): пусто, {state}")
+    return "\n".join(lines)
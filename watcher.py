@@ -0,0 +1,157 @@
+import asyncio
+import os
+from typing import Callable, Optional
+
+from config import *
+from checks import SKIP_DIRS
+
+# --- НАБЛЮДЕНИЕ ЗА ФАЙЛАМИ ПРОЕКТА ---
+
+# Подписчик получает абсолютные пути изменённых (созданных/удалённых) файлов
+Subscriber = Callable[[set[str]], None]
+
+
+def _ignored(path: str, base: str) -> bool:
+    rel: str = os.path.relpath(path, base)
+    return any(part in SKIP_DIRS or part.startswith(".") for part in rel.split(os.sep)[:-1])
+
+
+def _stat(path: str) -> Optional[tuple[int, int]]:
+    try:
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+    except OSError:
+        return None
+
+
+class ProjectWatcher:
+    """Следит за каталогом проекта: таблица состояния файлов для сканера и оповещение подписчиков"""
+
+    def __init__(self, base: str) -> None:
+        self.base: str = os.path.abspath(base)
+        # Таблица состояния: абсолютный путь -> (mtime_ns, size); отсеивает события без изменений
+        self._files: dict[str, tuple[int, int]] = {}
+        # Растёт при каждом изменении файлов: кэши, снятые при том же поколении, ещё верны
+        self.generation: int = 0
+        self.backend: str = ""
+        self._subscribers: list[Subscriber] = []
+        self._stop = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, callback: Subscriber) -> None:
+        self._subscribers.append(callback)
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def state(self, path: str) -> Optional[tuple[int, int]]:
+        """(mtime_ns, size) файла по таблице, без обращения к диску; None — файла нет или каталог не отслеживается"""
+        return self._files.get(path)
+
+    def _snapshot(self) -> dict[str, tuple[int, int]]:
+        table: dict[str, tuple[int, int]] = {}
+        for root, dirs, names in os.walk(self.base):
+            dirs[:] = [d for d in dirs if d not in SKIP_DIRS and not d.startswith(".")]
+            for name in names:
+                path: str = os.path.join(root, name)
+                state = _stat(path)
+                if state:
+                    table[path] = state
+        return table
+
+    def _publish(self, changed: set[str]) -> None:
+        """Обновляет таблицу по списку путей и оповещает подписчиков"""
+        really: set[str] = set()
+        for path in changed:
+            state = _stat(path) if os.path.isfile(path) else None
+            if state is None:
+                if self._files.pop(path, None) is not None:
+                    really.add(path)
+            elif self._files.get(path) != state:
+                self._files[path] = state
+                really.add(path)
+        if not really:
+            return
+
+        self.generation += 1
+        for callback in self._subscribers:
+            try:
+                callback(really)
+            except Exception as e:
+                print(f"{C_YELLOW}[WATCH]{C_RESET} Ошибка подписчика: {e}")
+
+    async def start(self) -> None:
+        self._files = await asyncio.to_thread(self._snapshot)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        try:
+            from watchfiles import awatch
+        except ImportError:
+            self.backend = "polling"
+            await self._poll()
+            return
+
+        self.backend = "inotify"
+        async for changes in awatch(
+            self.base,
+            watch_filter=lambda _change, path: not _ignored(path, self.base),
+            debounce=WATCH_DEBOUNCE_MS,
+            stop_event=self._stop,
+        ):
+            self._publish({path for _change, path in changes})
+
+    async def _poll(self) -> None:
+        """Запасной вариант без inotify: периодическое сравнение снимков"""
+        while not self._stop.is_set():
+            await asyncio.sleep(WATCH_POLL_INTERVAL)
+            fresh: dict[str, tuple[int, int]] = await asyncio.to_thread(self._snapshot)
+            changed: set[str] = {p for p in fresh.keys() | self._files.keys() if fresh.get(p) != self._files.get(p)}
+            if not changed:
+                continue
+            # Пачка правок (сохранение нескольких файлов в IDE) — ждём, пока затихнет
+            await asyncio.sleep(WATCH_DEBOUNCE_MS / 1000)
+            self._publish(changed)
+
+
+_ACTIVE: Optional[ProjectWatcher] = None
+
+
+def active(base: str) -> Optional[ProjectWatcher]:
+    """Запущенный наблюдатель за каталогом base (None — таблицы нет, сканер идёт на диск)"""
+    if _ACTIVE is not None and _ACTIVE.base == os.path.abspath(base):
+        return _ACTIVE
+    return None
+
+
+async def watch_project(path: str, subscribers: list[Subscriber]) -> Optional[ProjectWatcher]:
+    """Запускает наблюдение за проектом (предыдущий наблюдатель останавливается)"""
+    global _ACTIVE
+    await stop_watching()
+    if not WATCH_ENABLED or not os.path.isdir(path):
+        return None
+
+    watcher = ProjectWatcher(path)
+    for callback in subscribers:
+        watcher.subscribe(callback)
+    await watcher.start()
+    _ACTIVE = watcher
+    print(f"{C_GRAY}[WATCH]{C_RESET} Наблюдение за {len(watcher)} файлами запущено.")
+    return watcher
+
+
+async def stop_watching() -> None:
+    global _ACTIVE
+    if _ACTIVE:
+        await _ACTIVE.stop()
+        _ACTIVE = None
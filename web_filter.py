@@ -0,0 +1,136 @@
+import json
+import os
+import re
+from typing import Any, Optional
+from urllib.parse import urlparse
+
+from config import *
+
+# --- ФИЛЬТР РЕЗУЛЬТАТОВ ВЕБ-ПОИСКА ---
+# Правила — в web_filters.json (путь: WEB_FILTERS_PATH), перечитываются при изменении файла.
+
+CJK_RANGE: str = "一-鿿"
+# Ключ списка правил в узле DomainTrie: "/" не встречается в метках домена
+RULES: str = "/"
+
+
+class DomainTrie:
+    """
+    Правила по суффиксу домена: метки хранятся от зоны к поддомену, поиск — за число меток.
+    Правило может уточнять путь ("github.com/rust-lang"); побеждает самое длинное совпадение.
+    """
+
+    def __init__(self) -> None:
+        self.root: dict[str, Any] = {}
+
+    def add(self, rule: str, value: Any) -> None:
+        host, _, path = rule.lower().strip().partition("/")
+        node: dict[str, Any] = self.root
+        for label in reversed(host.strip(".").split(".")):
+            node = node.setdefault(label, {})
+        node.setdefault(RULES, []).append(("/" + path if path else "", value))
+
+    def match(self, domain: str, path: str = "") -> Optional[Any]:
+        node: dict[str, Any] = self.root
+        found: Optional[Any] = None
+        for label in reversed(domain.split(".")):
+            node = node.get(label)
+            if node is None:
+                break
+            # На одном уровне правило с путём точнее правила на весь домен
+            for prefix, value in sorted(node.get(RULES, []), key=lambda rule: -len(rule[0])):
+                if not prefix or path.startswith(prefix):
+                    found = value
+                    break
+        return found
+
+
+def _alternation(words: list[str]) -> Optional[re.Pattern]:
+    """Один регэксп на весь список подстрок (длинные — первыми)"""
+    words = sorted({w.lower() for w in words if w}, key=len, reverse=True)
+    return re.compile("|".join(map(re.escape, words))) if words else None
+
+
+class WebFilter:
+    """Скомпилированные правила: блок-лист доменов, приоритеты, стоп-фразы, нежелательные письменности"""
+
+    def __init__(self, rules: dict[str, Any]) -> None:
+        self.blocked = DomainTrie()
+        for rule in rules.get("blocked_domains", []):
+            self.blocked.add(rule, True)
+        self.priority = DomainTrie()
+        for rule, score in rules.get("priority_domains", {}).items():
+            self.priority.add(rule, int(score))
+        self.domain_keywords: Optional[re.Pattern] = _alternation(rules.get("blocked_domain_keywords", []))
+        self.patterns: Optional[re.Pattern] = _alternation(rules.get("blocked_patterns", []))
+        scripts: str = "".join(rules.get("blocked_scripts", [CJK_RANGE]))
+        self.script: Optional[re.Pattern] = re.compile(f"[{scripts}]") if scripts else None
+
+    def script_ratio(self, text: str) -> float:
+        """Доля символов нежелательной письменности (подсчёт в C через re.sub)"""
+        if not text or not self.script:
+            return 0.0
+        return (len(text) - len(self.script.sub("", text))) / len(text)
+
+    def classify(self, href: str, title: str, body: str) -> tuple[Optional[str], int, str]:
+        """(причина блокировки или None, приоритет, домен)"""
+        if not href.startswith(("http://", "https://")):
+            return "invalid_url", 0, ""
+        parsed = urlparse(href)
+        # "docs.rs." — тот же хост, что "docs.rs": без точки на конце блок-лист не обойти
+        domain: str = (parsed.hostname or "").lower().rstrip(".")
+        if domain.startswith("www."):
+            domain = domain[4:]
+        if not domain or "." not in domain or "" in domain.split("."):
+            return "invalid_url", 0, domain
+
+        if self.domain_keywords and self.domain_keywords.search(domain):
+            return "forums", 0, domain
+        if self.blocked.match(domain) or (self.script and self.script.search(domain)):
+            return "domain", 0, domain
+        if self.script and self.script.search(title):
+            return "script", 0, domain
+        if self.patterns and self.patterns.search(f"{title}\n{body}".lower()):
+            return "patterns", 0, domain
+
+        return None, self.priority.match(domain, parsed.path.lower()) or 0, domain
+
+    def select(self, results: list[dict[str, Any]], limit: int) -> tuple[list[dict[str, Any]], dict[str, int]]:
+        """Отфильтрованные результаты по убыванию приоритета (при равенстве — порядок поисковика)"""
+        kept: list[dict[str, Any]] = []
+        blocked: dict[str, int] = {"domain": 0, "script": 0, "patterns": 0, "forums": 0, "invalid_url": 0}
+        for position, r in enumerate(results):
+            title: str = r.get("title", "")
+            reason, priority, domain = self.classify(r.get("href", ""), title, r.get("body", ""))
+            if reason:
+                blocked[reason] += 1
+                continue
+            kept.append({"result": r, "priority": priority, "domain": domain, "title": title, "position": position})
+        kept.sort(key=lambda item: (-item["priority"], item["position"]))
+        return kept[:limit], blocked
+
+
+_FILTER: Optional[WebFilter] = None
+_FILTER_MTIME: float = -1.0
+
+
+def get_filter() -> WebFilter:
+    """Текущий фильтр; файл правил перечитывается, если изменился (горячая перезагрузка)"""
+    global _FILTER, _FILTER_MTIME
+    try:
+        mtime: float = os.stat(WEB_FILTERS_PATH).st_mtime
+    except OSError:
+        mtime = 0.0
+    if _FILTER is None or mtime != _FILTER_MTIME:
+        rules: dict[str, Any] = {}
+        if mtime:
+            try:
+                with open(WEB_FILTERS_PATH, encoding="utf-8") as f:
+                    rules = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"{C_YELLOW}[WEB]{C_RESET} Не удалось прочитать правила {WEB_FILTERS_PATH}: {e}")
+                if _FILTER is not None:
+                    return _FILTER
+        _FILTER = WebFilter(rules)
+        _FILTER_MTIME = mtime
+    return _FILTER